@@ -0,0 +1,221 @@
+import logging
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+from sqlalchemy import and_, func, or_
+from sqlalchemy.orm import Session
+
+from models import ProductDB, ProductStatsDB
+
+logger = logging.getLogger(__name__)
+
+# Dimensiones agregadas: columna de products y normalización de su valor a clave
+DIMENSIONS = {
+    "category": (ProductDB.category, lambda value: "" if value is None else str(value)),
+    "rating": (ProductDB.rating, lambda value: "" if value is None else str(float(value))),
+}
+
+GroupKey = Tuple[str, str]
+
+
+class _GroupDelta:
+    __slots__ = ("value", "count", "price_sum", "price_min", "price_max", "recompute")
+
+    def __init__(self, value):
+        self.value = value
+        self.count = 0
+        self.price_sum = 0.0
+        self.price_min: Optional[float] = None
+        self.price_max: Optional[float] = None
+        # Al quitar un producto no se sabe si era el mínimo o el máximo del grupo
+        self.recompute = False
+
+
+class StatsDelta:
+    """Cambios pendientes en los agregados, acumulados por grupo (dimensión, clave)"""
+
+    def __init__(self):
+        self.groups: Dict[GroupKey, _GroupDelta] = {}
+
+    def __bool__(self) -> bool:
+        return bool(self.groups)
+
+    def _group(self, dimension: str, value) -> _GroupDelta:
+        key = (dimension, DIMENSIONS[dimension][1](value))
+        group = self.groups.get(key)
+        if group is None:
+            group = _GroupDelta(value)
+            self.groups[key] = group
+        return group
+
+    def add(self, product: Mapping[str, Any]) -> None:
+        price = product.get("price")
+        for dimension in DIMENSIONS:
+            group = self._group(dimension, product.get(dimension))
+            group.count += 1
+            if price is not None:
+                group.price_sum += price
+                group.price_min = price if group.price_min is None else min(group.price_min, price)
+                group.price_max = price if group.price_max is None else max(group.price_max, price)
+
+    def remove(self, product: Mapping[str, Any]) -> None:
+        price = product.get("price")
+        for dimension in DIMENSIONS:
+            group = self._group(dimension, product.get(dimension))
+            group.count -= 1
+            if price is not None:
+                group.price_sum -= price
+            group.recompute = True
+
+
+def apply_delta(db: Session, delta: StatsDelta) -> None:
+    """
+    Aplica `delta` a product_stats dentro de la transacción en curso de `db`
+
+    count y price_sum se actualizan sumando; el mínimo y el máximo se amplían
+    con los productos añadidos y, en los grupos de los que se ha quitado algún
+    producto, se vuelven a consultar con los índices (category, price) y
+    (rating, price). El commit lo hace quien llama, junto con los productos.
+    """
+    if not delta:
+        return
+    db.flush()
+
+    keys = list(delta.groups)
+    rows = {
+        (row.dimension, row.key): row
+        for row in db.query(ProductStatsDB).filter(or_(*(
+            and_(ProductStatsDB.dimension == dimension, ProductStatsDB.key == key)
+            for dimension, key in keys
+        ))).with_for_update()
+    }
+
+    for (dimension, key), group in delta.groups.items():
+        row = rows.get((dimension, key))
+        if row is None:
+            row = ProductStatsDB(dimension=dimension, key=key, count=0, price_sum=0.0)
+            db.add(row)
+
+        row.count += group.count
+        row.price_sum += group.price_sum
+        if row.count <= 0:
+            db.delete(row)
+            continue
+
+        if group.recompute:
+            column = DIMENSIONS[dimension][0]
+            row.price_min, row.price_max = db.query(
+                func.min(ProductDB.price), func.max(ProductDB.price)
+            ).filter(column == group.value).one()
+        else:
+            if group.price_min is not None:
+                row.price_min = group.price_min if row.price_min is None else min(row.price_min, group.price_min)
+            if group.price_max is not None:
+                row.price_max = group.price_max if row.price_max is None else max(row.price_max, group.price_max)
+
+
+def clear_stats(db: Session) -> None:
+    """Vacía los agregados (p. ej. al borrar todos los productos), sin commit"""
+    db.query(ProductStatsDB).delete(synchronize_session=False)
+
+
+def compute_from_products(db: Session) -> Dict[GroupKey, Dict[str, Any]]:
+    """Calcula los agregados desde cero recorriendo la tabla products"""
+    result = {}
+    for dimension, (column, normalize) in DIMENSIONS.items():
+        rows = db.query(
+            column,
+            func.count(ProductDB.id),
+            func.coalesce(func.sum(ProductDB.price), 0.0),
+            func.min(ProductDB.price),
+            func.max(ProductDB.price)
+        ).group_by(column).all()
+        for value, count, price_sum, price_min, price_max in rows:
+            result[(dimension, normalize(value))] = {
+                "count": count,
+                "price_sum": float(price_sum),
+                "price_min": price_min,
+                "price_max": price_max,
+            }
+    return result
+
+
+def rebuild_stats(db: Session) -> int:
+    """Reconstruye product_stats a partir de products y hace commit"""
+    expected = compute_from_products(db)
+    clear_stats(db)
+    for (dimension, key), values in expected.items():
+        db.add(ProductStatsDB(dimension=dimension, key=key, **values))
+    db.commit()
+    logger.info("Agregados de productos reconstruidos: %s grupos", len(expected))
+    return len(expected)
+
+
+def check_stats(db: Session, tolerance: float = 1e-6) -> List[str]:
+    """Compara product_stats con un recálculo desde cero y describe las diferencias"""
+    expected = compute_from_products(db)
+    stored = {
+        (row.dimension, row.key): {
+            "count": row.count,
+            "price_sum": row.price_sum,
+            "price_min": row.price_min,
+            "price_max": row.price_max,
+        }
+        for row in db.query(ProductStatsDB).all()
+    }
+
+    drift = []
+    for key in sorted(set(expected) | set(stored)):
+        want, have = expected.get(key), stored.get(key)
+        if want is None or have is None:
+            drift.append(f"{key[0]}={key[1]!r}: esperado {want}, almacenado {have}")
+            continue
+        for field, expected_value in want.items():
+            value = have[field]
+            if expected_value is None or value is None:
+                equal = expected_value == value
+            else:
+                equal = abs(expected_value - value) <= tolerance * max(1.0, abs(expected_value))
+            if not equal:
+                drift.append(f"{key[0]}={key[1]!r} {field}: esperado {expected_value}, almacenado {value}")
+    return drift
+
+
+def read_stats(db: Session) -> Dict[str, Any]:
+    """Respuesta de GET /stats/ construida solo a partir de product_stats"""
+    return stats_from_rows(db.query(ProductStatsDB).all())
+
+
+def stats_from_rows(rows: List[ProductStatsDB]) -> Dict[str, Any]:
+    """Respuesta de GET /stats/ a partir de las filas de product_stats"""
+    categories = [row for row in rows if row.dimension == "category"]
+    total_products = sum(row.count for row in categories)
+
+    # Si no hay productos, devolver estadísticas vacías
+    if total_products == 0:
+        return {
+            "total_products": 0,
+            "price_stats": {
+                "average": 0,
+                "min": 0,
+                "max": 0
+            },
+            "rating_distribution": {},
+            "categories": {}
+        }
+
+    minimums = [row.price_min for row in categories if row.price_min is not None]
+    maximums = [row.price_max for row in categories if row.price_max is not None]
+    average = sum(row.price_sum for row in categories) / total_products
+
+    return {
+        "total_products": total_products,
+        "price_stats": {
+            "average": float(average) if average else 0,
+            "min": float(min(minimums)) if minimums else 0,
+            "max": float(max(maximums)) if maximums else 0
+        },
+        "rating_distribution": {
+            int(float(row.key)): row.count for row in rows if row.dimension == "rating" and row.key
+        },
+        "categories": {row.key: row.count for row in categories}
+    }
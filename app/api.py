@@ -1,14 +1,28 @@
 from fastapi.openapi.docs import get_swagger_ui_html
 from fastapi.staticfiles import StaticFiles
-from fastapi import FastAPI, Depends, HTTPException, Query, BackgroundTasks, Request
-from fastapi.responses import HTMLResponse
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, Response
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import HTMLResponse, StreamingResponse
 from sqlalchemy.orm import Session
 from typing import List, Optional, Dict, Any
-from models import Product, ProductCreate, ProductDB
-from database import get_db, SessionLocal
+from models import Product, ProductCreate, ProductDB, ScrapeJob
+from database import get_db, engine, SessionLocal, ASYNC_DB, async_engine
 from sqlalchemy import or_, and_
-from scraper import WebScraper
+from jobs import JobRunner
+from parsers import shutdown_process_pool
+from pagination import InvalidCursor, next_cursor, resolve_page
+from queries import filter_products
+from serialization import PRODUCT_COLUMNS, dump_products
+from importer import import_products, open_binary
+from export import EXPORT_MEDIA_TYPES, export_products
+from cache import bump_data_version, response_cache
+from aggregates import clear_stats, read_stats
+from fingerprints import clear_page_hashes
+from metrics import CONTENT_TYPE, REGISTRY, MetricsMiddleware, update_threadpool_gauges
+from starlette.concurrency import run_in_threadpool
 import logging
+import os
+import tempfile
 
 # Configuración de logging
 logger = logging.getLogger(__name__)
@@ -19,6 +33,39 @@ app = FastAPI(
     version="1.0.0"
 )
 
+# Latencia por ruta para /metrics
+app.add_middleware(MetricsMiddleware)
+
+# CORS aquí y no en main.py para que también lo tengan los procesos que
+# arranca uvicorn con --workers, que importan directamente api:app
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],  # En producción, especificar dominios permitidos
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
+)
+
+# Ejecutor de trabajos de scraping, con un máximo de trabajos simultáneos
+job_runner = JobRunner(SessionLocal, max_concurrent_jobs=int(os.getenv("SCRAPE_MAX_JOBS", "2")))
+
+# Tamaño a partir del cual el cuerpo de POST /products/import se vuelca a disco
+IMPORT_SPOOL_SIZE = 16 * 1024 * 1024
+
+@app.on_event("shutdown")
+def stop_job_runner():
+    job_runner.shutdown()
+    shutdown_process_pool()
+
+@app.on_event("shutdown")
+async def dispose_engines():
+    # Después de stop_job_runner. Las conexiones de aiosqlite tienen cada una
+    # un hilo propio que, sin cerrarlas, impide que el proceso termine
+    if async_engine is not None:
+        await async_engine.dispose()
+    engine.dispose()
+
 # Personalizar la documentación
 @app.get("/", include_in_schema=False)
 async def custom_swagger_ui_html(request: Request):
@@ -108,20 +155,6 @@ async def custom_docs():
     return HTMLResponse(content=html_content)
 
 
-# Función para ejecutar el scraping en segundo plano
-def run_scraping_task(url: str, pages: int):
-    logger.info(f"Iniciando tarea de scraping de {url}, {pages} páginas")
-    scraper = WebScraper(base_url=url)
-    products = scraper.scrape_products(num_pages=pages)
-    
-    logger.info(f"Se encontraron {len(products)} productos en total")
-    
-    # Guardar en la base de datos
-    with SessionLocal() as db:
-        scraper.save_products_to_db(products, db)
-    
-    logger.info("Scraping completado y datos guardados en la base de datos")
-
 # Endpoint de health check
 @app.get("/health", tags=["Health"])
 def health_check():
@@ -131,32 +164,82 @@ def health_check():
     """
     return {"status": "healthy"}
 
+# Endpoint de métricas en formato Prometheus
+@app.get("/metrics", tags=["Health"], summary="Métricas en formato Prometheus")
+async def get_metrics():
+    """
+    Latencia por ruta, tiempos del scraper (descarga, parseo y guardado),
+    latencia de las sentencias SQL y ocupación del threadpool y del pool de
+    conexiones, en el formato de texto de Prometheus.
+    """
+    # Se ejecuta en el event loop: es donde se puede leer el limitador del threadpool
+    update_threadpool_gauges()
+    return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
+
 # Endpoint para iniciar el scraping
 @app.post("/scrape/", tags=["Scraping"], summary="Iniciar scraping")
-async def start_scraping(
-    background_tasks: BackgroundTasks,
+def start_scraping(
     url: str = Query("https://books.toscrape.com", description="URL base para el scraping"),
-    pages: int = Query(5, description="Número de páginas a scrapear")
+    pages: int = Query(5, ge=1, description="Máximo de páginas del listado a descargar"),
+    concurrency: int = Query(1, ge=1, le=32, description="Páginas descargadas en paralelo por host")
 ):
     """
     Inicia un proceso de scraping con los parámetros especificados.
     
-    El scraping se ejecuta en segundo plano, por lo que este endpoint
-    responde inmediatamente mientras el proceso continúa.
+    El scraping se ejecuta en segundo plano como un trabajo con ID, por lo que
+    este endpoint responde inmediatamente mientras el proceso continúa. Si ya hay
+    un trabajo pendiente o en curso con la misma URL y páginas, se devuelve ese.
     
     - **url**: URL base del sitio web a scrapear (por defecto: books.toscrape.com)
-    - **pages**: Número de páginas a scrapear (por defecto: 5)
+    - **pages**: Máximo de páginas a descargar (por defecto: 5). El crawl parte de
+      la página principal, sigue los enlaces de categoría y de paginación y
+      termina antes si no quedan páginas por descubrir
+    - **concurrency**: Páginas descargadas en paralelo por host (por defecto: 1, secuencial)
     """
-    # Añadir la tarea al procesamiento en segundo plano
-    background_tasks.add_task(run_scraping_task, url, pages)
+    job, created = job_runner.submit(url, pages, concurrency)
+    
+    if created:
+        message = f"Proceso de scraping iniciado en segundo plano para {url}, {pages} páginas"
+    else:
+        message = f"Ya existe un proceso de scraping en curso para {url}, {pages} páginas"
     
     return {
         "status": "success",
-        "message": f"Proceso de scraping iniciado en segundo plano para {url}, {pages} páginas",
+        "message": message,
+        "job_id": job.id,
+        "job_status": job.status,
+        "deduplicated": not created,
         "url": url,
-        "pages": pages
+        "pages": pages,
+        "concurrency": job.concurrency
     }
 
+@app.get("/scrape/{job_id}", response_model=ScrapeJob, tags=["Scraping"], summary="Estado de un trabajo de scraping")
+def get_scraping_job(job_id: str):
+    """
+    Devuelve el estado y el progreso de un trabajo de scraping.
+    
+    - **job_id**: ID devuelto por POST /scrape/
+    """
+    job = job_runner.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Trabajo de scraping no encontrado")
+    return job
+
+@app.delete("/scrape/{job_id}", response_model=ScrapeJob, tags=["Scraping"], summary="Cancelar un trabajo de scraping")
+def cancel_scraping_job(job_id: str):
+    """
+    Cancela un trabajo de scraping pendiente o en curso.
+    
+    Los productos ya guardados se conservan. Los trabajos terminados no cambian.
+    
+    - **job_id**: ID devuelto por POST /scrape/
+    """
+    job = job_runner.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Trabajo de scraping no encontrado")
+    return job
+
 # Endpoint para eliminar todos los productos
 @app.delete("/products/", tags=["Productos"], summary="Eliminar todos los productos")
 def delete_all_products(db: Session = Depends(get_db)):
@@ -168,7 +251,11 @@ def delete_all_products(db: Session = Depends(get_db)):
     try:
         # Eliminar todos los registros de la tabla de productos
         deleted_count = db.query(ProductDB).delete()
+        clear_stats(db)
+        # Sin huellas, el próximo scraping vuelve a procesar todas las páginas
+        clear_page_hashes(db)
         db.commit()
+        bump_data_version()
         
         return {
             "status": "success",
@@ -176,60 +263,128 @@ def delete_all_products(db: Session = Depends(get_db)):
         }
     except Exception as e:
         db.rollback()
-        logger.error(f"Error al eliminar productos: {e}")
+        logger.error("Error al eliminar productos: %s", e)
         raise HTTPException(status_code=500, detail=f"Error al eliminar productos: {str(e)}")
 
 
 @app.get("/products/", response_model=List[Product], summary="Obtener productos con filtros")
 def get_products(
+    request: Request,
     db: Session = Depends(get_db),
     min_price: Optional[float] = Query(None, description="Precio mínimo"),
     max_price: Optional[float] = Query(None, description="Precio máximo"),
     name: Optional[str] = Query(None, description="Término de búsqueda para el título"),
     category: Optional[str] = Query(None, description="Categoría del producto"),
     min_rating: Optional[float] = Query(None, description="Rating mínimo"),
-    skip: int = Query(0, description="Número de registros a omitir (paginación)"),
+    sort: str = Query("id", pattern="^(id|relevance)$", description="Orden: id o relevance (relevancia de la búsqueda por nombre)"),
+    cursor: Optional[str] = Query(None, description="Cursor de paginación devuelto en la cabecera X-Next-Cursor"),
+    skip: int = Query(0, description="Número de registros a omitir (obsoleto, usar cursor)"),
     limit: int = Query(100, description="Número máximo de registros a devolver")
 ):
     """
-    Obtiene una lista de productos con filtros opcionales.
+    Obtiene una lista de productos con filtros opcionales, ordenada por ID.
     
     - **min_price**: Filtra productos con precio mayor o igual al especificado
     - **max_price**: Filtra productos con precio menor o igual al especificado
-    - **name**: Busca productos que contengan la cadena especificada en el título
+    - **name**: Busca productos cuyo título contenga todas las palabras indicadas (como prefijo)
     - **category**: Filtra productos por categoría exacta
     - **min_rating**: Filtra productos con rating mayor o igual al especificado
-    - **skip**: Número de productos a omitir (para paginación)
+    - **sort**: `id` (por defecto) o `relevance` para ordenar por relevancia de la búsqueda por nombre
+    - **cursor**: Continúa después de la última página devuelta (paginación por cursor)
+    - **skip**: Número de productos a omitir; se mantiene por compatibilidad y se ignora si hay cursor
     - **limit**: Número máximo de productos a devolver
-    """
-    query = db.query(ProductDB)
-    
-    # Aplicar filtros
-    filters = []
     
-    if min_price is not None:
-        filters.append(ProductDB.price >= min_price)
+    Si hay más resultados, la respuesta incluye la cabecera **X-Next-Cursor** con
+    el cursor de la página siguiente. Las respuestas se cachean y llevan ETag.
+    """
+    try:
+        by_relevance, after_id = resolve_page(name, sort, cursor)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
-    if max_price is not None:
-        filters.append(ProductDB.price <= max_price)
+    def build(headers: Dict[str, str]) -> bytes:
+        query = filter_products(
+            db.query(*PRODUCT_COLUMNS), db,
+            min_price=min_price, max_price=max_price, name=name, category=category,
+            min_rating=min_rating, by_relevance=by_relevance, after_id=after_id
+        )
+        
+        # Aplicar paginación
+        if not cursor and skip:
+            query = query.offset(skip)
+        products = query.limit(limit).all()
+        
+        next_page = next_cursor(products, limit) if not by_relevance else None
+        if next_page:
+            headers["X-Next-Cursor"] = next_page
+        
+        # Serialización directa de las tuplas de columnas, sin objetos ORM ni
+        # validación pydantic por fila; mismo JSON que response_model=List[Product]
+        return dump_products(products)
     
-    if name:
-        filters.append(ProductDB.title.ilike(f"%{name}%"))
+    return response_cache.respond(request, build)
+
+@app.get("/products/export", summary="Exportar productos en NDJSON o CSV")
+def export_products_endpoint(
+    min_price: Optional[float] = Query(None, description="Precio mínimo"),
+    max_price: Optional[float] = Query(None, description="Precio máximo"),
+    name: Optional[str] = Query(None, description="Término de búsqueda para el título"),
+    category: Optional[str] = Query(None, description="Categoría del producto"),
+    min_rating: Optional[float] = Query(None, description="Rating mínimo"),
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$", description="Formato: ndjson o csv"),
+    gzip: bool = Query(False, description="Comprimir la respuesta con gzip")
+):
+    """
+    Descarga en una sola petición todos los productos que cumplen los filtros.
     
-    if category:
-        filters.append(ProductDB.category == category)
+    Acepta los mismos filtros que GET /products/ y devuelve los productos
+    ordenados por ID, una línea por producto. La respuesta se genera por lotes
+    mientras se lee la base de datos, sin cargar toda la tabla en memoria.
     
-    if min_rating is not None:
-        filters.append(ProductDB.rating >= min_rating)
+    - **format**: `ndjson` (un objeto JSON por línea) o `csv` (con cabecera)
+    - **gzip**: Comprime el flujo sobre la marcha (`Content-Encoding: gzip`)
+    """
+    headers = {"Content-Disposition": f'attachment; filename="products.{format}"'}
+    if gzip:
+        headers["Content-Encoding"] = "gzip"
     
-    # Aplicar todos los filtros si existen
-    if filters:
-        query = query.filter(and_(*filters))
+    return StreamingResponse(
+        export_products(
+            SessionLocal, format, compress=gzip,
+            min_price=min_price, max_price=max_price, name=name,
+            category=category, min_rating=min_rating
+        ),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers=headers
+    )
+
+@app.post("/products/import", tags=["Productos"], summary="Importar productos en bloque")
+async def import_products_endpoint(
+    request: Request,
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$", description="Formato del cuerpo: ndjson o csv")
+):
+    """
+    Carga en bloque los productos enviados en el cuerpo de la petición.
     
-    # Aplicar paginación
-    products = query.offset(skip).limit(limit).all()
+    Acepta el mismo formato que genera GET /products/export (NDJSON o CSV con
+    cabecera), opcionalmente comprimido con `Content-Encoding: gzip`. Los
+    títulos que ya existen se actualizan. Devuelve las filas cargadas, las
+    descartadas y la velocidad en filas por segundo.
+    """
+    compressed = request.headers.get("content-encoding", "").lower() == "gzip"
+    # El cuerpo se vuelca a disco si es grande y la carga se hace en el threadpool
+    body = tempfile.SpooledTemporaryFile(max_size=IMPORT_SPOOL_SIZE)
+    try:
+        async for chunk in request.stream():
+            body.write(chunk)
+        body.seek(0)
+        result = await run_in_threadpool(import_products, open_binary(body, format, compressed), engine)
+    except (OSError, UnicodeDecodeError) as e:
+        raise HTTPException(status_code=400, detail=f"Cuerpo de la importación no válido: {e}")
+    finally:
+        body.close()
     
-    return products
+    return {"status": "success", **result}
 
 @app.get("/products/{product_id}", response_model=Product, summary="Obtener un producto por ID")
 def get_product(product_id: int, db: Session = Depends(get_db)):
@@ -244,17 +399,20 @@ def get_product(product_id: int, db: Session = Depends(get_db)):
     return product
 
 @app.get("/categories/", response_model=List[str], summary="Obtener todas las categorías")
-def get_categories(db: Session = Depends(get_db)):
+def get_categories(request: Request, db: Session = Depends(get_db)):
     """
     Obtiene una lista de todas las categorías disponibles.
     """
-    # Obtener categorías únicas
-    categories = db.query(ProductDB.category).distinct().all()
-    return [category[0] for category in categories]
+    def build(headers: Dict[str, str]) -> List[str]:
+        # Obtener categorías únicas
+        categories = db.query(ProductDB.category).distinct().all()
+        return [category[0] for category in categories]
+    
+    return response_cache.respond(request, build)
 
 # Endpoint para obtener estadísticas
 @app.get("/stats/", tags=["Estadísticas"], summary="Obtener estadísticas de productos")
-def get_stats(db: Session = Depends(get_db)):
+def get_stats(request: Request, db: Session = Depends(get_db)):
     """
     Obtiene estadísticas generales sobre los productos en la base de datos.
     
@@ -265,54 +423,20 @@ def get_stats(db: Session = Depends(get_db)):
     - Precio máximo
     - Distribución de ratings
     - Productos por categoría
-    """
-    # Total de productos
-    total_products = db.query(ProductDB).count()
-    
-    # Si no hay productos, devolver estadísticas vacías
-    if total_products == 0:
-        return {
-            "total_products": 0,
-            "price_stats": {
-                "average": 0,
-                "min": 0,
-                "max": 0
-            },
-            "rating_distribution": {},
-            "categories": {}
-        }
     
-    # Estadísticas de precio
-    from sqlalchemy import func
-    price_stats = db.query(
-        func.avg(ProductDB.price).label("average"),
-        func.min(ProductDB.price).label("min"),
-        func.max(ProductDB.price).label("max")
-    ).one()
-    
-    # Distribución de ratings
-    rating_counts = db.query(
-        ProductDB.rating,
-        func.count(ProductDB.id).label("count")
-    ).group_by(ProductDB.rating).all()
-    
-    rating_distribution = {int(rating): count for rating, count in rating_counts}
-    
-    # Productos por categoría
-    category_counts = db.query(
-        ProductDB.category,
-        func.count(ProductDB.id).label("count")
-    ).group_by(ProductDB.category).all()
-    
-    categories = {category: count for category, count in category_counts}
+    Se leen de la tabla de agregados product_stats, que se mantiene al guardar
+    y borrar productos, en lugar de recorrer toda la tabla de productos.
+    """
+    return response_cache.respond(request, lambda headers: read_stats(db))
+
+# Con ASYNC_DB los endpoints de lectura se sustituyen por sus versiones asíncronas
+if ASYNC_DB:
+    from fastapi.routing import APIRoute
+    from api_async import router as async_router
     
-    return {
-        "total_products": total_products,
-        "price_stats": {
-            "average": float(price_stats.average) if price_stats.average else 0,
-            "min": float(price_stats.min) if price_stats.min else 0,
-            "max": float(price_stats.max) if price_stats.max else 0
-        },
-        "rating_distribution": rating_distribution,
-        "categories": categories
-    }
\ No newline at end of file
+    replaced = {(route.path, method) for route in async_router.routes for method in route.methods}
+    app.router.routes = [
+        route for route in app.router.routes
+        if not (isinstance(route, APIRoute) and any((route.path, method) in replaced for method in route.methods))
+    ]
+    app.include_router(async_router)
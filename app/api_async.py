@@ -0,0 +1,103 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional, Dict
+
+from models import Product, ProductDB, ProductStatsDB
+from database import get_async_db
+from pagination import InvalidCursor, next_cursor, resolve_page
+from queries import filter_products
+from serialization import PRODUCT_COLUMNS, dump_products
+from cache import response_cache
+from aggregates import stats_from_rows
+
+# Versiones asíncronas de los endpoints de lectura. api.py las registra en lugar
+# de las síncronas cuando ASYNC_DB está activado; los parámetros, las respuestas
+# y la caché son los mismos.
+router = APIRouter()
+
+
+@router.get("/products/", response_model=List[Product], summary="Obtener productos con filtros")
+async def get_products(
+    request: Request,
+    db: AsyncSession = Depends(get_async_db),
+    min_price: Optional[float] = Query(None, description="Precio mínimo"),
+    max_price: Optional[float] = Query(None, description="Precio máximo"),
+    name: Optional[str] = Query(None, description="Término de búsqueda para el título"),
+    category: Optional[str] = Query(None, description="Categoría del producto"),
+    min_rating: Optional[float] = Query(None, description="Rating mínimo"),
+    sort: str = Query("id", pattern="^(id|relevance)$", description="Orden: id o relevance (relevancia de la búsqueda por nombre)"),
+    cursor: Optional[str] = Query(None, description="Cursor de paginación devuelto en la cabecera X-Next-Cursor"),
+    skip: int = Query(0, description="Número de registros a omitir (obsoleto, usar cursor)"),
+    limit: int = Query(100, description="Número máximo de registros a devolver")
+):
+    """
+    Obtiene una lista de productos con filtros opcionales, ordenada por ID.
+
+    Mismos parámetros y respuesta que la versión síncrona (ver GET /products/).
+    """
+    try:
+        by_relevance, after_id = resolve_page(name, sort, cursor)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    async def build(headers: Dict[str, str]) -> bytes:
+        stmt = filter_products(
+            select(*PRODUCT_COLUMNS), db,
+            min_price=min_price, max_price=max_price, name=name, category=category,
+            min_rating=min_rating, by_relevance=by_relevance, after_id=after_id
+        )
+
+        # Aplicar paginación
+        if not cursor and skip:
+            stmt = stmt.offset(skip)
+        products = (await db.execute(stmt.limit(limit))).all()
+
+        next_page = next_cursor(products, limit) if not by_relevance else None
+        if next_page:
+            headers["X-Next-Cursor"] = next_page
+
+        # Serialización directa de las tuplas de columnas, sin objetos ORM ni
+        # validación pydantic por fila; mismo JSON que response_model=List[Product]
+        return dump_products(products)
+
+    return await response_cache.respond_async(request, build)
+
+
+@router.get("/products/{product_id}", response_model=Product, summary="Obtener un producto por ID")
+async def get_product(product_id: int, db: AsyncSession = Depends(get_async_db)):
+    """
+    Obtiene un producto específico por su ID.
+
+    - **product_id**: ID único del producto
+    """
+    product = await db.get(ProductDB, product_id)
+    if product is None:
+        raise HTTPException(status_code=404, detail="Producto no encontrado")
+    return product
+
+
+@router.get("/categories/", response_model=List[str], summary="Obtener todas las categorías")
+async def get_categories(request: Request, db: AsyncSession = Depends(get_async_db)):
+    """
+    Obtiene una lista de todas las categorías disponibles.
+    """
+    async def build(headers: Dict[str, str]) -> List[str]:
+        result = await db.execute(select(ProductDB.category).distinct())
+        return list(result.scalars().all())
+
+    return await response_cache.respond_async(request, build)
+
+
+@router.get("/stats/", tags=["Estadísticas"], summary="Obtener estadísticas de productos")
+async def get_stats(request: Request, db: AsyncSession = Depends(get_async_db)):
+    """
+    Obtiene estadísticas generales sobre los productos en la base de datos.
+
+    Se leen de la tabla de agregados product_stats (ver la versión síncrona).
+    """
+    async def build(headers: Dict[str, str]):
+        result = await db.execute(select(ProductStatsDB))
+        return stats_from_rows(result.scalars().all())
+
+    return await response_cache.respond_async(request, build)
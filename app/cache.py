@@ -0,0 +1,162 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+# Versión de los datos de productos. Cualquier escritura (guardado del scraper,
+# borrado desde la API) la incrementa, lo que invalida las respuestas cacheadas.
+# Es un contador por proceso: con varios procesos, el TTL acota la desactualización.
+_data_version = 0
+_data_version_lock = threading.Lock()
+_version_listeners = []
+
+
+def data_version() -> int:
+    return _data_version
+
+
+def bump_data_version() -> int:
+    """Marca los datos de productos como modificados"""
+    global _data_version
+    with _data_version_lock:
+        _data_version += 1
+        version = _data_version
+    for listener in _version_listeners:
+        listener(version)
+    return version
+
+
+def on_data_version_change(listener: Callable[[int], None]) -> None:
+    """Registra una función a la que se llama con la nueva versión tras cada cambio"""
+    _version_listeners.append(listener)
+
+
+class _Entry:
+    __slots__ = ("expires_at", "body", "etag", "headers")
+
+    def __init__(self, expires_at: float, body: bytes, etag: str, headers: Dict[str, str]):
+        self.expires_at = expires_at
+        self.body = body
+        self.etag = etag
+        self.headers = headers
+
+
+class ResponseCache:
+    """
+    Caché en memoria de respuestas JSON con expulsión LRU y caducidad por TTL.
+
+    Las entradas se indexan por ruta, parámetros de consulta normalizados y
+    versión de los datos. Cada respuesta lleva un ETag; si el cliente envía
+    If-None-Match con el mismo valor se responde 304 sin reconstruir el cuerpo.
+    """
+
+    def __init__(self, maxsize: int = 512, ttl: float = 30.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Tuple, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+        on_data_version_change(lambda version: self.clear())
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 and self.maxsize > 0
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    @staticmethod
+    def key(request: Request, version: int) -> Tuple:
+        """Ruta + parámetros ordenados (sin valores vacíos) + versión de datos"""
+        params = tuple(sorted(
+            (name, value) for name, value in request.query_params.multi_items() if value != ""
+        ))
+        return request.url.path, params, version
+
+    def _get(self, key: Tuple) -> Optional[_Entry]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def _set(self, key: Tuple, entry: _Entry) -> None:
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    @staticmethod
+    def _response(request: Request, entry: _Entry) -> Response:
+        headers = {"ETag": entry.etag, **entry.headers}
+        if entry.etag in request.headers.get("if-none-match", ""):
+            return Response(status_code=304, headers=headers)
+        return Response(content=entry.body, media_type="application/json", headers=headers)
+
+    def lookup(self, request: Request) -> Tuple[Tuple, Optional[Response]]:
+        """Devuelve (clave, respuesta cacheada o None) para `request`"""
+        key = self.key(request, data_version())
+        entry = self._get(key) if self.enabled else None
+        if entry is None:
+            self.misses += 1
+            return key, None
+        self.hits += 1
+        return key, self._response(request, entry)
+
+    def store(self, request: Request, key: Tuple, content: Any, headers: Dict[str, str]) -> Response:
+        """
+        Serializa `content`, lo guarda bajo `key` y devuelve la respuesta.
+
+        Si `content` ya son bytes (JSON serializado por el llamador) se usa tal cual.
+        """
+        if isinstance(content, bytes):
+            body = content
+        else:
+            # Mismo formato JSON que las respuestas normales de FastAPI
+            body = JSONResponse(content=jsonable_encoder(content)).body
+        etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        entry = _Entry(time.monotonic() + self.ttl, body, etag, headers)
+        if self.enabled:
+            self._set(key, entry)
+        return self._response(request, entry)
+
+    def respond(self, request: Request, build: Callable[[Dict[str, str]], Any]) -> Response:
+        """
+        Devuelve la respuesta cacheada para `request` o la construye con `build`.
+
+        `build` recibe un diccionario en el que puede añadir cabeceras, que se
+        cachean junto con el cuerpo.
+        """
+        key, response = self.lookup(request)
+        if response is not None:
+            return response
+        headers: Dict[str, str] = {}
+        return self.store(request, key, build(headers), headers)
+
+    async def respond_async(self, request: Request,
+                            build: Callable[[Dict[str, str]], Awaitable[Any]]) -> Response:
+        """Como respond, pero `build` es una corrutina"""
+        key, response = self.lookup(request)
+        if response is not None:
+            return response
+        headers: Dict[str, str] = {}
+        return self.store(request, key, await build(headers), headers)
+
+
+response_cache = ResponseCache(
+    maxsize=int(os.getenv("RESPONSE_CACHE_SIZE", "512")),
+    ttl=float(os.getenv("RESPONSE_CACHE_TTL", "30"))
+)
@@ -1,8 +1,12 @@
 import os
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from dotenv import load_dotenv
+from metrics import instrument_engine, pool_gauges
 
 # Cargar variables de entorno
 load_dotenv()
@@ -15,15 +19,78 @@ SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./products.db")
 if SQLALCHEMY_DATABASE_URL.startswith("postgres:"):
     SQLALCHEMY_DATABASE_URL = SQLALCHEMY_DATABASE_URL.replace("postgres:", "postgresql:", 1)
 
-try:
-    # Configurar argumentos de conexión según el tipo de base de datos
-    connect_args = {}
-    if SQLALCHEMY_DATABASE_URL.startswith("sqlite"):
-        connect_args = {"check_same_thread": False}
-    
-    engine = create_engine(
-        SQLALCHEMY_DATABASE_URL, connect_args=connect_args
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.lower() in ("1", "true", "yes")
+
+
+# Pragmas aplicados a cada conexión SQLite nueva. WAL permite que los lectores
+# sigan consultando mientras el scraper escribe, y busy_timeout hace que una
+# escritura concurrente (otro proceso o worker) espere en lugar de fallar con
+# "database is locked". Una variable vacía omite el pragma.
+SQLITE_PRAGMAS = {
+    "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "busy_timeout": os.getenv("SQLITE_BUSY_TIMEOUT", "5000"),
+    "cache_size": os.getenv("SQLITE_CACHE_SIZE", "-65536"),
+    "mmap_size": os.getenv("SQLITE_MMAP_SIZE", "268435456"),
+}
+
+
+def _is_memory_sqlite(url) -> bool:
+    return url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:")
+
+
+def engine_options(url, is_async: bool = False) -> dict:
+    """
+    Argumentos de create_engine para `url`: pool configurable con las
+    variables DB_POOL_* (salvo SQLite en memoria, que usa una única conexión).
+    """
+    url = make_url(url)
+    options = {}
+    if url.get_backend_name() == "sqlite":
+        if not is_async:
+            options["connect_args"] = {"check_same_thread": False}
+        if _is_memory_sqlite(url):
+            return options
+        if is_async:
+            # aiosqlite usa NullPool por defecto: una conexión (y sus pragmas) por sesión
+            options["poolclass"] = AsyncAdaptedQueuePool
+    options.update(
+        pool_size=int(os.getenv("DB_POOL_SIZE", "5")),
+        max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "10")),
+        pool_timeout=float(os.getenv("DB_POOL_TIMEOUT", "30")),
+        pool_recycle=int(os.getenv("DB_POOL_RECYCLE", "1800")),
+        # Descarta conexiones cortadas por el servidor; en SQLite no hace falta
+        pool_pre_ping=_env_bool("DB_POOL_PRE_PING", url.get_backend_name() != "sqlite"),
     )
+    return options
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        if value:
+            cursor.execute(f"PRAGMA {name} = {value}")
+    cursor.close()
+
+
+def configure_engine(engine) -> None:
+    """Aplica SQLITE_PRAGMAS a cada conexión nueva de un motor SQLite en fichero"""
+    if engine.dialect.name == "sqlite" and not _is_memory_sqlite(engine.url):
+        event.listen(engine, "connect", _set_sqlite_pragmas)
+
+
+def create_configured_engine(url):
+    engine = create_engine(url, **engine_options(url))
+    configure_engine(engine)
+    return engine
+
+
+try:
+    engine = create_configured_engine(SQLALCHEMY_DATABASE_URL)
     SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
     Base = declarative_base()
 except Exception as e:
@@ -31,14 +98,53 @@ except Exception as e:
     # Caer de vuelta a SQLite si hay problemas
     fallback_url = "sqlite:///./products.db"
     print(f"Usando base de datos de respaldo: {fallback_url}")
-    engine = create_engine(fallback_url, connect_args={"check_same_thread": False})
+    engine = create_configured_engine(fallback_url)
     SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
     Base = declarative_base()
 
+# Latencia de las sentencias SQL en /metrics
+instrument_engine(engine)
+
 # Dependency para obtener la sesión de la base de datos
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+# Capa asíncrona opcional: con ASYNC_DB=true los endpoints de lectura usan un
+# motor asíncrono (aiosqlite / asyncpg) y no ocupan hilos del threadpool mientras
+# esperan a la base de datos. Las escrituras y el scraper siguen usando el motor síncrono.
+ASYNC_DB = os.getenv("ASYNC_DB", "false").lower() in ("1", "true", "yes")
+
+_ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+}
+
+
+def _async_url(url):
+    """Misma base de datos que `url` con el driver asíncrono correspondiente"""
+    backend = url.get_backend_name()
+    if backend not in _ASYNC_DRIVERS:
+        raise ValueError(f"ASYNC_DB no está soportado para la base de datos {backend!r}")
+    return url.set(drivername=_ASYNC_DRIVERS[backend])
+
+
+async_engine = None
+AsyncSessionLocal = None
+if ASYNC_DB:
+    async_engine = create_async_engine(_async_url(engine.url), **engine_options(engine.url, is_async=True))
+    configure_engine(async_engine.sync_engine)
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+    instrument_engine(async_engine.sync_engine, "async")
+
+pool_gauges({"sync": engine, **({"async": async_engine.sync_engine} if async_engine is not None else {})})
+
+
+# Dependency para obtener una sesión asíncrona de la base de datos
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -0,0 +1,82 @@
+import csv
+import io
+import logging
+import zlib
+from typing import Any, Callable, Dict, Iterable, Iterator, List
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from queries import filter_products
+from serialization import PRODUCT_COLUMNS, PRODUCT_FIELDS, dumps, product_dicts
+
+logger = logging.getLogger(__name__)
+
+# Filas leídas del cursor de la base de datos en cada lote
+EXPORT_BATCH_SIZE = 1000
+
+EXPORT_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+def _ndjson_chunks(batches: Iterable[List]) -> Iterator[bytes]:
+    for rows in batches:
+        yield b"".join(dumps(product) + b"\n" for product in product_dicts(rows))
+
+
+def _csv_chunks(batches: Iterable[List]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(PRODUCT_FIELDS)
+    for rows in batches:
+        writer.writerows(rows)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    # Cabecera sola si no hay productos
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+_ENCODERS: Dict[str, Callable[[Iterable[List]], Iterator[bytes]]] = {
+    "ndjson": _ndjson_chunks,
+    "csv": _csv_chunks,
+}
+
+
+def gzip_chunks(chunks: Iterable[bytes], level: int = 6) -> Iterator[bytes]:
+    """Comprime un flujo de bytes en formato gzip a medida que se genera"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def export_products(session_factory: Callable[[], Session], fmt: str,
+                    compress: bool = False, **filters: Any) -> Iterator[bytes]:
+    """
+    Genera todos los productos que cumplen `filters` en formato `fmt`.
+
+    Las filas se leen por lotes con yield_per (cursor del lado del servidor en
+    PostgreSQL), así que la memoria no depende del tamaño de la tabla. La
+    sesión se abre dentro del generador porque la respuesta se sigue enviando
+    después de que el endpoint haya devuelto.
+    """
+    db = session_factory()
+    try:
+        stmt = filter_products(select(*PRODUCT_COLUMNS), db, **filters)
+        result = db.execute(stmt.execution_options(yield_per=EXPORT_BATCH_SIZE))
+        chunks = _ENCODERS[fmt](result.partitions())
+        if compress:
+            chunks = gzip_chunks(chunks)
+        yield from chunks
+    except Exception as e:
+        # La respuesta ya ha empezado: solo se puede cortar el flujo
+        logger.error("Error durante la exportación de productos: %s", e)
+        raise
+    finally:
+        db.close()
@@ -0,0 +1,66 @@
+import hashlib
+import json
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import func
+
+from frontier import Link
+from models import PageFingerprintDB
+
+# Campos del listado que determinan si un producto ha cambiado
+HASHED_FIELDS = ("title", "price", "category", "rating", "image_url", "detail_url")
+
+
+def page_hash(html: str) -> str:
+    """Huella del contenido de una página descargada"""
+    return hashlib.sha1(html.encode("utf-8")).hexdigest()
+
+
+def product_hash(product: Dict[str, Any]) -> str:
+    """Huella de los campos de un producto; igual huella = nada que actualizar"""
+    values = [product.get(field) for field in HASHED_FIELDS]
+    # Los números se normalizan a float para que 3 y 3.0 den la misma huella
+    values = [float(value) if isinstance(value, int) else value for value in values]
+    return hashlib.sha1(json.dumps(values, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def load_page_hashes(db: Session) -> Dict[str, Tuple[str, Optional[List[Link]]]]:
+    """(huella, enlaces seguidos o None si no se conocen) de todas las páginas rastreadas, por URL"""
+    return {
+        url: (digest, [tuple(link) for link in json.loads(links)] if links is not None else None)
+        for url, digest, links in db.query(
+            PageFingerprintDB.url, PageFingerprintDB.content_hash, PageFingerprintDB.links
+        ).all()
+    }
+
+
+def store_page_hashes(db: Session, pages: Iterable[Tuple[str, str, Optional[List[Link]]]]) -> None:
+    """Guarda (url, huella, enlaces) de páginas cuyos productos ya están en la base de datos"""
+    rows = {
+        url: {"url": url, "content_hash": digest, "links": json.dumps(links) if links is not None else None}
+        for url, digest, links in pages
+    }
+    if not rows:
+        return
+    table = PageFingerprintDB.__table__
+    dialect = db.get_bind().dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        insert = sqlite_insert if dialect == "sqlite" else postgresql_insert
+        stmt = insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.url],
+            set_={"content_hash": stmt.excluded.content_hash, "links": stmt.excluded.links, "crawled_at": func.now()}
+        )
+        db.execute(stmt, list(rows.values()))
+    else:
+        for row in rows.values():
+            db.merge(PageFingerprintDB(**row))
+    db.commit()
+
+
+def clear_page_hashes(db: Session) -> None:
+    """Olvida las huellas de página (sin commit), p. ej. al borrar todos los productos"""
+    db.query(PageFingerprintDB).delete()
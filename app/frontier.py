@@ -0,0 +1,190 @@
+import hashlib
+import threading
+from collections import deque
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urldefrag, urlsplit
+
+from parsers import ParsedPage
+
+# Enlace de la frontera: (url, categoría de los productos de esa página o None)
+Link = Tuple[str, Optional[str]]
+
+
+def normalize_url(url: str) -> str:
+    """URL sin fragmento y con esquema y host en minúsculas"""
+    url, _ = urldefrag(url)
+    parts = urlsplit(url)
+    return parts._replace(scheme=parts.scheme.lower(), netloc=parts.netloc.lower()).geturl()
+
+
+def follow_page(page: ParsedPage, category: Optional[str]) -> Tuple[List[Dict[str, Any]], List[Link]]:
+    """
+    Productos de `page` etiquetados con `category` y enlaces a seguir desde ella.
+
+    Desde una página sin categoría propia que muestra el menú de categorías
+    (la portada) se siguen solo los enlaces de categoría y sus productos se
+    descartan, porque reaparecen en las categorías; desde el resto, el enlace
+    "next" de la paginación, que hereda la categoría.
+    """
+    if category is None and page.categories:
+        return [], [(url, name) for url, name in page.categories]
+
+    links = [(page.next_url, category)] if page.next_url else []
+    products = page.products
+    if category:
+        products = [{**product, "category": category} for product in products]
+    return products, links
+
+
+class VisitedSet:
+    """
+    Conjunto de URLs ya vistas guardando solo un hash de 64 bits por URL.
+
+    Ocupa mucho menos que las cadenas completas; la probabilidad de colisión
+    es despreciable para el tamaño de un catálogo.
+    """
+
+    def __init__(self):
+        self._hashes = set()
+
+    @staticmethod
+    def _key(url: str) -> int:
+        return int.from_bytes(hashlib.blake2b(url.encode("utf-8"), digest_size=8).digest(), "big")
+
+    def add(self, url: str) -> bool:
+        """Añade `url`; devuelve False si ya estaba"""
+        key = self._key(url)
+        if key in self._hashes:
+            return False
+        self._hashes.add(key)
+        return True
+
+    def __contains__(self, url: str) -> bool:
+        return self._key(url) in self._hashes
+
+    def __len__(self) -> int:
+        return len(self._hashes)
+
+
+class CrawlFrontier:
+    """
+    Frontera de crawl: URLs pendientes de descargar, descubiertas en el HTML.
+
+    Los enlaces a seguir y la categoría de los productos de cada página se
+    deciden con follow_page.
+
+    El crawl termina solo cuando no quedan URLs pendientes ni páginas en
+    proceso que puedan descubrir más (o al llegar a `max_pages`). Con
+    follow_links=False se limita a recorrer `seeds`. Es segura entre hilos.
+    """
+
+    def __init__(self, seeds: Iterable[str], max_pages: Optional[int] = None, follow_links: bool = True):
+        self.max_pages = max_pages
+        self.follow_links = follow_links
+        self._visited = VisitedSet()
+        self._queue: deque = deque()
+        self._categories: Dict[str, str] = {}
+        # Páginas entregadas con pop/get cuyo procesamiento no ha terminado
+        self._in_progress = 0
+        self._closed = False
+        self._condition = threading.Condition()
+        # Solo se siguen enlaces del mismo host que las semillas
+        self._hosts = set()
+
+        seeds = [normalize_url(url) for url in seeds]
+        self._hosts.update(urlsplit(url).netloc for url in seeds)
+        with self._condition:
+            for url in seeds:
+                self._admit(url, None)
+
+    def _admit(self, url: str, category: Optional[str]) -> bool:
+        if self.max_pages is not None and len(self._visited) >= self.max_pages:
+            return False
+        if not self._visited.add(url):
+            return False
+        self._queue.append(url)
+        if category:
+            self._categories[url] = category
+        return True
+
+    def add_links(self, links: Iterable[Link]) -> int:
+        """Encola los enlaces no vistos; devuelve cuántos se añadieron"""
+        if not self.follow_links:
+            return 0
+        added = 0
+        with self._condition:
+            for url, category in links:
+                url = normalize_url(url)
+                if urlsplit(url).netloc in self._hosts and self._admit(url, category):
+                    added += 1
+            if added:
+                self._condition.notify_all()
+        return added
+
+    def process(self, page: ParsedPage) -> Tuple[List[Dict[str, Any]], List[Link]]:
+        """
+        Encola los enlaces a seguir desde `page`.
+
+        Devuelve los productos a guardar, con su categoría, y los enlaces
+        seguidos, para poder repetirlos sin parsear si la página no cambia.
+        """
+        if not self.follow_links:
+            return page.products, []
+
+        with self._condition:
+            category = self._categories.get(normalize_url(page.url))
+
+        products, links = follow_page(page, category)
+        self.add_links(links)
+        return products, links
+
+    def pop(self) -> Optional[str]:
+        """Siguiente URL pendiente, o None si no hay ninguna ahora mismo"""
+        with self._condition:
+            if self._closed or not self._queue:
+                return None
+            self._in_progress += 1
+            return self._queue.popleft()
+
+    def get(self, timeout: float = 0.1) -> Optional[str]:
+        """
+        Espera a la siguiente URL pendiente.
+
+        Devuelve None cuando la frontera se agota (nada pendiente ni en
+        proceso) o se cierra.
+        """
+        with self._condition:
+            while not self._closed:
+                if self._queue:
+                    self._in_progress += 1
+                    return self._queue.popleft()
+                if self._in_progress == 0:
+                    return None
+                self._condition.wait(timeout)
+            return None
+
+    def done(self, url: str) -> None:
+        """Marca como terminada una URL devuelta por pop/get (con o sin éxito)"""
+        with self._condition:
+            self._in_progress -= 1
+            self._categories.pop(normalize_url(url), None)
+            self._condition.notify_all()
+
+    def close(self) -> None:
+        """Detiene el crawl: get devuelve None en adelante"""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+    @property
+    def exhausted(self) -> bool:
+        with self._condition:
+            return self._closed or (not self._queue and self._in_progress == 0)
+
+    def stats(self) -> Dict[str, int]:
+        with self._condition:
+            return {
+                "discovered": len(self._visited),
+                "pending": len(self._queue),
+                "in_progress": self._in_progress,
+            }
@@ -0,0 +1,70 @@
+import hashlib
+import json
+import os
+import tempfile
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+
+@dataclass
+class CachedResponse:
+    """Respuesta almacenada en la caché HTTP local"""
+    url: str
+    body: str
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
+    def conditional_headers(self) -> Dict[str, str]:
+        """Cabeceras para una petición GET condicional"""
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class HttpCache:
+    """
+    Caché HTTP en disco indexada por URL.
+
+    Guarda el cuerpo junto con ETag/Last-Modified para poder revalidar con
+    If-None-Match/If-Modified-Since y reutilizar el cuerpo cuando el servidor
+    responde 304. Cada URL se guarda en un fichero JSON propio, escrito de forma
+    atómica para que varios hilos puedan compartir la misma caché.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, url: str) -> str:
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, url: str) -> Optional[CachedResponse]:
+        try:
+            with open(self._path(url), "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if data.get("url") != url:
+            return None
+        return CachedResponse(**data)
+
+    def store(self, url: str, body: str, etag: Optional[str] = None,
+              last_modified: Optional[str] = None) -> bool:
+        """Guarda una respuesta; sin ETag ni Last-Modified no hay nada que revalidar"""
+        if not etag and not last_modified:
+            return False
+        data = {"url": url, "body": body, "etag": etag, "last_modified": last_modified}
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self._path(url))
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return False
+        return True
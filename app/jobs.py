@@ -0,0 +1,256 @@
+import json
+import logging
+import threading
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from models import ScrapeJob, ScrapeJobDB
+from pipeline import ScrapePipeline
+from scraper import WebScraper
+
+logger = logging.getLogger(__name__)
+
+# Estados de un trabajo
+PENDING = "pending"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+ACTIVE_STATUSES = (PENDING, RUNNING)
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def dedupe_key(url: str, pages: int) -> str:
+    """Clave que identifica peticiones de scraping equivalentes"""
+    return f"{url.rstrip('/')}|{pages}"
+
+
+class _ActiveJob:
+    """Estado en memoria de un trabajo en cola o en ejecución en este proceso"""
+
+    def __init__(self, key: str):
+        self.key = key
+        self.future: Optional[Future] = None
+        self.pipeline: Optional[ScrapePipeline] = None
+        self.cancel_requested = False
+
+
+class JobRunner:
+    """
+    Ejecuta trabajos de scraping persistidos en la tabla scrape_jobs.
+
+    - Como mucho `max_concurrent_jobs` trabajos se ejecutan a la vez; el resto
+      espera en cola con estado "pending".
+    - Una petición idéntica (misma URL y páginas) a un trabajo pendiente o en
+      curso devuelve ese trabajo en lugar de crear otro.
+    - El progreso se guarda en la base de datos tras cada lote de productos.
+
+    La base de datos manda sobre el estado en memoria: con varios procesos
+    (uvicorn --workers) la cancelación puede llegar a otro proceso, que solo
+    marca la fila como "cancelled", y el proceso que ejecuta el trabajo lo
+    detiene al guardar el siguiente lote.
+    """
+
+    def __init__(self, session_factory: Callable[[], Session], max_concurrent_jobs: int = 2):
+        self.session_factory = session_factory
+        self.max_concurrent_jobs = max_concurrent_jobs
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrent_jobs, thread_name_prefix="scrape-job")
+        self._lock = threading.Lock()
+        self._active: Dict[str, _ActiveJob] = {}
+
+    def _update(self, job_id: str, only_if: Optional[str] = None, **fields) -> bool:
+        """Actualiza el trabajo; con `only_if`, solo si sigue en ese estado. Devuelve si cambió"""
+        with self.session_factory() as db:
+            query = db.query(ScrapeJobDB).filter(ScrapeJobDB.id == job_id)
+            if only_if is not None:
+                query = query.filter(ScrapeJobDB.status == only_if)
+            count = query.update(fields, synchronize_session=False)
+            db.commit()
+        return count > 0
+
+    def submit(self, url: str, pages: int, concurrency: int = 1) -> Tuple[ScrapeJob, bool]:
+        """Encola un trabajo. Devuelve (trabajo, creado) donde creado=False si se reutilizó uno en curso"""
+        key = dedupe_key(url, pages)
+        with self._lock:
+            with self.session_factory() as db:
+                existing = db.query(ScrapeJobDB).filter(
+                    ScrapeJobDB.dedupe_key == key,
+                    ScrapeJobDB.status.in_(ACTIVE_STATUSES)
+                ).first()
+                if existing is not None:
+                    logger.info("Petición de scraping duplicada, reutilizando trabajo %s", existing.id)
+                    return self._to_model(existing), False
+
+                job = ScrapeJobDB(
+                    id=uuid.uuid4().hex,
+                    dedupe_key=key,
+                    url=url,
+                    pages=pages,
+                    concurrency=concurrency,
+                    status=PENDING,
+                    pages_done=0,
+                    products_saved=0,
+                    created_at=_now()
+                )
+                db.add(job)
+                db.commit()
+                # Otro proceso pudo crear el mismo trabajo entre la consulta y
+                # el commit: se queda el más antiguo y este se descarta
+                first = db.query(ScrapeJobDB).filter(
+                    ScrapeJobDB.dedupe_key == key,
+                    ScrapeJobDB.status.in_(ACTIVE_STATUSES)
+                ).order_by(ScrapeJobDB.created_at, ScrapeJobDB.id).first()
+                if first is not None and first.id != job.id:
+                    db.delete(job)
+                    db.commit()
+                    logger.info("Petición de scraping duplicada, reutilizando trabajo %s", first.id)
+                    return self._to_model(first), False
+                result = self._to_model(job)
+
+            active = _ActiveJob(key)
+            self._active[job.id] = active
+            active.future = self._executor.submit(self._run, job.id, url, pages, concurrency)
+
+        logger.info("Trabajo de scraping %s encolado para %s, %s páginas", result.id, url, pages)
+        return result, True
+
+    def get(self, job_id: str) -> Optional[ScrapeJob]:
+        with self.session_factory() as db:
+            job = db.query(ScrapeJobDB).filter(ScrapeJobDB.id == job_id).first()
+            return self._to_model(job) if job is not None else None
+
+    def cancel(self, job_id: str) -> Optional[ScrapeJob]:
+        """Cancela un trabajo pendiente o en curso; los ya terminados no cambian"""
+        with self._lock:
+            active = self._active.get(job_id)
+            if active is not None:
+                active.cancel_requested = True
+                if active.future is not None and active.future.cancel():
+                    # Aún no había empezado: no llegará a ejecutarse
+                    self._active.pop(job_id, None)
+                    self._update(job_id, status=CANCELLED, finished_at=_now())
+                elif active.pipeline is not None:
+                    active.pipeline.stop()
+            else:
+                # Trabajo de otro proceso o huérfano: solo se puede marcar en la base de datos
+                with self.session_factory() as db:
+                    db.query(ScrapeJobDB).filter(
+                        ScrapeJobDB.id == job_id,
+                        ScrapeJobDB.status.in_(ACTIVE_STATUSES)
+                    ).update({"status": CANCELLED, "finished_at": _now()}, synchronize_session=False)
+                    db.commit()
+        return self.get(job_id)
+
+    def _progress(self, job_id: str, stats: Dict[str, Any], pipeline: ScrapePipeline) -> None:
+        updated = self._update(
+            job_id,
+            only_if=RUNNING,
+            pages_done=stats["stages"]["parse"]["items"] + stats["pages_unchanged"],
+            products_saved=stats["inserted"] + stats["updated"],
+            stats=json.dumps(stats)
+        )
+        if not updated:
+            # Cancelado (o marcado como interrumpido) desde otro proceso
+            logger.info("El trabajo de scraping %s ya no está en curso, deteniéndolo", job_id)
+            pipeline.stop()
+
+    def _run(self, job_id: str, url: str, pages: int, concurrency: int) -> None:
+        active = self._active[job_id]
+        pipeline = None
+        try:
+            if not self._update(job_id, only_if=PENDING, status=RUNNING, started_at=_now()):
+                logger.info("El trabajo de scraping %s se canceló antes de empezar", job_id)
+                return
+            with WebScraper.from_env(url, concurrency) as scraper:
+                pipeline = ScrapePipeline(
+                    scraper, self.session_factory, concurrency=concurrency,
+                    progress_callback=lambda stats: self._progress(job_id, stats, pipeline)
+                )
+                with self._lock:
+                    active.pipeline = pipeline
+                    if active.cancel_requested:
+                        pipeline.stop()
+                stats = pipeline.run(scraper.frontier(max_pages=pages))
+            status = CANCELLED if pipeline.stopped else COMPLETED
+            fields = {
+                "pages_done": stats["stages"]["parse"]["items"] + stats["pages_unchanged"],
+                "products_saved": stats["inserted"] + stats["updated"],
+                "stats": json.dumps(stats),
+            }
+            # Solo si sigue en curso: una cancelación de otro proceso no se sobrescribe
+            if not self._update(job_id, only_if=RUNNING, status=status, finished_at=_now(), **fields):
+                self._update(job_id, **fields)
+                job = self.get(job_id)
+                status = job.status if job is not None else status
+            logger.info("Trabajo de scraping %s terminado con estado %s", job_id, status)
+        except Exception as e:
+            logger.error("Error en el trabajo de scraping %s: %s", job_id, e, exc_info=True)
+            fields = {"status": FAILED, "finished_at": _now(), "error": str(e)}
+            if pipeline is not None:
+                fields["stats"] = json.dumps(pipeline.stats())
+            self._update(job_id, only_if=RUNNING, **fields)
+        finally:
+            with self._lock:
+                self._active.pop(job_id, None)
+
+    def mark_interrupted(self) -> int:
+        """
+        Marca como fallidos los trabajos que quedaron activos tras una caída.
+
+        Debe llamarse una sola vez al arrancar, antes de aceptar peticiones.
+        """
+        with self.session_factory() as db:
+            count = db.query(ScrapeJobDB).filter(
+                ScrapeJobDB.status.in_(ACTIVE_STATUSES)
+            ).update(
+                {"status": FAILED, "error": "Interrumpido por reinicio del servidor", "finished_at": _now()},
+                synchronize_session=False
+            )
+            db.commit()
+        if count:
+            logger.warning("%s trabajos de scraping interrumpidos marcados como fallidos", count)
+        return count
+
+    def shutdown(self) -> None:
+        with self._lock:
+            for active in self._active.values():
+                active.cancel_requested = True
+                if active.pipeline is not None:
+                    active.pipeline.stop()
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+    @staticmethod
+    def _to_model(job: ScrapeJobDB) -> ScrapeJob:
+        duration = None
+        if job.started_at is not None:
+            end = job.finished_at or _now()
+            started_at = job.started_at
+            # SQLite devuelve fechas sin zona horaria
+            if started_at.tzinfo is None:
+                started_at = started_at.replace(tzinfo=timezone.utc)
+            if end.tzinfo is None:
+                end = end.replace(tzinfo=timezone.utc)
+            duration = round((end - started_at).total_seconds(), 3)
+        return ScrapeJob(
+            id=job.id,
+            url=job.url,
+            pages=job.pages,
+            concurrency=job.concurrency,
+            status=job.status,
+            pages_done=job.pages_done or 0,
+            products_saved=job.products_saved or 0,
+            error=job.error,
+            created_at=job.created_at,
+            started_at=job.started_at,
+            finished_at=job.finished_at,
+            duration_seconds=duration,
+            stats=json.loads(job.stats) if job.stats else None
+        )
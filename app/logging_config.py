@@ -0,0 +1,190 @@
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, List, Optional, Tuple
+
+from metrics import REGISTRY
+
+LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+# Marca de los mensajes que se repiten por cada producto o página y se
+# muestrean: logger.info("Producto extraído: %s", title, extra=SAMPLED)
+SAMPLED = {"sampled": True}
+
+LOG_RECORDS_SAMPLED = REGISTRY.counter(
+    "log_records_sampled_total", "Mensajes de log omitidos por el muestreo (se suman al cerrar cada ventana)",
+    ("logger",)
+)
+LOG_RECORDS_DROPPED = REGISTRY.counter(
+    "log_records_dropped_total", "Mensajes de log descartados por tener la cola llena"
+)
+
+_exception_formatter = logging.Formatter()
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Deja pasar como máximo `rate` mensajes por segundo de cada evento marcado con SAMPLED.
+
+    El evento es el logger más la plantilla del mensaje, que con formato
+    perezoso es la misma para todos los productos: "Producto extraído: %s" y
+    "Nuevo producto añadido: %s" se muestrean por separado. El primer mensaje
+    que pasa tras omitir otros indica cuántos se omitieron. Los mensajes sin
+    la marca pasan siempre; con rate <= 0 no se muestrea nada.
+    """
+
+    # Tope de eventos distintos, por si se marcan mensajes ya formateados
+    max_events = 1000
+
+    def __init__(self, rate: float = 5.0):
+        super().__init__()
+        self.rate = rate
+        # evento -> [inicio de la ventana de 1 s, mensajes que pasaron, mensajes omitidos]
+        self._windows: Dict[Tuple[str, Any], List] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.rate <= 0 or not getattr(record, "sampled", False):
+            return True
+        key = (record.name, record.msg)
+        now = time.monotonic()
+        with self._lock:
+            window = self._windows.get(key)
+            omitted = 0
+            if window is None or now - window[0] >= 1.0:
+                if window is None and len(self._windows) >= self.max_events:
+                    self._windows.clear()
+                omitted = window[2] if window else 0
+                window = self._windows[key] = [now, 0, 0]
+            passed = window[1] < self.rate
+            if passed:
+                window[1] += 1
+            else:
+                window[2] += 1
+        if not passed:
+            return False
+        if omitted:
+            LOG_RECORDS_SAMPLED.inc(omitted, logger=record.name)
+            if isinstance(record.args, tuple):
+                record.msg = f"{record.msg} (%s mensajes similares omitidos)"
+                record.args = record.args + (omitted,)
+        return True
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    QueueHandler que nunca bloquea al hilo que registra el mensaje.
+
+    En el hilo llamante solo se resuelve el texto del mensaje (los argumentos
+    podrían cambiar después); el formato completo y la escritura los hace el
+    hilo del QueueListener. Si la cola está llena, el mensaje se descarta.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            # Las trazas no se pueden formatear más tarde: el frame ya no existiría
+            record.exc_text = _exception_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.inc()
+
+
+class _Listener(QueueListener):
+    def enqueue_sentinel(self) -> None:
+        # Bloqueante: al terminar, la cola puede estar llena
+        self.queue.put(self._sentinel)
+
+
+_listener: Optional[_Listener] = None
+_handler: Optional[NonBlockingQueueHandler] = None
+_lock = threading.Lock()
+
+
+def configure_logging(level: Optional[str] = None, log_file: Optional[str] = None,
+                      sample_rate: Optional[float] = None, queue_size: Optional[int] = None) -> None:
+    """
+    Configura el logging de la aplicación; debe llamarse desde el punto de entrada.
+
+    El logger raíz deja los mensajes en una cola y un hilo de fondo los
+    formatea y escribe en stderr y, si hay fichero, en `log_file`, de modo que
+    los hilos de la API y del scraper no esperan a la E/S. Los valores que no
+    se indican se leen de LOG_LEVEL, LOG_FILE, LOG_SAMPLE_RATE y LOG_QUEUE_SIZE.
+    Sustituye los handlers que tuviera el logger raíz.
+    """
+    global _listener, _handler
+    level = (level or os.getenv("LOG_LEVEL", "INFO")).upper()
+    log_file = os.getenv("LOG_FILE", "scraper.log") if log_file is None else log_file
+    sample_rate = float(os.getenv("LOG_SAMPLE_RATE", "5")) if sample_rate is None else sample_rate
+    queue_size = int(os.getenv("LOG_QUEUE_SIZE", "10000")) if queue_size is None else queue_size
+
+    formatter = logging.Formatter(LOG_FORMAT)
+    handlers: List[logging.Handler] = [logging.StreamHandler()]
+    if log_file:
+        handlers.append(logging.FileHandler(log_file))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(maxsize=queue_size)
+    root_handler = NonBlockingQueueHandler(log_queue)
+    root_handler.addFilter(SamplingFilter(sample_rate))
+
+    with _lock:
+        stop_logging()
+        root = logging.getLogger()
+        for existing in root.handlers[:]:
+            root.removeHandler(existing)
+            existing.close()
+        root.addHandler(root_handler)
+        root.setLevel(level)
+        _handler = root_handler
+        _listener = _Listener(log_queue, *handlers, respect_handler_level=True)
+        _listener.start()
+
+
+def stop_logging() -> None:
+    """Escribe los mensajes pendientes y detiene el hilo de fondo (se llama al salir)"""
+    global _listener, _handler
+    if _listener is None:
+        return
+    _listener.stop()
+    for handler in _listener.handlers:
+        handler.close()
+    logging.getLogger().removeHandler(_handler)
+    _listener = None
+    _handler = None
+
+
+atexit.register(stop_logging)
+
+
+def queue_handler() -> logging.Handler:
+    """Handler de la cola ya configurada (o que se configura ahora), para dictConfig"""
+    if _handler is None:
+        configure_logging()
+    return _handler
+
+
+def uvicorn_log_config() -> Dict[str, Any]:
+    """
+    log_config de uvicorn que envía sus logs (incluido el de acceso) a la cola.
+
+    Hace falta con varios workers: cada proceso worker arranca sin
+    configurar y uvicorn aplica este diccionario en él.
+    """
+    return {
+        "version": 1,
+        "disable_existing_loggers": False,
+        "handlers": {"queue": {"()": "logging_config.queue_handler"}},
+        "root": {"handlers": ["queue"], "level": os.getenv("LOG_LEVEL", "INFO").upper()},
+    }
@@ -2,41 +2,85 @@
 import logging
 import argparse
 import os
-from fastapi import FastAPI
-from fastapi.middleware.cors import CORSMiddleware
+import sys
 import uvicorn
-from api import app as api_app
-from database import engine
+from api import app as api_app, job_runner
+from database import engine, SessionLocal
 from models import Base
+from migrations import run_migrations
+from aggregates import check_stats, rebuild_stats
+from importer import IMPORT_FORMATS, import_products, open_binary
+from logging_config import configure_logging, uvicorn_log_config
+from scraper import WebScraper
+from work_queue import PageWorker, PageWorkQueue
 from sqlalchemy.exc import SQLAlchemyError
 from dotenv import load_dotenv
 
 # Cargar variables de entorno
 load_dotenv()
 
-# Configuración de logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
 logger = logging.getLogger(__name__)
 
-# Crear tablas en la base de datos
-try:
-    Base.metadata.create_all(bind=engine)
-    logger.info("Base de datos inicializada correctamente")
-except SQLAlchemyError as e:
-    logger.error(f"Error al inicializar la base de datos: {e}")
-    raise
-
-# Agregar CORS middleware
-api_app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],  # En producción, especificar dominios permitidos
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+def init_database() -> None:
+    """Crea las tablas y aplica las migraciones pendientes"""
+    try:
+        Base.metadata.create_all(bind=engine)
+        run_migrations(engine)
+        logger.info("Base de datos inicializada correctamente")
+    except SQLAlchemyError as e:
+        logger.error("Error al inicializar la base de datos: %s", e)
+        raise
+
+def check_stats_command(args) -> int:
+    """Compara los agregados de /stats/ con un recálculo desde cero"""
+    with SessionLocal() as db:
+        drift = check_stats(db)
+        if not drift:
+            logger.info("Los agregados de productos son consistentes")
+            return 0
+        for line in drift:
+            logger.warning("Diferencia en agregados: %s", line)
+        if args.fix:
+            rebuild_stats(db)
+            return 0
+        return 1
+
+def import_command(args) -> int:
+    """Carga un fichero NDJSON o CSV (opcionalmente .gz) exportado de otra instancia"""
+    path = args.file
+    compressed = path.endswith(".gz")
+    fmt = args.format or ("csv" if path.removesuffix(".gz").endswith(".csv") else "ndjson")
+    
+    if path == "-":
+        result = import_products(open_binary(sys.stdin.buffer, fmt), engine, batch_size=args.batch_size)
+    else:
+        with open(path, "rb") as f:
+            result = import_products(open_binary(f, fmt, compressed), engine, batch_size=args.batch_size)
+    
+    logger.info("Importados %s productos en %ss (%s filas/s), %s descartados",
+                result['rows'], result['seconds'], result['rows_per_second'], result['skipped'])
+    return 0
+
+def worker_command(args) -> int:
+    """Procesa páginas de la cola compartida del crawl distribuido"""
+    work_queue = PageWorkQueue(SessionLocal, lease_seconds=args.lease_seconds, max_attempts=args.max_attempts)
+    if args.seed:
+        # Un crawl nuevo: se descartan las páginas del anterior
+        work_queue.seed([args.seed])
+        logger.info("Cola de páginas reiniciada desde %s", args.seed)
+    
+    with WebScraper.from_env(args.seed or "", concurrency=args.concurrency) as scraper:
+        worker = PageWorker(
+            scraper, SessionLocal, work_queue,
+            worker_id=args.worker_id,
+            concurrency=args.concurrency,
+            exit_when_drained=not args.forever
+        )
+        worker.run()
+    
+    stats = work_queue.stats()
+    logger.info("Estado de la cola: %s", stats)
+    return 1 if stats["failed"] else 0
 
 def main():
     parser = argparse.ArgumentParser(description="Web Scraper y API de Productos")
@@ -44,14 +88,72 @@ def main():
                         help="Host para la API")
     parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")), 
                         help="Puerto para la API")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", "1")),
+                        help="Procesos de uvicorn que sirven la API")
+    
+    # Subcomandos; sin subcomando se inicia la API
+    subparsers = parser.add_subparsers(dest="command")
+    check_parser = subparsers.add_parser("check-stats", help="Comprobar los agregados de /stats/")
+    check_parser.add_argument("--fix", action="store_true",
+                              help="Reconstruir los agregados si hay diferencias")
+    
+    import_parser = subparsers.add_parser("import", help="Importar productos desde un fichero NDJSON o CSV")
+    import_parser.add_argument("file", help="Fichero a importar (.ndjson, .csv, opcionalmente .gz; - para stdin)")
+    import_parser.add_argument("--format", choices=IMPORT_FORMATS, default=None,
+                               help="Formato del fichero (por defecto, según la extensión)")
+    import_parser.add_argument("--batch-size", type=int, default=50000,
+                               help="Filas por transacción")
+    
+    worker_parser = subparsers.add_parser(
+        "worker", help="Worker del crawl distribuido: procesa páginas de la cola page_tasks"
+    )
+    worker_parser.add_argument("--seed", default=None,
+                               help="Empezar un crawl nuevo desde esta URL (vacía la cola)")
+    worker_parser.add_argument("--concurrency", type=int, default=1,
+                               help="Páginas procesándose a la vez en este proceso")
+    worker_parser.add_argument("--lease-seconds", type=float, default=120.0,
+                               help="Segundos tras los que otra instancia puede reclamar una página no completada")
+    worker_parser.add_argument("--max-attempts", type=int, default=3,
+                               help="Intentos por página antes de darla por fallida")
+    worker_parser.add_argument("--worker-id", default=None,
+                               help="Identificador del worker (por defecto, host-pid-aleatorio)")
+    worker_parser.add_argument("--forever", action="store_true",
+                               help="Seguir esperando páginas cuando la cola se vacía")
     
     args = parser.parse_args()
     
+    # Configuración de logging: cola con escritura en un hilo de fondo
+    # (LOG_LEVEL, LOG_FILE, LOG_SAMPLE_RATE y LOG_QUEUE_SIZE). Aquí y no al
+    # importar el módulo, para no arrancar el hilo ni abrir el fichero de log
+    # en los tests, los benchmarks o los procesos de uvicorn
+    configure_logging()
+    init_database()
+    
+    if args.command == "check-stats":
+        sys.exit(check_stats_command(args))
+    if args.command == "import":
+        sys.exit(import_command(args))
+    if args.command == "worker":
+        sys.exit(worker_command(args))
+    
+    # Los trabajos que quedaron a medias en una ejecución anterior ya no avanzarán
+    job_runner.mark_interrupted()
+    
     # Iniciar la API (el scraping ahora se maneja vía endpoints)
-    logger.info(f"Iniciando API en {args.host}:{args.port}")
+    logger.info("Iniciando API en %s:%s", args.host, args.port)
+    
+    if args.workers > 1:
+        # Cada worker importa solo api:app: las tablas y migraciones ya se
+        # prepararon una vez en este proceso, antes de arrancarlos
+        logger.info("Iniciando %s workers de uvicorn", args.workers)
+        uvicorn.run("api:app", host=args.host, port=args.port, workers=args.workers,
+                    log_config=uvicorn_log_config())
+        return
     
     # Usamos Application Factory de FastAPI para evitar problemas con múltiples instancias
-    uvicorn.run(api_app, host=args.host, port=args.port)
+    # Sin log_config propio, los logs de uvicorn (incluido el de acceso) pasan
+    # por la cola configurada arriba en lugar de escribirse desde el event loop
+    uvicorn.run(api_app, host=args.host, port=args.port, log_config=None)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,357 @@
+import bisect
+import math
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from anyio.to_thread import current_default_thread_limiter
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Tipo de contenido del formato de texto de Prometheus (Starlette añade el charset)
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+# Límites por defecto de los histogramas de latencia, en segundos
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape_help(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n")
+
+
+def _escape(value: str) -> str:
+    return _escape_help(value).replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+def _format_value(value: float) -> str:
+    value = float(value)
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+class _Metric:
+    """Base de las métricas: nombre, ayuda y valores por combinación de etiquetas"""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} espera las etiquetas {self.labelnames}, no {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> Iterable[Tuple[str, Sequence[str], Sequence[str], float]]:
+        """(sufijo, nombres de etiqueta, valores de etiqueta, valor) de cada muestra"""
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {_escape_help(self.documentation)}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, names, values, value in self.samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(names, values)} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    """Contador monótono"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            yield "", self.labelnames, key, value
+
+
+class Gauge(_Metric):
+    """
+    Valor que sube y baja.
+
+    Con `collect` el valor se lee en el momento de exponer las métricas: la
+    función devuelve {valores de etiqueta: valor} (o un número si no hay etiquetas).
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 collect: Optional[Callable[[], object]] = None):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._collect = collect
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def samples(self):
+        if self._collect is not None:
+            collected = self._collect()
+            values = collected.items() if isinstance(collected, dict) else [((), collected)]
+        else:
+            with self._lock:
+                values = list(self._values.items())
+        for key, value in sorted(values):
+            yield "", self.labelnames, key, value
+
+
+class Histogram(_Metric):
+    """Histograma acumulativo con límites fijos (buckets)"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Por etiquetas: [recuentos por bucket (+Inf al final), suma]
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][index] += 1
+            state[1] += value
+
+    def time(self, **labels: str) -> "_Timer":
+        """Context manager que observa la duración del bloque"""
+        return _Timer(self, labels)
+
+    def samples(self):
+        with self._lock:
+            values = sorted((key, (list(counts), total)) for key, (counts, total) in self._values.items())
+        names = self.labelnames + ("le",)
+        for key, (counts, total) in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                yield "_bucket", names, key + (_format_value(bound),), cumulative
+            yield "_sum", self.labelnames, key, total
+            yield "_count", self.labelnames, key, cumulative
+
+
+class _Timer:
+    def __init__(self, histogram: Histogram, labels: Dict[str, str]):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+
+
+class Registry:
+    """Conjunto de métricas expuestas en /metrics"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"La métrica {metric.name} ya está registrada")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+              collect: Optional[Callable[[], object]] = None) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames, collect))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        """Todas las métricas en el formato de texto de Prometheus"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# Registro global del proceso
+REGISTRY = Registry()
+
+# API
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    "http_request_duration_seconds", "Duración de las peticiones HTTP por ruta",
+    ("method", "route", "status")
+)
+HTTP_REQUESTS_IN_PROGRESS = REGISTRY.gauge(
+    "http_requests_in_progress", "Peticiones HTTP en curso", ("method",)
+)
+SERIALIZE_SECONDS = REGISTRY.histogram(
+    "serialization_duration_seconds", "Duración de la serialización JSON de listados de productos"
+)
+THREADPOOL_THREADS = REGISTRY.gauge(
+    "threadpool_threads", "Hilos del threadpool de la API (ocupados y máximo)", ("state",)
+)
+THREADPOOL_WAITING = REGISTRY.gauge(
+    "threadpool_tasks_waiting", "Tareas esperando un hilo libre del threadpool de la API"
+)
+
+# Base de datos
+DB_QUERY_SECONDS = REGISTRY.histogram(
+    "db_query_duration_seconds", "Duración de las sentencias SQL", ("engine", "operation")
+)
+DB_QUERY_ERRORS = REGISTRY.counter(
+    "db_query_errors_total", "Sentencias SQL que terminaron con error", ("engine", "operation")
+)
+
+# Scraper
+SCRAPER_FETCH_SECONDS = REGISTRY.histogram(
+    "scraper_fetch_duration_seconds", "Duración de las descargas HTTP del scraper", ("outcome",)
+)
+SCRAPER_PARSE_SECONDS = REGISTRY.histogram(
+    "scraper_parse_duration_seconds", "Duración del parseo de páginas del listado", ("outcome",)
+)
+SCRAPER_SAVE_SECONDS = REGISTRY.histogram(
+    "scraper_save_duration_seconds", "Duración de cada guardado de productos en la base de datos"
+)
+SCRAPER_PRODUCTS = REGISTRY.counter(
+    "scraper_products_total", "Productos guardados por el scraper según el resultado", ("result",)
+)
+
+
+def _operation(statement: str) -> str:
+    """Primera palabra de la sentencia (SELECT, INSERT...) para etiquetar sin disparar la cardinalidad"""
+    word = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else ""
+    return word if word in ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH", "PRAGMA", "COPY") else "OTHER"
+
+
+def instrument_engine(engine: Engine, name: str = "sync") -> None:
+    """
+    Registra la latencia de cada sentencia de `engine` en db_query_duration_seconds.
+
+    Para un motor asíncrono se instrumenta su `sync_engine`.
+    """
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("metrics_query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        start = conn.info["metrics_query_start"].pop()
+        DB_QUERY_SECONDS.observe(time.perf_counter() - start, engine=name, operation=_operation(statement))
+
+    @event.listens_for(engine, "handle_error")
+    def _error(exception_context):
+        conn = exception_context.connection
+        starts = conn.info.get("metrics_query_start") if conn is not None else None
+        if starts:
+            starts.pop()
+        DB_QUERY_ERRORS.inc(engine=name, operation=_operation(exception_context.statement or ""))
+
+
+def pool_gauges(engines: Dict[str, Engine]) -> None:
+    """Gauges de ocupación del pool de conexiones de cada motor"""
+    def collector(attribute: str) -> Callable[[], Dict[Tuple[str, ...], float]]:
+        def collect():
+            values = {}
+            for name, engine in engines.items():
+                method = getattr(engine.pool, attribute, None)
+                # SingletonThreadPool/NullPool no exponen todos los contadores
+                if callable(method):
+                    values[(name,)] = method()
+            return values
+        return collect
+
+    REGISTRY.gauge("db_pool_size", "Conexiones permanentes del pool", ("engine",), collector("size"))
+    REGISTRY.gauge("db_pool_checked_out", "Conexiones del pool en uso", ("engine",), collector("checkedout"))
+    REGISTRY.gauge("db_pool_overflow", "Conexiones abiertas por encima del tamaño del pool (negativo mientras no se ha llenado)", ("engine",),
+                   collector("overflow"))
+
+
+class MetricsMiddleware:
+    """
+    Middleware ASGI que mide cada petición HTTP hasta enviar el último byte.
+
+    La ruta se etiqueta con su plantilla (/products/{product_id}) y no con la
+    URL, para que el número de series no crezca con los ids consultados.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        HTTP_REQUESTS_IN_PROGRESS.inc(method=method)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_REQUESTS_IN_PROGRESS.dec(method=method)
+            route = scope.get("route")
+            HTTP_REQUEST_SECONDS.observe(
+                time.perf_counter() - start,
+                method=method,
+                route=route.path if route is not None else "other",
+                status=str(status["code"])
+            )
+
+
+def update_threadpool_gauges() -> None:
+    """
+    Actualiza los gauges del threadpool donde Starlette ejecuta los endpoints
+    síncronos. Debe llamarse desde el event loop de la API.
+    """
+    limiter = current_default_thread_limiter()
+    statistics = limiter.statistics()
+    THREADPOOL_THREADS.set(statistics.borrowed_tokens, state="busy")
+    THREADPOOL_THREADS.set(limiter.total_tokens, state="max")
+    THREADPOOL_WAITING.set(statistics.tasks_waiting)
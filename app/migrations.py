@@ -0,0 +1,100 @@
+import logging
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from aggregates import rebuild_stats
+from models import PageFingerprintDB, ProductDB, ProductStatsDB
+from search import setup_search
+
+logger = logging.getLogger(__name__)
+
+
+def _has_unique_index(engine: Engine, table: str, columns: list) -> bool:
+    """Comprueba si existe un índice o restricción única exactamente sobre `columns`"""
+    inspector = inspect(engine)
+    for index in inspector.get_indexes(table):
+        if index.get("unique") and index["column_names"] == columns:
+            return True
+    for constraint in inspector.get_unique_constraints(table):
+        if constraint["column_names"] == columns:
+            return True
+    return False
+
+
+def ensure_unique_title(engine: Engine) -> None:
+    """
+    Garantiza el índice único sobre products.title.
+
+    Las bases de datos nuevas lo reciben de create_all; las creadas antes
+    solo tienen un índice no único y necesitan este índice adicional para
+    que funcione INSERT ... ON CONFLICT (title).
+    """
+    if _has_unique_index(engine, "products", ["title"]):
+        return
+    try:
+        with engine.begin() as conn:
+            conn.execute(text(
+                "CREATE UNIQUE INDEX IF NOT EXISTS uq_products_title ON products (title)"
+            ))
+        logger.info("Creado índice único uq_products_title")
+    except SQLAlchemyError as e:
+        # Suele deberse a títulos duplicados en datos antiguos
+        logger.error("No se pudo crear el índice único sobre products.title: %s", e)
+
+
+def ensure_columns(engine: Engine) -> None:
+    """
+    Añade las columnas declaradas en los modelos que falten en tablas existentes.
+
+    Igual que con los índices, create_all no modifica tablas existentes.
+    """
+    inspector = inspect(engine)
+    for model in (ProductDB, PageFingerprintDB):
+        table = model.__table__
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            column_type = column.type.compile(dialect=engine.dialect)
+            try:
+                with engine.begin() as conn:
+                    conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+                logger.info("Añadida columna %s.%s", table.name, column.name)
+            except SQLAlchemyError as e:
+                logger.error("No se pudo añadir la columna %s.%s: %s", table.name, column.name, e)
+
+
+def ensure_indexes(engine: Engine) -> None:
+    """
+    Crea los índices declarados en los modelos que falten.
+
+    create_all solo crea índices junto con tablas nuevas; las bases de datos
+    existentes reciben aquí los índices añadidos después.
+    """
+    existing = {index["name"] for index in inspect(engine).get_indexes(ProductDB.__tablename__)}
+    for index in ProductDB.__table__.indexes:
+        if index.name in existing:
+            continue
+        try:
+            index.create(bind=engine)
+            logger.info("Creado índice %s", index.name)
+        except SQLAlchemyError as e:
+            logger.error("No se pudo crear el índice %s: %s", index.name, e)
+
+
+def ensure_product_stats(engine: Engine) -> None:
+    """Rellena product_stats en bases de datos que ya tenían productos antes de existir la tabla"""
+    with Session(engine) as db:
+        if db.query(ProductStatsDB).first() is None and db.query(ProductDB.id).first() is not None:
+            rebuild_stats(db)
+
+
+def run_migrations(engine: Engine) -> None:
+    """Aplica las migraciones idempotentes sobre una base de datos ya creada"""
+    ensure_columns(engine)
+    ensure_unique_title(engine)
+    ensure_indexes(engine)
+    ensure_product_stats(engine)
+    setup_search(engine)
@@ -1,7 +1,8 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, create_engine
+from sqlalchemy import Column, Integer, String, Float, DateTime, Text, Index, create_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.sql import func
-from typing import List
+from typing import Any, Dict, List, Optional
+from datetime import datetime
 from pydantic import BaseModel
 
 Base = declarative_base()
@@ -11,13 +12,93 @@ class ProductDB(Base):
     __tablename__ = "products"
 
     id = Column(Integer, primary_key=True, index=True)
-    title = Column(String, index=True)
+    title = Column(String, index=True, unique=True)
     price = Column(Float)
     category = Column(String, index=True)
     rating = Column(Float)
     image_url = Column(String, nullable=True)
+    detail_url = Column(String, nullable=True)
+    # Datos de la página de detalle (ver WebScraper.enrich_products)
+    upc = Column(String, nullable=True)
+    availability = Column(String, nullable=True)
+    stock = Column(Integer, nullable=True)
+    description = Column(Text, nullable=True)
+    detail_fetched_at = Column(DateTime(timezone=True), nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    # Huella de los campos del listado (ver fingerprints.product_hash)
+    content_hash = Column(String(40), nullable=True)
+
+    # Índices para las combinaciones de filtros de GET /products/
+    # (rangos de precio, rating >= x y categoría exacta)
+    __table_args__ = (
+        Index("ix_products_price", "price"),
+        Index("ix_products_category_price", "category", "price"),
+        Index("ix_products_rating_price", "rating", "price"),
+    )
+
+# Agregados de productos por categoría y por rating, mantenidos al guardar
+# y borrar productos para que GET /stats/ no recorra la tabla products
+class ProductStatsDB(Base):
+    __tablename__ = "product_stats"
+
+    dimension = Column(String, primary_key=True)  # "category" o "rating"
+    key = Column(String, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+    price_sum = Column(Float, nullable=False, default=0.0)
+    price_min = Column(Float, nullable=True)
+    price_max = Column(Float, nullable=True)
+
+# Huella del contenido de cada página del listado rastreada: si la página no
+# cambia entre dos crawls, no se vuelve a parsear
+class PageFingerprintDB(Base):
+    __tablename__ = "page_fingerprints"
+
+    url = Column(String, primary_key=True)
+    content_hash = Column(String(40), nullable=False)
+    # Enlaces seguidos desde la página (JSON), para continuar el crawl sin parsearla
+    links = Column(Text, nullable=True)
+    crawled_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+# Trabajos de scraping: persisten estado y progreso entre peticiones
+class ScrapeJobDB(Base):
+    __tablename__ = "scrape_jobs"
+
+    id = Column(String(32), primary_key=True)
+    # Clave para agrupar peticiones idénticas en curso (url + páginas)
+    dedupe_key = Column(String, index=True)
+    url = Column(String)
+    pages = Column(Integer)
+    concurrency = Column(Integer, default=1)
+    status = Column(String, index=True)
+    pages_done = Column(Integer, default=0)
+    products_saved = Column(Integer, default=0)
+    error = Column(String, nullable=True)
+    stats = Column(Text, nullable=True)  # JSON con las estadísticas del pipeline
+    created_at = Column(DateTime(timezone=True))
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+# Cola de páginas del crawl distribuido (ver work_queue.PageWorkQueue): cada
+# worker reclama páginas con un lease que caduca si el worker muere
+class PageTaskDB(Base):
+    __tablename__ = "page_tasks"
+
+    id = Column(Integer, primary_key=True)
+    url = Column(String, unique=True, nullable=False)
+    # Categoría heredada de la página que enlazó a esta (ver frontier.follow_page)
+    category = Column(String, nullable=True)
+    status = Column(String, nullable=False, default="pending")  # pending, leased, done o failed
+    attempts = Column(Integer, nullable=False, default=0)
+    lease_owner = Column(String, nullable=True)
+    lease_expires_at = Column(DateTime(timezone=True), nullable=True)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+    __table_args__ = (
+        Index("ix_page_tasks_status_lease", "status", "lease_expires_at"),
+    )
 
 # Modelo Pydantic para la API
 class Product(BaseModel):
@@ -27,6 +108,10 @@ class Product(BaseModel):
     category: str
     rating: float
     image_url: str = None
+    upc: Optional[str] = None
+    availability: Optional[str] = None
+    stock: Optional[int] = None
+    description: Optional[str] = None
 
     class Config:
         orm_mode = True
@@ -37,4 +122,20 @@ class ProductCreate(BaseModel):
     price: float
     category: str
     rating: float
-    image_url: str = None
\ No newline at end of file
+    image_url: str = None
+
+# Estado de un trabajo de scraping
+class ScrapeJob(BaseModel):
+    id: str
+    url: str
+    pages: int
+    concurrency: int
+    status: str
+    pages_done: int
+    products_saved: int
+    error: Optional[str] = None
+    created_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    duration_seconds: Optional[float] = None
+    stats: Optional[Dict[str, Any]] = None
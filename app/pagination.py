@@ -0,0 +1,45 @@
+import base64
+import json
+from typing import Optional, Tuple
+
+
+class InvalidCursor(ValueError):
+    """El cursor recibido no es válido"""
+
+
+def encode_cursor(last_id: int) -> str:
+    """Codifica la posición de la última fila devuelta como un cursor opaco"""
+    payload = json.dumps({"id": last_id}, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(payload).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> int:
+    """Devuelve el último id visto a partir de un cursor generado por encode_cursor"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        last_id = data["id"]
+    except (ValueError, KeyError, TypeError) as e:
+        raise InvalidCursor(f"Cursor no válido: {cursor!r}") from e
+    if not isinstance(last_id, int):
+        raise InvalidCursor(f"Cursor no válido: {cursor!r}")
+    return last_id
+
+
+def next_cursor(rows, limit: int) -> Optional[str]:
+    """Cursor de la página siguiente, o None si esta página es la última"""
+    if limit <= 0 or len(rows) < limit:
+        return None
+    return encode_cursor(rows[-1].id)
+
+
+def resolve_page(name: Optional[str], sort: str, cursor: Optional[str]) -> Tuple[bool, Optional[int]]:
+    """
+    Interpreta los parámetros de orden y paginación de GET /products/
+
+    Devuelve (ordenar por relevancia, último id visto).
+    """
+    by_relevance = sort == "relevance" and bool(name)
+    if by_relevance and cursor:
+        raise InvalidCursor("El orden por relevancia no admite cursor, usar skip")
+    return by_relevance, decode_cursor(cursor) if cursor else None
@@ -0,0 +1,375 @@
+import logging
+import multiprocessing
+import re
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urljoin
+
+from bs4 import BeautifulSoup
+
+from logging_config import SAMPLED
+
+try:
+    from lxml import etree
+    from lxml import html as lxml_html
+except ImportError:  # lxml es opcional: sin él se usa BeautifulSoup
+    etree = None
+    lxml_html = None
+
+logger = logging.getLogger(__name__)
+
+# Patrones y tablas constantes, compilados una sola vez a nivel de módulo
+# Primero eliminamos el símbolo de libra y cualquier carácter no visible
+CURRENCY_RE = re.compile(r'[£€$Â\s]')
+# Luego nos aseguramos de que solo queden números y punto decimal
+NON_NUMERIC_RE = re.compile(r'[^\d.]')
+
+# Las clases de rating son del tipo "star-rating Three", "star-rating Four", etc.
+RATING_MAP = {
+    'Zero': 0, 'One': 1, 'Two': 2, 'Three': 3, 'Four': 4, 'Five': 5
+}
+
+
+def parse_price(price_text: str) -> float:
+    """Convierte el texto de precio en float, 0.0 si no es posible"""
+    clean_price = NON_NUMERIC_RE.sub('', CURRENCY_RE.sub('', price_text))
+    try:
+        return float(clean_price)
+    except ValueError:
+        logger.error("No se pudo convertir el precio '%s' a float después de limpieza a '%s'", price_text, clean_price)
+        # Establecemos un valor predeterminado para no perder el producto
+        return 0.0
+
+
+def parse_rating(rating_classes: List[str]) -> int:
+    """Convierte las clases de p.star-rating en un número de 0 a 5"""
+    rating_text = next((cls for cls in rating_classes if cls != 'star-rating'), 'Zero')
+    return RATING_MAP.get(rating_text, 0)
+
+
+def resolve_image_url(page_url: str, src: Optional[str]) -> Optional[str]:
+    """Convierte la URL relativa de la imagen en absoluta respecto a la página"""
+    if src is None:
+        return None
+    return urljoin(page_url, src)
+
+
+def build_product(title: str, price_text: str, rating_classes: List[str],
+                  image_src: Optional[str], base_url: str, detail_href: Optional[str] = None) -> Dict[str, Any]:
+    """Construye el diccionario de producto común a todos los backends"""
+    return {
+        "title": title,
+        "price": parse_price(price_text.strip()),
+        # La categoría no está en la lista de productos, usamos "books" por defecto
+        # (la frontera de crawl la sustituye por la de la página)
+        "category": "books",
+        "rating": parse_rating(rating_classes),
+        "image_url": resolve_image_url(base_url, image_src),
+        "detail_url": urljoin(base_url, detail_href) if detail_href else None
+    }
+
+
+# "In stock (22 available)" -> disponibilidad "In stock", 22 unidades
+STOCK_RE = re.compile(r'\((\d+)\s+available\)')
+
+
+def build_detail(attributes: Dict[str, str], description: Optional[str]) -> Dict[str, Any]:
+    """Construye los datos de la página de detalle comunes a todos los backends"""
+    availability = attributes.get("Availability")
+    stock = None
+    if availability:
+        match = STOCK_RE.search(availability)
+        stock = int(match.group(1)) if match else None
+        availability = STOCK_RE.sub('', availability).strip()
+    return {
+        "upc": attributes.get("UPC") or None,
+        "availability": availability or None,
+        "stock": stock,
+        "description": description.strip() if description else None
+    }
+
+
+@dataclass
+class ParsedPage:
+    """Resultado de parsear una página del listado"""
+
+    url: str
+    products: List[Dict[str, Any]] = field(default_factory=list)
+    # Enlace "next" de la paginación, ya absoluto
+    next_url: Optional[str] = None
+    # Enlaces (url absoluta, nombre) del menú de categorías
+    categories: List[Tuple[str, str]] = field(default_factory=list)
+
+
+class ProductParser:
+    """Interfaz común de los backends de parseo del listado de productos"""
+
+    name = "base"
+
+    def parse_page(self, html: str, page_url: str) -> ParsedPage:
+        raise NotImplementedError
+
+    def parse(self, html: str, base_url: str) -> List[Dict[str, Any]]:
+        return self.parse_page(html, base_url).products
+
+
+class BeautifulSoupParser(ProductParser):
+    """Backend de referencia basado en BeautifulSoup y selectores CSS"""
+
+    name = "bs4"
+
+    def parse_page(self, html: str, page_url: str) -> ParsedPage:
+        soup = BeautifulSoup(html, 'html.parser')
+        next_element = soup.select_one('li.next a')
+        return ParsedPage(
+            url=page_url,
+            products=self.parse_soup(soup, page_url),
+            next_url=urljoin(page_url, next_element['href']) if next_element and next_element.has_attr('href') else None,
+            categories=[
+                (urljoin(page_url, link['href']), link.get_text().strip())
+                for link in soup.select('div.side_categories ul.nav-list li ul li a')
+                if link.has_attr('href')
+            ]
+        )
+
+    def parse_detail(self, html: str) -> Dict[str, Any]:
+        soup = BeautifulSoup(html, 'html.parser')
+        attributes = {}
+        for row in soup.select('table.table-striped tr'):
+            header, value = row.select_one('th'), row.select_one('td')
+            if header and value:
+                attributes[header.get_text().strip()] = value.get_text().strip()
+        description = soup.select_one('#product_description + p')
+        return build_detail(attributes, description.get_text() if description else None)
+
+    def parse_soup(self, soup: BeautifulSoup, base_url: str) -> List[Dict[str, Any]]:
+        products = []
+
+        # En books.toscrape.com, los productos están en elementos article con clase "product_pod"
+        product_elements = soup.select('article.product_pod')
+        logger.info("Encontrados %s elementos de producto en la página", len(product_elements))
+
+        for element in product_elements:
+            try:
+                title_element = element.select_one('h3 a')
+                price_element = element.select_one('div.product_price p.price_color')
+                rating_element = element.select_one('p.star-rating')
+                image_element = element.select_one('div.image_container img')
+
+                # Verificar si encontramos los elementos básicos
+                if not all([title_element, price_element]):
+                    logger.warning("Producto incompleto, saltando...")
+                    continue
+
+                rating_classes = rating_element['class'] if rating_element and 'class' in rating_element.attrs else []
+                image_src = image_element['src'] if image_element and image_element.has_attr('src') else None
+
+                product = build_product(
+                    title_element.get('title', ''),
+                    price_element.text,
+                    rating_classes,
+                    image_src,
+                    base_url,
+                    title_element.get('href')
+                )
+                products.append(product)
+
+                logger.info("Producto extraído: %s, precio: %s", product['title'], product['price'], extra=SAMPLED)
+
+            except Exception as e:
+                logger.error("Error al procesar un producto: %s", e, exc_info=True)
+                continue
+
+        logger.info("Extraídos %s productos de %s elementos", len(products), len(product_elements))
+        return products
+
+
+def _has_class(name: str) -> str:
+    """Predicado XPath equivalente al selector CSS `.name`"""
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+class LxmlParser(ProductParser):
+    """
+    Backend rápido basado en lxml con expresiones XPath precompiladas.
+
+    Produce exactamente los mismos diccionarios que BeautifulSoupParser.
+    """
+
+    name = "lxml"
+
+    def __init__(self):
+        if etree is None:
+            raise ImportError("El backend 'lxml' requiere el paquete lxml")
+        self._products = etree.XPath(f"//article[{_has_class('product_pod')}]")
+        self._title = etree.XPath(".//h3//a")
+        self._price = etree.XPath(f".//div[{_has_class('product_price')}]//p[{_has_class('price_color')}]")
+        self._rating = etree.XPath(f".//p[{_has_class('star-rating')}]")
+        self._image = etree.XPath(f".//div[{_has_class('image_container')}]//img")
+        self._detail_rows = etree.XPath(f"//table[{_has_class('table-striped')}]//tr")
+        self._description = etree.XPath("//div[@id='product_description']/following-sibling::p[1]")
+        self._next = etree.XPath(f"//li[{_has_class('next')}]/a/@href")
+        self._categories = etree.XPath(
+            f"//div[{_has_class('side_categories')}]//ul[{_has_class('nav-list')}]/li/ul/li/a"
+        )
+
+    def _document(self, html: str):
+        try:
+            return lxml_html.document_fromstring(html)
+        except ValueError:
+            # Cadenas con declaración de codificación XML: lxml exige bytes
+            return lxml_html.document_fromstring(html.encode('utf-8'))
+
+    def parse_page(self, html: str, page_url: str) -> ParsedPage:
+        try:
+            document = self._document(html)
+        except etree.ParserError:
+            logger.warning("Documento HTML vacío o no válido")
+            return ParsedPage(url=page_url)
+
+        next_links = self._next(document)
+        return ParsedPage(
+            url=page_url,
+            products=self._parse_products(document, page_url),
+            next_url=urljoin(page_url, next_links[0]) if next_links else None,
+            categories=[
+                (urljoin(page_url, link.get('href')), link.text_content().strip())
+                for link in self._categories(document)
+                if link.get('href')
+            ]
+        )
+
+    def parse_detail(self, html: str) -> Dict[str, Any]:
+        try:
+            document = self._document(html)
+        except etree.ParserError:
+            logger.warning("Documento HTML vacío o no válido")
+            return build_detail({}, None)
+
+        attributes = {}
+        for row in self._detail_rows(document):
+            headers, values = row.findall('th'), row.findall('td')
+            if headers and values:
+                attributes[headers[0].text_content().strip()] = values[0].text_content().strip()
+        description = self._description(document)
+        return build_detail(attributes, description[0].text_content() if description else None)
+
+    def _parse_products(self, document, base_url: str) -> List[Dict[str, Any]]:
+        products = []
+        product_elements = self._products(document)
+        logger.info("Encontrados %s elementos de producto en la página", len(product_elements))
+
+        for element in product_elements:
+            try:
+                title_elements = self._title(element)
+                price_elements = self._price(element)
+
+                # Verificar si encontramos los elementos básicos
+                if not title_elements or not price_elements:
+                    logger.warning("Producto incompleto, saltando...")
+                    continue
+
+                rating_elements = self._rating(element)
+                image_elements = self._image(element)
+                rating_classes = rating_elements[0].get('class', '').split() if rating_elements else []
+                image_src = image_elements[0].get('src') if image_elements else None
+
+                product = build_product(
+                    title_elements[0].get('title', ''),
+                    price_elements[0].text_content(),
+                    rating_classes,
+                    image_src,
+                    base_url,
+                    title_elements[0].get('href')
+                )
+                products.append(product)
+
+                logger.info("Producto extraído: %s, precio: %s", product['title'], product['price'], extra=SAMPLED)
+
+            except Exception as e:
+                logger.error("Error al procesar un producto: %s", e, exc_info=True)
+                continue
+
+        logger.info("Extraídos %s productos de %s elementos", len(products), len(product_elements))
+        return products
+
+
+PARSER_BACKENDS = {
+    BeautifulSoupParser.name: BeautifulSoupParser,
+    LxmlParser.name: LxmlParser,
+}
+
+
+def get_parser(name: str = "auto") -> ProductParser:
+    """
+    Devuelve una instancia del backend de parseo indicado.
+
+    "auto" usa lxml si está instalado y BeautifulSoup en caso contrario.
+    """
+    if name == "auto":
+        name = LxmlParser.name if etree is not None else BeautifulSoupParser.name
+    try:
+        backend = PARSER_BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Backend de parseo desconocido: {name!r}. Opciones: auto, {', '.join(PARSER_BACKENDS)}")
+    return backend()
+
+
+# Parseo en procesos separados: el parseo de HTML es CPU puro y, dentro del
+# proceso de la API, compite por el GIL con las peticiones. Los procesos
+# reciben HTML en crudo y devuelven diccionarios, ambos baratos de serializar.
+
+# Instancias de parser por proceso trabajador (los XPath de lxml no se pueden serializar)
+_worker_parsers: Dict[str, ProductParser] = {}
+
+
+def _parse_in_worker(backend: str, html: str, page_url: str) -> ParsedPage:
+    parser = _worker_parsers.get(backend)
+    if parser is None:
+        parser = get_parser(backend)
+        _worker_parsers[backend] = parser
+    return parser.parse_page(html, page_url)
+
+
+_process_pool: Optional[ProcessPoolExecutor] = None
+_process_pool_lock = threading.Lock()
+
+
+def get_process_pool(workers: int) -> ProcessPoolExecutor:
+    """
+    Pool de procesos compartido por todos los scrapers del proceso.
+
+    Se crea la primera vez que se pide; peticiones posteriores con otro número
+    de procesos reutilizan el pool existente. Usa "spawn" para no heredar por
+    fork los hilos y conexiones del servidor.
+    """
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is None:
+            _process_pool = ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+            )
+            logger.info("Pool de parseo iniciado con %s procesos", workers)
+        return _process_pool
+
+
+def shutdown_process_pool() -> None:
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is not None:
+            _process_pool.shutdown(wait=True, cancel_futures=True)
+            _process_pool = None
+
+
+class ProcessPoolParser:
+    """Envía el parseo de cada página a un pool de procesos compartido"""
+
+    def __init__(self, backend: ProductParser, workers: int):
+        self.backend = backend
+        self.workers = workers
+
+    def submit_page(self, html: str, page_url: str) -> Future:
+        """Future con el ParsedPage de la página"""
+        return get_process_pool(self.workers).submit(_parse_in_worker, self.backend.name, html, page_url)
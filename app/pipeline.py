@@ -0,0 +1,314 @@
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+from sqlalchemy.orm import Session
+
+from frontier import CrawlFrontier
+from fingerprints import load_page_hashes, page_hash, store_page_hashes
+
+logger = logging.getLogger(__name__)
+
+# Marca de fin de flujo entre etapas
+_DONE = object()
+
+
+class StageStats:
+    """Contadores de una etapa del pipeline (seguros entre hilos)"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.items = 0
+        self.errors = 0
+        self.busy_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, items: int, seconds: float) -> None:
+        with self._lock:
+            self.items += items
+            self.busy_seconds += seconds
+
+    def record_error(self, count: int = 1) -> None:
+        with self._lock:
+            self.errors += count
+
+    def as_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            throughput = self.items / self.busy_seconds if self.busy_seconds else 0.0
+            return {
+                "items": self.items,
+                "errors": self.errors,
+                "busy_seconds": round(self.busy_seconds, 3),
+                "items_per_second": round(throughput, 2)
+            }
+
+
+class ScrapePipeline:
+    """
+    Pipeline de scraping en streaming: descarga -> parseo -> persistencia.
+
+    Las tres etapas se ejecutan en paralelo conectadas por colas acotadas, de
+    modo que la memoria no crece con el tamaño del crawl. Los productos se
+    guardan en lotes de `batch_size` a medida que se completan las páginas, así
+    que son visibles en /products/ durante el crawl y un fallo a mitad solo
+    pierde el lote en curso.
+
+    Con incremental=True las páginas cuyo contenido no ha cambiado desde el
+    último crawl (misma huella) no se parsean ni se guardan.
+
+    Si el scraper tiene fetch_details, cada lote se enriquece con las páginas
+    de detalle de sus productos antes de guardarse (etapa "enrich").
+    """
+
+    def __init__(self, scraper, session_factory: Callable[[], Session], concurrency: int = 1,
+                 batch_size: int = 200, buffer_size: int = 8,
+                 progress_callback: Optional[Callable[[Dict[str, Any]], None]] = None,
+                 incremental: bool = True):
+        self.scraper = scraper
+        self.session_factory = session_factory
+        self.concurrency = max(1, concurrency)
+        self.batch_size = batch_size
+        self.buffer_size = buffer_size
+        # Se invoca con stats() tras guardar cada lote
+        self.progress_callback = progress_callback
+        # Saltar el parseo de las páginas idénticas a las del último crawl
+        self.incremental = incremental
+
+        self.fetch_stats = StageStats("fetch")
+        self.parse_stats = StageStats("parse")
+        self.enrich_stats = StageStats("enrich")
+        self.save_stats = StageStats("save")
+        self.inserted = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.pages_unchanged = 0
+        self._page_hashes: Dict[str, str] = {}
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+        self._stop = threading.Event()
+        self._frontier: Optional[CrawlFrontier] = None
+
+    def stop(self) -> None:
+        """Solicita la parada: las etapas terminan tras el elemento en curso"""
+        self._stop.set()
+        if self._frontier is not None:
+            self._frontier.close()
+
+    @property
+    def stopped(self) -> bool:
+        return self._stop.is_set()
+
+    def stats(self) -> Dict[str, Any]:
+        """Estado del pipeline; puede consultarse desde otro hilo durante la ejecución"""
+        end = self.finished_at or time.monotonic()
+        return {
+            "elapsed_seconds": round(end - self.started_at, 3) if self.started_at else 0.0,
+            "inserted": self.inserted,
+            "updated": self.updated,
+            "unchanged": self.unchanged,
+            "pages_unchanged": self.pages_unchanged,
+            "frontier": self._frontier.stats() if self._frontier else None,
+            "throttle": self.scraper.throttle.snapshot(),
+            "stages": {
+                stage.name: stage.as_dict()
+                for stage in (self.fetch_stats, self.parse_stats, self.enrich_stats, self.save_stats)
+            }
+        }
+
+    def _put(self, q: queue.Queue, item) -> bool:
+        """put bloqueante que se interrumpe si el pipeline se detiene"""
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _fetch_worker(self, frontier: CrawlFrontier, html_queue: queue.Queue) -> None:
+        try:
+            while not self._stop.is_set():
+                # Espera mientras otras páginas en curso puedan descubrir enlaces
+                url = frontier.get()
+                if url is None:
+                    break
+                # Una vez en la cola, la etapa de parseo marca la URL como terminada
+                handed_off = False
+                try:
+                    start = time.monotonic()
+                    # Incluye la espera del auto-throttle del scraper
+                    html = self.scraper.fetch_html(url)
+                    if html is None:
+                        self.fetch_stats.record_error()
+                        logger.warning("No se pudo obtener la página %s, continuando con la siguiente...", url)
+                        continue
+                    self.fetch_stats.record(1, time.monotonic() - start)
+                    handed_off = self._put(html_queue, (url, html))
+                    if not handed_off:
+                        break
+                except Exception as e:
+                    # Un error inesperado no debe matar el hilo: los demás
+                    # descargadores y el parseo esperarían a esta URL para siempre
+                    self.fetch_stats.record_error()
+                    logger.error("Error al descargar la página %s: %s", url, e, exc_info=True)
+                finally:
+                    if not handed_off:
+                        frontier.done(url)
+        finally:
+            # Bloqueante a propósito: la etapa de parseo siempre drena su cola
+            html_queue.put(_DONE)
+
+    def _finish_parse(self, frontier: CrawlFrontier, url: str, digest: str, future, start: float,
+                      product_queue: queue.Queue) -> None:
+        try:
+            try:
+                products, links = frontier.process(future.result())
+            except Exception as e:
+                self.parse_stats.record_error()
+                logger.error("Error al parsear la página %s: %s", url, e, exc_info=True)
+                return
+            self.parse_stats.record(1, time.monotonic() - start)
+            logger.info("Encontrados %s productos en %s", len(products), url)
+            # La huella (y los enlaces seguidos) viajan con los productos y se
+            # guardan cuando estos ya están persistidos
+            self._put(product_queue, (url, digest, links if frontier.follow_links else None, products))
+        finally:
+            frontier.done(url)
+
+    def _is_unchanged(self, frontier: CrawlFrontier, url: str, digest: str) -> bool:
+        """La página es idéntica a la del último crawl y se conocen sus enlaces"""
+        known = self._page_hashes.get(url)
+        if not self.incremental or known is None or known[0] != digest:
+            return False
+        if frontier.follow_links:
+            if known[1] is None:
+                return False
+            frontier.add_links(known[1])
+        return True
+
+    def _parse_worker(self, frontier: CrawlFrontier, html_queue: queue.Queue, product_queue: queue.Queue) -> None:
+        pending_fetchers = self.concurrency
+        # Páginas en parseo a la vez: más de una solo con pool de procesos
+        max_in_flight = max(1, 2 * self.scraper.parse_workers)
+        in_flight = deque()
+        try:
+            while pending_fetchers:
+                try:
+                    item = html_queue.get(timeout=0.05)
+                except queue.Empty:
+                    # Los descargadores pueden estar esperando los enlaces de
+                    # las páginas en parseo: terminar la más antigua
+                    if in_flight:
+                        self._finish_parse(frontier, *in_flight.popleft(), product_queue)
+                    continue
+                if item is _DONE:
+                    pending_fetchers -= 1
+                    continue
+                url, html = item
+                if self._stop.is_set():
+                    frontier.done(url)
+                    continue  # Drenar la cola para liberar a los descargadores
+                digest = page_hash(html)
+                if self._is_unchanged(frontier, url, digest):
+                    self.pages_unchanged += 1
+                    frontier.done(url)
+                    logger.info("Página sin cambios desde el último crawl: %s", url)
+                    continue
+                in_flight.append((url, digest, self.scraper.submit_parse_page(html, url), time.monotonic()))
+                while len(in_flight) >= max_in_flight:
+                    self._finish_parse(frontier, *in_flight.popleft(), product_queue)
+            while in_flight:
+                self._finish_parse(frontier, *in_flight.popleft(), product_queue)
+        finally:
+            # La etapa de persistencia (o run, si falla) drena la cola hasta _DONE
+            product_queue.put(_DONE)
+
+    def _enrich(self, batch: List[Dict[str, Any]], db: Session) -> None:
+        start = time.monotonic()
+        result = self.scraper.enrich_products(batch, db)
+        self.enrich_stats.record(result["fetched"], time.monotonic() - start)
+        if result["failed"]:
+            self.enrich_stats.record_error(result["failed"])
+
+    def _flush(self, batch: List[Dict[str, Any]], pages: List[Tuple], db: Session) -> None:
+        if batch and self.scraper.fetch_details:
+            self._enrich(batch, db)
+        start = time.monotonic()
+        if batch:
+            result = self.scraper.save_products_to_db(batch, db, bulk=True)
+            self.inserted += result["inserted"]
+            self.updated += result["updated"]
+            self.unchanged += result.get("unchanged", 0)
+        store_page_hashes(db, pages)
+        self.save_stats.record(len(batch), time.monotonic() - start)
+        if self.progress_callback:
+            self.progress_callback(self.stats())
+
+    def _persist(self, product_queue: queue.Queue) -> None:
+        batch: List[Dict[str, Any]] = []
+        pages: List[Tuple] = []
+        with self.session_factory() as db:
+            while True:
+                item = product_queue.get()
+                if item is _DONE:
+                    break
+                if self._stop.is_set():
+                    continue  # Descartar lo pendiente, pero seguir drenando
+                url, digest, links, products = item
+                batch.extend(products)
+                pages.append((url, digest, links))
+                if len(batch) >= self.batch_size:
+                    self._flush(batch, pages, db)
+                    batch, pages = [], []
+            if batch or pages:
+                self._flush(batch, pages, db)
+
+    def run(self, urls: Union[CrawlFrontier, Iterable[str]]) -> Dict[str, Any]:
+        """
+        Ejecuta el pipeline completo y devuelve sus estadísticas
+
+        `urls` es una CrawlFrontier (se siguen los enlaces descubiertos) o una
+        lista fija de URLs.
+        """
+        self.started_at = time.monotonic()
+        if self.incremental:
+            with self.session_factory() as db:
+                self._page_hashes = load_page_hashes(db)
+        frontier = urls if isinstance(urls, CrawlFrontier) else CrawlFrontier(urls, follow_links=False)
+        self._frontier = frontier
+        html_queue: queue.Queue = queue.Queue(maxsize=self.buffer_size)
+        product_queue: queue.Queue = queue.Queue(maxsize=self.buffer_size)
+        threads = [
+            threading.Thread(
+                target=self._fetch_worker, args=(frontier, html_queue),
+                name=f"scrape-fetch-{i}", daemon=True
+            )
+            for i in range(self.concurrency)
+        ]
+        threads.append(threading.Thread(
+            target=self._parse_worker, args=(frontier, html_queue, product_queue),
+            name="scrape-parse", daemon=True
+        ))
+        for thread in threads:
+            thread.start()
+
+        try:
+            self._persist(product_queue)
+        except Exception:
+            # Detener las demás etapas y drenar la cola para que puedan terminar
+            self.stop()
+            while product_queue.get() is not _DONE:
+                pass
+            raise
+        finally:
+            for thread in threads:
+                thread.join()
+            self.finished_at = time.monotonic()
+
+        stats = self.stats()
+        logger.info("Pipeline de scraping terminado: %s", stats)
+        return stats
@@ -0,0 +1,58 @@
+from typing import Optional, Union
+
+from sqlalchemy import and_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from models import ProductDB
+from search import apply_title_search
+
+
+def filter_products(
+    query,
+    db: Union[Session, AsyncSession],
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    name: Optional[str] = None,
+    category: Optional[str] = None,
+    min_rating: Optional[float] = None,
+    by_relevance: bool = False,
+    after_id: Optional[int] = None
+):
+    """
+    Aplica los filtros de GET /products/ sobre `query` y la ordena por ID
+
+    Compartido por los endpoints que aceptan los mismos filtros y por el
+    benchmark de formas de consulta, para que todos generen el mismo SQL.
+    `query` puede ser un Query del ORM (sesión síncrona) o un select()
+    (sesión asíncrona).
+    """
+    filters = []
+    
+    if min_price is not None:
+        filters.append(ProductDB.price >= min_price)
+    
+    if max_price is not None:
+        filters.append(ProductDB.price <= max_price)
+    
+    if category:
+        filters.append(ProductDB.category == category)
+    
+    if min_rating is not None:
+        filters.append(ProductDB.rating >= min_rating)
+    
+    # Búsqueda en el título mediante el índice de texto completo
+    if name:
+        query = apply_title_search(query, db, name, by_relevance=by_relevance)
+    
+    # Paginación por cursor: continuar tras el último ID visto usando el índice
+    # de la clave primaria en lugar de recorrer y descartar filas
+    if after_id is not None:
+        filters.append(ProductDB.id > after_id)
+    
+    # Aplicar todos los filtros si existen
+    if filters:
+        query = query.filter(and_(*filters))
+    
+    # Orden estable entre llamadas (desempate por ID si se ordena por relevancia)
+    return query.order_by(ProductDB.id)
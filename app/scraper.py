@@ -1,203 +1,586 @@
 import requests
 from bs4 import BeautifulSoup
+import asyncio
+import itertools
 import time
-import random
 import logging
-from typing import List, Dict, Optional, Any
+import os
+from datetime import datetime, timedelta, timezone
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List, Dict, Optional, Any, Iterable, Set, Tuple
+from sqlalchemy import bindparam, func, select, update
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.orm import Session
-from models import ProductDB, Product
+from models import ProductDB
+from requests.adapters import HTTPAdapter
+from http_cache import HttpCache
+from parsers import BeautifulSoupParser, ParsedPage, ProcessPoolParser, get_parser
+from frontier import CrawlFrontier
+from throttle import AutoThrottle, CircuitOpenError, HostLimiter, parse_retry_after
+from cache import bump_data_version
+from aggregates import StatsDelta, apply_delta
+from fingerprints import product_hash
+from logging_config import SAMPLED
+from metrics import SCRAPER_FETCH_SECONDS, SCRAPER_PARSE_SECONDS, SCRAPER_PRODUCTS, SCRAPER_SAVE_SECONDS
 
-# Configuración de logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[logging.FileHandler("scraper.log"), logging.StreamHandler()]
-)
+# El logging lo configura el punto de entrada (ver logging_config.configure_logging)
 logger = logging.getLogger(__name__)
 
 class WebScraper:
-    def __init__(self, base_url: str):
+    def __init__(self, base_url: str, rate_limit: float = 5.0, pool_size: int = 10,
+                 cache_dir: Optional[str] = None, parser: str = "auto", parse_workers: int = 0,
+                 fetch_details: bool = False, detail_concurrency: int = 4, detail_max_age: float = 86400,
+                 start_delay: float = 0.5, max_delay: float = 60.0):
         self.base_url = base_url.rstrip('/')  # Eliminar posible barra al final
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
         }
+        # Solicitudes por segundo y por host permitidas como máximo
+        self.rate_limit = rate_limit
+        
+        # Retardo y concurrencia por host adaptados a la latencia y a los
+        # 429/503 del servidor, con circuit breaker (ver AutoThrottle)
+        self.throttle = AutoThrottle(
+            min_delay=1.0 / rate_limit,
+            start_delay=start_delay,
+            max_delay=max_delay,
+            max_concurrency=pool_size
+        )
+        
+        # Sesión con conexiones keep-alive reutilizables: evita un handshake TCP+TLS
+        # por página. pool_size debería ser >= a la concurrencia usada
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        
+        # Caché HTTP opcional en disco para peticiones GET condicionales
+        self.cache = HttpCache(cache_dir) if cache_dir else None
+        
+        # Backend de parseo: "lxml" (rápido), "bs4" (referencia) o "auto"
+        self.parser = get_parser(parser)
+        self._soup_parser = BeautifulSoupParser()
+        
+        # Con parse_workers > 0 el parseo se hace en un pool de procesos
+        self.parse_workers = parse_workers
+        self.parse_pool = ProcessPoolParser(self.parser, parse_workers) if parse_workers > 0 else None
+        
+        # Enriquecimiento opcional con la página de detalle de cada producto:
+        # hasta detail_concurrency descargas a la vez; los datos con menos de
+        # detail_max_age segundos en la base de datos no se vuelven a pedir
+        self.fetch_details = fetch_details
+        self.detail_concurrency = detail_concurrency
+        self.detail_max_age = detail_max_age
+    
+    @classmethod
+    def from_env(cls, base_url: str, concurrency: int = 1) -> "WebScraper":
+        """Crea un scraper configurado a partir de las variables de entorno"""
+        return cls(
+            base_url=base_url,
+            pool_size=max(concurrency, 10),
+            cache_dir=os.getenv("SCRAPER_CACHE_DIR") or None,
+            parser=os.getenv("SCRAPER_PARSER", "auto"),
+            parse_workers=int(os.getenv("SCRAPER_PARSE_WORKERS", "0")),
+            fetch_details=os.getenv("SCRAPER_DETAILS", "false").lower() in ("1", "true", "yes"),
+            detail_concurrency=int(os.getenv("SCRAPER_DETAIL_CONCURRENCY", "4")),
+            detail_max_age=float(os.getenv("SCRAPER_DETAIL_MAX_AGE", "86400")),
+            start_delay=float(os.getenv("SCRAPER_START_DELAY", "0.5")),
+            max_delay=float(os.getenv("SCRAPER_MAX_DELAY", "60"))
+        )
+    
+    def close(self) -> None:
+        """Cierra las conexiones del pool"""
+        self.session.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+    
+    def _request(self, url: str) -> str:
+        """Realiza una única solicitud HTTP y devuelve el HTML"""
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            cached = self.cache.get(url) if self.cache else None
+            headers = cached.conditional_headers() if cached else None
+            
+            try:
+                response = self.session.get(url, headers=headers, timeout=10)
+            except requests.exceptions.RequestException:
+                self.throttle.record(url)
+                raise
+            self.throttle.record(
+                url,
+                latency=response.elapsed.total_seconds(),
+                status=response.status_code,
+                retry_after=parse_retry_after(response.headers.get('Retry-After'))
+            )
+            if cached and response.status_code == 304:
+                logger.debug("Página sin cambios (304), usando caché: %s", url)
+                outcome = "not_modified"
+                return cached.body
+            response.raise_for_status()  # Levanta excepciones para errores HTTP
+            
+            if self.cache:
+                self.cache.store(
+                    url,
+                    response.text,
+                    etag=response.headers.get('ETag'),
+                    last_modified=response.headers.get('Last-Modified')
+                )
+            outcome = "ok"
+            return response.text
+        finally:
+            SCRAPER_FETCH_SECONDS.observe(time.perf_counter() - start, outcome=outcome)
+    
+    def fetch_html(self, url: str, max_retries: int = 3) -> Optional[str]:
+        """
+        Obtiene el HTML de una página con reintentos en caso de error
+        
+        Cada intento espera su turno en el auto-throttle del host, cuyo
+        retardo crece con los fallos (backoff adaptativo). Con el circuito
+        del host abierto no se envía ninguna solicitud.
+        """
+        for attempt in range(max_retries):
+            try:
+                with self.throttle.slot(url):
+                    logger.info("Obteniendo página: %s", url, extra=SAMPLED)
+                    return self._request(url)
+            except CircuitOpenError as e:
+                logger.warning("No se solicita %s: %s", url, e)
+                return None
+            except requests.exceptions.RequestException as e:
+                logger.error("Error al obtener la página %s: %s", url, e)
+                if attempt < max_retries - 1:
+                    logger.info("Reintentando cuando lo permita el auto-throttle...")
+                else:
+                    logger.error("No se pudo obtener la página después de %s intentos", max_retries)
+                    return None
     
     def get_page(self, url: str, max_retries: int = 3) -> Optional[BeautifulSoup]:
         """Obtiene una página con reintentos en caso de error"""
+        html = self.fetch_html(url, max_retries=max_retries)
+        if html is None:
+            return None
+        return BeautifulSoup(html, 'html.parser')
+    
+    async def fetch_html_async(self, url: str, limiter: HostLimiter,
+                               executor: ThreadPoolExecutor, max_retries: int = 3) -> Optional[str]:
+        """
+        Versión asíncrona de fetch_html.
+        
+        Mantiene los mismos reintentos; cada intento espera su turno en el
+        limitador del host (límite fijo de concurrencia) y en el auto-throttle.
+        """
+        loop = asyncio.get_running_loop()
         for attempt in range(max_retries):
             try:
-                logger.info(f"Obteniendo página: {url}")
-                response = requests.get(url, headers=self.headers, timeout=10)
-                response.raise_for_status()  # Levanta excepciones para errores HTTP
-                return BeautifulSoup(response.text, 'html.parser')
+                async with limiter.slot(url), self.throttle.async_slot(url):
+                    logger.info("Obteniendo página: %s", url, extra=SAMPLED)
+                    return await loop.run_in_executor(executor, self._request, url)
+            except CircuitOpenError as e:
+                logger.warning("No se solicita %s: %s", url, e)
+                return None
             except requests.exceptions.RequestException as e:
-                logger.error(f"Error al obtener la página {url}: {e}")
+                logger.error("Error al obtener la página %s: %s", url, e)
                 if attempt < max_retries - 1:
-                    sleep_time = 2 ** attempt  # Backoff exponencial
-                    logger.info(f"Reintentando en {sleep_time} segundos...")
-                    time.sleep(sleep_time)
+                    logger.info("Reintentando cuando lo permita el auto-throttle...")
                 else:
-                    logger.error(f"No se pudo obtener la página después de {max_retries} intentos")
+                    logger.error("No se pudo obtener la página después de %s intentos", max_retries)
                     return None
     
-    # Actualización para la función parse_product_list en scraper.py
-
     def parse_product_list(self, soup: BeautifulSoup) -> List[Dict[str, Any]]:
         """
-        Extrae la lista de productos de una página
+        Extrae la lista de productos de una página ya parseada con BeautifulSoup
         
         Específicamente adaptado para books.toscrape.com
         """
-        products = []
-        
-        # En books.toscrape.com, los productos están en elementos article con clase "product_pod"
-        product_elements = soup.select('article.product_pod')
-        logger.info(f"Encontrados {len(product_elements)} elementos de producto en la página")
+        return self._soup_parser.parse_soup(soup, self.base_url)
+    
+    def parse_page(self, html: str, url: str) -> ParsedPage:
+        """Productos y enlaces de navegación de la página `url`"""
+        return self.submit_parse_page(html, url).result()
+    
+    def submit_parse_page(self, html: str, url: str) -> Future:
+        """
+        Como parse_page, pero devuelve un Future
         
-        for element in product_elements:
+        Con pool de procesos permite tener varias páginas parseándose a la vez;
+        sin él, el parseo se hace en el acto y el Future ya está resuelto.
+        """
+        start = time.perf_counter()
+        if self.parse_pool is not None:
+            future = self.parse_pool.submit_page(html, url)
+        else:
+            future = Future()
             try:
-                # Extraer datos del producto según la estructura de books.toscrape.com
-                title_element = element.select_one('h3 a')
-                price_element = element.select_one('div.product_price p.price_color')
-                rating_element = element.select_one('p.star-rating')
-                image_element = element.select_one('div.image_container img')
-                
-                # Verificar si encontramos los elementos básicos
-                if not all([title_element, price_element]):
-                    logger.warning("Producto incompleto, saltando...")
-                    continue
-                
-                # Procesar y limpiar los datos
-                # El título está en el atributo title del enlace
-                title = title_element.get('title', '')
-                
-                # Depuramos para ver exactamente qué contiene el precio
-                price_text = price_element.text.strip()
-                logger.debug(f"Texto de precio original: '{price_text}'")
-                
-                # Convertir precio con manejo más robusto de caracteres especiales
-                # Reemplazamos cualquier carácter no numérico excepto el punto decimal
-                import re
-                # Primero eliminamos el símbolo de libra y cualquier carácter no visible
-                clean_price = re.sub(r'[£€$Â\s]', '', price_text)
-                # Luego nos aseguramos de que solo queden números y punto decimal
-                clean_price = re.sub(r'[^\d.]', '', clean_price)
-                
-                logger.debug(f"Precio limpio: '{clean_price}'")
-                
-                try:
-                    price = float(clean_price)
-                except ValueError:
-                    logger.error(f"No se pudo convertir el precio '{price_text}' a float después de limpieza a '{clean_price}'")
-                    # Establecemos un valor predeterminado para no perder el producto
-                    price = 0.0
-                
-                # La categoría no está en la lista de productos, usamos "books" por defecto
-                category = "books"
-                
-                # El rating está en la clase del elemento p.star-rating
-                # Las clases son del tipo "star-rating Three", "star-rating Four", etc.
-                rating_class = rating_element['class'] if rating_element and 'class' in rating_element.attrs else []
-                rating_text = next((cls for cls in rating_class if cls != 'star-rating'), 'Zero')
-                
-                # Convertir rating de texto a número
-                rating_map = {
-                    'Zero': 0, 'One': 1, 'Two': 2, 'Three': 3, 'Four': 4, 'Five': 5
-                }
-                rating = rating_map.get(rating_text, 0)
-                
-                # Obtener URL de imagen si existe
-                image_url = None
-                if image_element and image_element.has_attr('src'):
-                    # Las URLs de imágenes en books.toscrape.com son relativas
-                    image_relative_url = image_element['src']
-                    # Convertir a URL absoluta
-                    if image_relative_url.startswith('/'):
-                        image_url = f"{self.base_url}{image_relative_url}"
-                    else:
-                        # La URL es relativa a la ubicación actual
-                        image_url = f"{self.base_url}/../{image_relative_url}"
-                
-                products.append({
-                    "title": title,
-                    "price": price,
-                    "category": category,
-                    "rating": rating,
-                    "image_url": image_url
-                })
-                
-                logger.info(f"Producto extraído: {title}, precio: {price}")
-                
+                future.set_result(self.parser.parse_page(html, url))
             except Exception as e:
-                logger.error(f"Error al procesar un producto: {e}", exc_info=True)
-                continue
-        
-        logger.info(f"Extraídos {len(products)} productos de {len(product_elements)} elementos")
-        return products
+                future.set_exception(e)
+        # Con pool de procesos incluye la espera en la cola del pool
+        future.add_done_callback(lambda done: SCRAPER_PARSE_SECONDS.observe(
+            time.perf_counter() - start, outcome="error" if done.exception() else "ok"
+        ))
+        return future
     
-    def scrape_products(self, num_pages: int = 5) -> List[Dict[str, Any]]:
-        """Scrape de múltiples páginas de productos"""
-        all_products = []
+    def frontier(self, max_pages: Optional[int] = None) -> CrawlFrontier:
+        """Frontera de crawl que parte de la página principal y descubre el resto en el HTML"""
+        return CrawlFrontier([self.base_url], max_pages=max_pages)
+    
+    def scrape_products(self, num_pages: int = 5, concurrency: int = 1,
+                        db: Optional[Session] = None) -> List[Dict[str, Any]]:
+        """
+        Scrape de las páginas de productos descubiertas desde la página principal
         
-        # Basado en el HTML, vemos que la página principal muestra productos y tiene vínculos a páginas numeradas
-        # Primera página
-        first_page_url = self.base_url
-        logger.info(f"Scraping página principal: {first_page_url}")
+        Sigue los enlaces de categoría y de paginación (ver CrawlFrontier) hasta
+        agotarlos o haber descargado `num_pages` páginas. Con concurrency > 1
+        las páginas se descargan en paralelo mediante asyncio (ver
+        scrape_products_async). Con fetch_details se añaden los datos de la
+        página de detalle (ver enrich_products); con `db` no se vuelven a
+        descargar los detalles guardados hace menos de detail_max_age
+        segundos, y sin ella se descargan todos. No debe llamarse así desde un
+        event loop en ejecución.
+        """
+        if concurrency > 1:
+            return asyncio.run(self.scrape_products_async(num_pages, concurrency, db))
         
-        soup = self.get_page(first_page_url)
-        if soup:
-            # Extraer productos
-            page_products = self.parse_product_list(soup)
-            logger.info(f"Encontrados {len(page_products)} productos en la página principal")
-            all_products.extend(page_products)
-            
-            # Esperar entre solicitudes para ser respetuosos con el servidor
-            time.sleep(random.uniform(1.0, 3.0))
-        else:
-            logger.error("No se pudo obtener la página principal")
-            return all_products
-        
-        # Para el resto de páginas, miramos si hay enlaces de paginación
-        # Como vemos en el HTML, los links están en formato "catalogue/page-2.html"
-        for page in range(2, num_pages + 1):
-            page_url = f"{self.base_url}/catalogue/page-{page}.html"
-            logger.info(f"Scraping página {page}: {page_url}")
+        all_products = []
+        frontier = self.frontier(num_pages)
+        
+        while True:
+            url = frontier.pop()
+            if url is None:
+                break
+            logger.info("Scraping página: %s", url)
             
-            soup = self.get_page(page_url)
-            if not soup:
-                logger.warning(f"No se pudo obtener la página {page}, continuando con la siguiente...")
+            html = self.fetch_html(url)
+            if html is None:
+                logger.warning("No se pudo obtener la página %s, continuando con la siguiente...", url)
+                frontier.done(url)
                 continue
             
-            # Extraer productos
-            page_products = self.parse_product_list(soup)
-            logger.info(f"Encontrados {len(page_products)} productos en la página {page}")
-            
+            # Extraer productos y enlaces a otras páginas
+            page_products, _ = frontier.process(self.parse_page(html, url))
+            frontier.done(url)
+            logger.info("Encontrados %s productos en %s", len(page_products), url)
             all_products.extend(page_products)
-            
-            # Esperar entre solicitudes para ser respetuosos con el servidor
-            time.sleep(random.uniform(1.0, 3.0))
+            # El retardo entre solicitudes lo decide el auto-throttle en fetch_html
         
+        if self.fetch_details:
+            self.enrich_products(all_products, db)
         return all_products
     
-    def save_products_to_db(self, products: List[Dict[str, Any]], db: Session) -> None:
-        """Guarda los productos en la base de datos"""
+    async def scrape_products_async(self, num_pages: int = 5, concurrency: int = 4,
+                                    db: Optional[Session] = None) -> List[Dict[str, Any]]:
+        """
+        Scrape concurrente de las páginas de productos descubiertas
+        
+        Hasta `concurrency` páginas en vuelo por host, limitadas además por una
+        cubeta de tokens de `rate_limit` solicitudes por segundo. Devuelve los
+        mismos diccionarios, en el mismo orden de páginas, que scrape_products
+        (también con la misma regla de frescura de los detalles según `db`).
+        """
+        frontier = self.frontier(num_pages)
+        limiter = HostLimiter(concurrency_per_host=concurrency, rate_per_host=self.rate_limit)
+        # Productos por orden de salida de la frontera (el mismo que en modo secuencial)
+        pages: Dict[int, List[Dict[str, Any]]] = {}
+        order = itertools.count()
+        
+        async def worker(executor: ThreadPoolExecutor) -> None:
+            while True:
+                url = frontier.pop()
+                if url is None:
+                    if frontier.exhausted:
+                        return
+                    # Otras páginas en curso pueden descubrir más enlaces
+                    await asyncio.sleep(0.05)
+                    continue
+                position = next(order)
+                try:
+                    html = await self.fetch_html_async(url, limiter, executor)
+                    if html is None:
+                        logger.warning("No se pudo obtener la página %s, continuando con la siguiente...", url)
+                        continue
+                    page = await asyncio.wrap_future(self.submit_parse_page(html, url))
+                    pages[position], _ = frontier.process(page)
+                    logger.info("Encontrados %s productos en %s", len(pages[position]), url)
+                finally:
+                    frontier.done(url)
+        
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            await asyncio.gather(*(worker(executor) for _ in range(concurrency)))
+        
+        products = [product for position in sorted(pages) for product in pages[position]]
+        if self.fetch_details:
+            pending, _ = self._stale_details(products, db)
+            await self.enrich_products_async(pending)
+        return products
+    
+    def enrich_products(self, products: List[Dict[str, Any]], db: Optional[Session] = None) -> Dict[str, int]:
+        """
+        Añade a `products` (en el sitio) los datos de su página de detalle
+        
+        Con `db`, se omiten los productos cuyos datos de detalle guardados
+        tienen menos de detail_max_age segundos. Devuelve cuántos se
+        descargaron, cuántos seguían frescos y cuántos fallaron. No debe
+        llamarse desde un event loop en ejecución (ver enrich_products_async).
+        """
+        pending, fresh = self._stale_details(products, db)
+        fetched = asyncio.run(self.enrich_products_async(pending)) if pending else 0
+        return {"fetched": fetched, "fresh": fresh, "failed": len(pending) - fetched}
+    
+    def _stale_details(self, products: List[Dict[str, Any]],
+                       db: Optional[Session]) -> Tuple[List[Dict[str, Any]], int]:
+        """Productos cuyo detalle hay que descargar y cuántos lo tienen fresco en `db`"""
+        pending = [product for product in products if product.get("detail_url")]
+        if db is None or not pending:
+            return pending, 0
+        fresh_titles = _fresh_titles(db, [product["title"] for product in pending], self.detail_max_age)
+        stale = [product for product in pending if product["title"] not in fresh_titles]
+        return stale, len(pending) - len(stale)
+    
+    async def enrich_products_async(self, products: List[Dict[str, Any]],
+                                    concurrency: Optional[int] = None) -> int:
+        """
+        Descarga en paralelo la página de detalle de cada producto
+        
+        Como mucho `concurrency` (por defecto detail_concurrency) descargas en
+        vuelo, con el mismo límite de solicitudes por segundo y host que el
+        listado. Devuelve cuántos productos se enriquecieron.
+        """
+        concurrency = concurrency or self.detail_concurrency
+        limiter = HostLimiter(concurrency_per_host=concurrency, rate_per_host=self.rate_limit)
+        
+        async def enrich(product: Dict[str, Any], executor: ThreadPoolExecutor) -> bool:
+            html = await self.fetch_html_async(product["detail_url"], limiter, executor)
+            if html is None:
+                logger.warning("No se pudo obtener el detalle de %s", product['title'])
+                return False
+            product.update(self.parser.parse_detail(html))
+            product["detail_fetched_at"] = datetime.now(timezone.utc)
+            return True
+        
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = await asyncio.gather(
+                *(enrich(product, executor) for product in products if product.get("detail_url"))
+            )
+        return sum(results)
+    
+    def save_products_to_db(self, products: List[Dict[str, Any]], db: Session,
+                            bulk: bool = False, chunk_size: int = 500) -> Dict[str, int]:
+        """
+        Guarda los productos en la base de datos
+        
+        Con bulk=True se usa upsert_products (INSERT ... ON CONFLICT por lotes).
+        Los productos cuya huella no ha cambiado no se reescriben.
+        Devuelve el número de productos insertados, actualizados y sin cambios.
+        """
+        with SCRAPER_SAVE_SECONDS.time():
+            if bulk and upsert_supported(db):
+                result = upsert_products(products, db, chunk_size=chunk_size)
+            else:
+                result = self._save_rows(products, db)
+        for key in ("inserted", "updated", "unchanged"):
+            SCRAPER_PRODUCTS.inc(result[key], result=key)
+        return result
+    
+    def _save_rows(self, products: List[Dict[str, Any]], db: Session) -> Dict[str, int]:
+        """save_products_to_db fila a fila, para motores sin upsert"""
+        inserted = updated = unchanged = 0
+        stats_delta = StatsDelta()
+        detailed = 0
         for product_data in products:
+            # Los datos de detalle se guardan aunque el listado no haya cambiado
+            details = _detail_values(product_data) or {}
+            detailed += bool(details)
+            product_data = {key: value for key, value in product_data.items() if key not in _DETAIL_COLUMNS}
+            product_data["content_hash"] = product_hash(product_data)
             # Comprobar si el producto ya existe (por título)
+            # Con FOR UPDATE los valores anteriores no cambian hasta el commit
+            # (los agregados se ajustan con ellos)
             existing_product = db.query(ProductDB).filter(
                 ProductDB.title == product_data["title"]
-            ).first()
+            ).with_for_update().first()
             
-            if existing_product:
+            if existing_product and existing_product.content_hash == product_data["content_hash"]:
+                # Sin cambios: ni UPDATE ni cambio de updated_at
+                for key, value in details.items():
+                    setattr(existing_product, key, value)
+                unchanged += 1
+                continue
+            elif existing_product:
+                stats_delta.remove({
+                    "price": existing_product.price,
+                    "category": existing_product.category,
+                    "rating": existing_product.rating
+                })
                 # Actualizar producto existente
-                for key, value in product_data.items():
+                for key, value in {**product_data, **details}.items():
                     setattr(existing_product, key, value)
-                logger.info(f"Producto actualizado: {product_data['title']}")
+                updated += 1
+                logger.info("Producto actualizado: %s", product_data['title'], extra=SAMPLED)
             else:
                 # Crear nuevo producto
-                db_product = ProductDB(**product_data)
+                db_product = ProductDB(**product_data, **details)
                 db.add(db_product)
-                logger.info(f"Nuevo producto añadido: {product_data['title']}")
+                inserted += 1
+                logger.info("Nuevo producto añadido: %s", product_data['title'], extra=SAMPLED)
+            stats_delta.add(product_data)
+        
+        # Agregados de /stats/ en la misma transacción que los productos
+        apply_delta(db, stats_delta)
         
         # Commit de los cambios
         db.commit()
-        logger.info(f"Total de {len(products)} productos guardados en la base de datos")
\ No newline at end of file
+        if inserted or updated or detailed:
+            bump_data_version()
+        logger.info("Total de %s productos guardados en la base de datos (%s sin cambios)", len(products), unchanged)
+        return {"inserted": inserted, "updated": updated, "unchanged": unchanged}
+
+
+# Dialectos con soporte de INSERT ... ON CONFLICT DO UPDATE
+_UPSERT_DIALECTS = {
+    "sqlite": sqlite_insert,
+    "postgresql": postgresql_insert,
+}
+
+# Columnas que el scraper puede escribir (se ignora cualquier otra clave)
+# Columnas de la página de detalle (ver WebScraper.enrich_products): se
+# escriben aparte para que el upsert del listado no las borre
+_DETAIL_COLUMNS = ("upc", "availability", "stock", "description", "detail_fetched_at")
+
+_PRODUCT_COLUMNS = [
+    column.name for column in ProductDB.__table__.columns
+    if column.name not in ("id", "created_at", "updated_at") + _DETAIL_COLUMNS
+]
+
+
+def _fresh_titles(db: Session, titles: Iterable[str], max_age: float) -> Set[str]:
+    """Títulos cuyos datos de detalle guardados tienen menos de `max_age` segundos"""
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=max_age)
+    fresh = set()
+    titles = list(titles)
+    for start in range(0, len(titles), 500):
+        for title, fetched_at in db.query(ProductDB.title, ProductDB.detail_fetched_at).filter(
+            ProductDB.title.in_(titles[start:start + 500]),
+            ProductDB.detail_fetched_at.isnot(None)
+        ):
+            # SQLite no guarda la zona horaria: las fechas se escriben en UTC
+            if fetched_at.tzinfo is None:
+                fetched_at = fetched_at.replace(tzinfo=timezone.utc)
+            if fetched_at >= cutoff:
+                fresh.add(title)
+    return fresh
+
+
+def _detail_values(product_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Columnas de detalle de un producto enriquecido, o None si no se obtuvo su detalle"""
+    if product_data.get("detail_fetched_at") is None:
+        return None
+    return {column: product_data.get(column) for column in _DETAIL_COLUMNS}
+
+
+def upsert_supported(db: Session) -> bool:
+    return db.get_bind().dialect.name in _UPSERT_DIALECTS
+
+
+def upsert_products(products: List[Dict[str, Any]], db: Session, chunk_size: int = 500) -> Dict[str, int]:
+    """
+    Inserta o actualiza productos por lotes usando INSERT ... ON CONFLICT (title)
+    
+    Una consulta IN (...) sin bloqueos descarta las filas cuya huella coincide
+    con la guardada. El resto se envía como un INSERT ... ON CONFLICT DO NOTHING
+    RETURNING title: lo que devuelve es exactamente lo que insertó esta
+    sentencia, aunque otro proceso esté guardando los mismos títulos. Las filas
+    que ya existían se releen con FOR UPDATE (valores anteriores estables para
+    ajustar los agregados de /stats/) y se actualizan. Requiere el índice único
+    sobre products.title (ver migrations.ensure_unique_title).
+    """
+    insert = _UPSERT_DIALECTS[db.get_bind().dialect.name]
+    table = ProductDB.__table__
+    
+    # Un mismo título no puede afectar dos veces a la misma fila en una sentencia:
+    # se conserva la última aparición
+    rows_by_title = {}
+    details_by_title = {}
+    for product_data in products:
+        row = {column: product_data.get(column) for column in _PRODUCT_COLUMNS}
+        row["content_hash"] = product_hash(row)
+        rows_by_title[product_data["title"]] = row
+        details = _detail_values(product_data)
+        if details is not None:
+            details_by_title[product_data["title"]] = details
+    rows = list(rows_by_title.values())
+    
+    insert_stmt = insert(table).on_conflict_do_nothing(index_elements=[table.c.title]).returning(table.c.title)
+    update_stmt = update(table).where(table.c.title == bindparam("match_title")).values(
+        **{column: bindparam(column) for column in _PRODUCT_COLUMNS if column != "title"},
+        updated_at=func.now()
+    )
+    columns = (table.c.title, table.c.price, table.c.category, table.c.rating, table.c.content_hash)
+    
+    inserted = updated = unchanged = 0
+    try:
+        for start in range(0, len(rows), chunk_size):
+            chunk = rows[start:start + chunk_size]
+            titles = [row["title"] for row in chunk]
+            known = {
+                row["title"]: row["content_hash"]
+                for row in db.execute(select(table.c.title, table.c.content_hash).where(table.c.title.in_(titles)))
+                .mappings().all()
+            }
+            # Solo se escriben las filas nuevas o con huella distinta
+            changed = [row for row in chunk if known.get(row["title"]) != row["content_hash"]]
+            unchanged += len(chunk) - len(changed)
+            if not changed:
+                continue
+            
+            stats_delta = StatsDelta()
+            new_titles = set(db.scalars(insert_stmt, changed).all())
+            for row in changed:
+                if row["title"] in new_titles:
+                    inserted += 1
+                    stats_delta.add(row)
+            
+            conflicts = [row for row in changed if row["title"] not in new_titles]
+            if conflicts:
+                existing = {
+                    row["title"]: row for row in db.execute(
+                        select(*columns).where(table.c.title.in_([row["title"] for row in conflicts]))
+                        .with_for_update()
+                    ).mappings().all()
+                }
+                to_update = []
+                for row in conflicts:
+                    old_row = existing[row["title"]]
+                    # Otro proceso pudo guardar lo mismo entre la consulta y el INSERT
+                    if old_row["content_hash"] == row["content_hash"]:
+                        unchanged += 1
+                        continue
+                    stats_delta.remove(old_row)
+                    stats_delta.add(row)
+                    to_update.append({"match_title": row["title"], **row})
+                if to_update:
+                    db.execute(update_stmt, to_update)
+                updated += len(to_update)
+            apply_delta(db, stats_delta)
+        
+        # Datos de detalle: UPDATE por título, también para filas sin cambios en el listado
+        if details_by_title:
+            db.execute(
+                update(table).where(table.c.title == bindparam("match_title")),
+                [{"match_title": title, **details} for title, details in details_by_title.items()]
+            )
+        db.commit()
+        if inserted or updated or details_by_title:
+            bump_data_version()
+    except Exception:
+        db.rollback()
+        raise
+    
+    logger.info("Upsert masivo: %s productos insertados, %s actualizados, %s sin cambios", inserted, updated, unchanged)
+    return {"inserted": inserted, "updated": updated, "unchanged": unchanged}
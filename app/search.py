@@ -0,0 +1,147 @@
+import logging
+import re
+from typing import Dict, List
+
+from sqlalchemy import column, func, select, table, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from models import ProductDB
+
+logger = logging.getLogger(__name__)
+
+# Índice de texto completo de SQLite: tabla FTS5 de contenido externo sobre
+# products.title, mantenida por triggers en cada INSERT/UPDATE/DELETE (incluidos
+# los upserts de save_products_to_db y el borrado de DELETE /products/)
+_SQLITE_FTS_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS products_fts "
+    "USING fts5(title, content='products', content_rowid='id')",
+    "CREATE TRIGGER IF NOT EXISTS products_fts_ai AFTER INSERT ON products BEGIN "
+    "INSERT INTO products_fts(rowid, title) VALUES (new.id, new.title); END",
+    "CREATE TRIGGER IF NOT EXISTS products_fts_ad AFTER DELETE ON products BEGIN "
+    "INSERT INTO products_fts(products_fts, rowid, title) VALUES ('delete', old.id, old.title); END",
+    "CREATE TRIGGER IF NOT EXISTS products_fts_au AFTER UPDATE OF title ON products BEGIN "
+    "INSERT INTO products_fts(products_fts, rowid, title) VALUES ('delete', old.id, old.title); "
+    "INSERT INTO products_fts(rowid, title) VALUES (new.id, new.title); END",
+]
+
+# En PostgreSQL basta un índice GIN de expresión sobre el tsvector del título,
+# que se mantiene solo. Toda búsqueda con alguna palabra lo usa; el ILIKE de
+# apply_title_search solo queda para términos sin palabras (p. ej. "--"), así
+# que un índice trigram no compensaría lo que cuesta en cada escritura. Las
+# bases creadas antes lo tenían y se elimina.
+_POSTGRES_SEARCH_DDL = [
+    "CREATE INDEX IF NOT EXISTS ix_products_title_tsv ON products USING gin (to_tsvector('simple', title))",
+    "DROP INDEX IF EXISTS ix_products_title_trgm",
+]
+
+_products_fts = table("products_fts", column("rowid"), column("rank"))
+
+# Disponibilidad del índice por base de datos (sin el driver, para que el motor
+# síncrono y el asíncrono de la misma base compartan la entrada)
+_fts_available: Dict[str, bool] = {}
+
+
+def _database_key(engine: Engine) -> str:
+    url = engine.url.set(drivername=engine.url.get_backend_name())
+    return url.render_as_string(hide_password=True)
+
+
+def _tokens(term: str) -> List[str]:
+    return re.findall(r"\w+", term.lower())
+
+
+def _setup_sqlite(engine: Engine) -> None:
+    with engine.begin() as conn:
+        exists = conn.execute(text(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'products_fts'"
+        )).first() is not None
+        for statement in _SQLITE_FTS_DDL:
+            conn.execute(text(statement))
+        if not exists:
+            # Indexar los productos que ya existían
+            conn.execute(text("INSERT INTO products_fts(products_fts) VALUES ('rebuild')"))
+            logger.info("Índice FTS5 products_fts creado")
+
+
+def _setup_postgresql(engine: Engine) -> None:
+    for statement in _POSTGRES_SEARCH_DDL:
+        try:
+            with engine.begin() as conn:
+                conn.execute(text(statement))
+        except SQLAlchemyError as e:
+            # p. ej. sin permisos sobre la tabla products
+            logger.warning("No se pudo aplicar '%s': %s", statement, e)
+
+
+def setup_search(engine: Engine) -> None:
+    """Crea los índices de búsqueda del título según el motor de base de datos"""
+    dialect = engine.dialect.name
+    try:
+        if dialect == "sqlite":
+            _setup_sqlite(engine)
+        elif dialect == "postgresql":
+            _setup_postgresql(engine)
+    except SQLAlchemyError as e:
+        # SQLite compilado sin FTS5: se mantiene la búsqueda con ILIKE
+        logger.warning("Búsqueda de texto completo no disponible: %s", e)
+    _fts_available[_database_key(engine)] = _check_available(engine)
+
+
+def _check_available(engine: Engine) -> bool:
+    if engine.dialect.name != "sqlite":
+        return engine.dialect.name == "postgresql"
+    with engine.connect() as conn:
+        return conn.execute(text(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'products_fts'"
+        )).first() is not None
+
+
+def _search_available(engine: Engine) -> bool:
+    key = _database_key(engine)
+    if key not in _fts_available:
+        if engine.dialect.is_async:
+            # Un motor asíncrono no puede consultarse aquí; setup_search, que se
+            # ejecuta al arrancar con el motor síncrono, ya habrá rellenado la entrada
+            return False
+        _fts_available[key] = _check_available(engine)
+    return _fts_available[key]
+
+
+def apply_title_search(query, db: Session, term: str, by_relevance: bool = False):
+    """
+    Filtra `query` por palabras del título usando el índice de texto completo.
+
+    Cada palabra del término se busca como prefijo ("harr pot" encuentra
+    "Harry Potter") y todas deben aparecer. Con by_relevance=True los
+    resultados se ordenan por relevancia. Si no hay índice disponible (o el
+    término no tiene ninguna palabra) se recurre a ILIKE '%term%', sin índice.
+
+    `query` puede ser un Query del ORM o un select(); `db` una Session o AsyncSession.
+    """
+    tokens = _tokens(term)
+    engine = db.get_bind()
+    dialect = engine.dialect.name
+
+    if not tokens or not _search_available(engine):
+        return query.filter(ProductDB.title.ilike(f"%{term}%"))
+
+    if dialect == "sqlite":
+        match = " ".join(f'"{token}"*' for token in tokens)
+        matches = select(
+            _products_fts.c.rowid.label("id"),
+            _products_fts.c.rank.label("rank")
+        ).where(text("products_fts MATCH :fts_query").bindparams(fts_query=match)).subquery("fts")
+        query = query.join(matches, matches.c.id == ProductDB.id)
+        if by_relevance:
+            # rank de FTS5 (bm25) es menor cuanto más relevante
+            query = query.order_by(matches.c.rank)
+        return query
+
+    tsquery = func.to_tsquery("simple", " & ".join(f"{token}:*" for token in tokens))
+    document = func.to_tsvector("simple", ProductDB.title)
+    query = query.filter(document.op("@@")(tsquery))
+    if by_relevance:
+        query = query.order_by(func.ts_rank(document, tsquery).desc())
+    return query
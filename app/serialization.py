@@ -0,0 +1,56 @@
+import json
+from typing import Any, Iterable, List
+
+from metrics import SERIALIZE_SECONDS
+from models import Product, ProductDB
+
+try:
+    import orjson
+except ImportError:  # orjson es opcional: sin él se usa json de la biblioteca estándar
+    orjson = None
+
+# Columnas de Product en el orden del esquema. Seleccionarlas como tuplas evita
+# crear un objeto ORM y validar un modelo pydantic por cada fila.
+PRODUCT_FIELDS = tuple(Product.model_fields)
+PRODUCT_COLUMNS = tuple(getattr(ProductDB, field) for field in PRODUCT_FIELDS)
+
+
+def dumps(content: Any) -> bytes:
+    """
+    Serializa `content` a JSON con el mismo formato que JSONResponse.
+
+    orjson produce los mismos bytes que json.dumps(ensure_ascii=False,
+    separators=(",", ":")) para los tipos de un producto (enteros, cadenas,
+    None y floats sin notación exponencial).
+    """
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(
+        content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def product_dicts(rows: Iterable) -> List[dict]:
+    """Convierte filas de PRODUCT_COLUMNS en diccionarios con el esquema de Product"""
+    return [
+        {
+            "id": id,
+            "title": title,
+            # Product declara price y rating como float: los enteros se convierten igual que en pydantic
+            "price": float(price),
+            "category": category,
+            "rating": float(rating),
+            "image_url": image_url,
+            "upc": upc,
+            "availability": availability,
+            "stock": stock,
+            "description": description,
+        }
+        for id, title, price, category, rating, image_url, upc, availability, stock, description in rows
+    ]
+
+
+def dump_products(rows: Iterable) -> bytes:
+    """JSON de una lista de productos, idéntico al de response_model=List[Product]"""
+    with SERIALIZE_SECONDS.time():
+        return dumps(product_dicts(rows))
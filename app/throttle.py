@@ -0,0 +1,351 @@
+import asyncio
+import threading
+import time
+import weakref
+from contextlib import asynccontextmanager, contextmanager
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Dict, Optional
+from urllib.parse import urlsplit
+
+from metrics import REGISTRY
+
+
+def host_of(url: str) -> str:
+    """Devuelve el host (netloc) de una URL, usado como clave de los limitadores"""
+    return urlsplit(url).netloc
+
+
+class TokenBucket:
+    """
+    Limitador de tasa basado en cubeta de tokens.
+
+    Se reponen `rate` tokens por segundo hasta un máximo de `capacity`.
+    Cada solicitud consume un token; si no hay tokens, se calcula cuánto
+    hay que esperar en lugar de dormir un tiempo fijo.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        if rate <= 0:
+            raise ValueError("rate debe ser mayor que 0")
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        # Lock de threading: la sección crítica es mínima y así la cubeta
+        # puede usarse tanto desde código síncrono como desde asyncio
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Reserva un token y devuelve los segundos que hay que esperar para usarlo"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    def acquire_sync(self) -> None:
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire(self) -> None:
+        wait = self.reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+class HostLimiter:
+    """
+    Limita las solicitudes concurrentes y la tasa por host.
+
+    Los semáforos se crean de forma perezosa dentro del event loop en uso,
+    por lo que una instancia debe usarse dentro de una única llamada a asyncio.run.
+    """
+
+    def __init__(self, concurrency_per_host: int = 4, rate_per_host: float = 5.0):
+        if concurrency_per_host < 1:
+            raise ValueError("concurrency_per_host debe ser al menos 1")
+        self.concurrency_per_host = concurrency_per_host
+        self.rate_per_host = rate_per_host
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._buckets: Dict[str, TokenBucket] = {}
+
+    def _semaphore(self, host: str) -> asyncio.Semaphore:
+        semaphore = self._semaphores.get(host)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.concurrency_per_host)
+            self._semaphores[host] = semaphore
+        return semaphore
+
+    def _bucket(self, host: str) -> TokenBucket:
+        bucket = self._buckets.get(host)
+        if bucket is None:
+            bucket = TokenBucket(self.rate_per_host)
+            self._buckets[host] = bucket
+        return bucket
+
+    @asynccontextmanager
+    async def slot(self, url: str):
+        """Ocupa un hueco de concurrencia del host y espera un token de la cubeta"""
+        host = host_of(url)
+        async with self._semaphore(host):
+            await self._bucket(host).acquire()
+            yield
+
+
+class CircuitOpenError(Exception):
+    """El circuito del host está abierto: no se envían solicitudes hasta que se recupere"""
+
+    def __init__(self, host: str, retry_in: float):
+        super().__init__(f"Circuito abierto para {host}, reintento en {retry_in:.1f}s")
+        self.host = host
+        self.retry_in = retry_in
+
+
+# Códigos con los que el servidor pide que se reduzca el ritmo
+THROTTLE_STATUSES = (429, 503)
+
+# Estados del circuito de un host
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class _HostState:
+    """Decisiones actuales del auto-throttle y del circuito para un host"""
+
+    def __init__(self, delay: float, concurrency: int):
+        self.delay = delay
+        self.concurrency = concurrency
+        self.in_flight = 0
+        # Momento a partir del cual puede salir la siguiente solicitud
+        self.next_allowed = 0.0
+        self.latency: Optional[float] = None
+        self.successes = 0
+        self.failures = 0
+        self.circuit = CLOSED
+        self.opened_at = 0.0
+        self.open_seconds = 0.0
+        self.probing = False
+
+
+class AutoThrottle:
+    """
+    Ajusta por host el retardo entre solicitudes y la concurrencia según el
+    comportamiento observado del servidor, con un circuit breaker.
+
+    - Retardo: tiende a latencia / target_concurrency (media con el valor
+      anterior), acotado entre min_delay y max_delay. Un 429/503 o un error
+      lo duplica, y un Retry-After se respeta como espera mínima.
+    - Concurrencia: aumento aditivo (+1 tras una ronda de respuestas sin
+      problemas y sin que la latencia se dispare) y reducción a la mitad ante
+      429/503 o errores, entre 1 y max_concurrency.
+    - Circuito: tras `failure_threshold` fallos seguidos se abre y las
+      solicitudes al host fallan al momento (CircuitOpenError) durante
+      `recovery_seconds`, que se duplican si la solicitud de prueba posterior
+      también falla.
+
+    Es seguro entre hilos y puede usarse desde código síncrono (slot) y
+    asíncrono (async_slot) a la vez.
+    """
+
+    def __init__(self, min_delay: float = 0.0, start_delay: float = 0.5, max_delay: float = 60.0,
+                 target_concurrency: float = 2.0, max_concurrency: int = 8,
+                 failure_threshold: int = 5, recovery_seconds: float = 30.0):
+        self.min_delay = min_delay
+        self.start_delay = max(start_delay, min_delay)
+        self.max_delay = max_delay
+        self.target_concurrency = target_concurrency
+        self.max_concurrency = max(1, max_concurrency)
+        self.failure_threshold = failure_threshold
+        self.recovery_seconds = recovery_seconds
+        self._hosts: Dict[str, _HostState] = {}
+        self._condition = threading.Condition()
+        _throttles.add(self)
+
+    def _state(self, host: str) -> _HostState:
+        state = self._hosts.get(host)
+        if state is None:
+            state = _HostState(self.start_delay, min(self.max_concurrency, max(1, round(self.target_concurrency))))
+            self._hosts[host] = state
+        return state
+
+    def _try_enter(self, host: str) -> Optional[float]:
+        """
+        Intenta ocupar un hueco del host. Devuelve la espera hasta poder
+        enviar la solicitud, o None si no hay hueco de concurrencia libre.
+        """
+        now = time.monotonic()
+        state = self._state(host)
+        if state.circuit == OPEN:
+            retry_in = state.opened_at + state.open_seconds - now
+            if retry_in > 0:
+                raise CircuitOpenError(host, retry_in)
+            state.circuit = HALF_OPEN
+            state.probing = False
+        if state.circuit == HALF_OPEN:
+            # Una sola solicitud de prueba a la vez
+            if state.probing:
+                raise CircuitOpenError(host, state.delay)
+            state.probing = True
+        elif state.in_flight >= state.concurrency:
+            return None
+        state.in_flight += 1
+        start = max(now, state.next_allowed)
+        state.next_allowed = start + state.delay
+        return start - now
+
+    def _leave(self, host: str) -> None:
+        with self._condition:
+            self._state(host).in_flight -= 1
+            self._condition.notify_all()
+
+    @contextmanager
+    def slot(self, url: str):
+        """Espera turno para una solicitud a `url` (concurrencia y retardo del host)"""
+        host = host_of(url)
+        with self._condition:
+            wait = self._try_enter(host)
+            while wait is None:
+                self._condition.wait(0.1)
+                wait = self._try_enter(host)
+        try:
+            if wait > 0:
+                time.sleep(wait)
+            yield
+        finally:
+            self._leave(host)
+
+    @asynccontextmanager
+    async def async_slot(self, url: str):
+        """Versión asíncrona de slot"""
+        host = host_of(url)
+        while True:
+            with self._condition:
+                wait = self._try_enter(host)
+            if wait is not None:
+                break
+            # El hueco lo puede liberar un hilo u otro event loop: sondeo breve
+            await asyncio.sleep(0.02)
+        try:
+            if wait > 0:
+                await asyncio.sleep(wait)
+            yield
+        finally:
+            self._leave(host)
+
+    def record(self, url: str, latency: Optional[float] = None, status: Optional[int] = None,
+               retry_after: Optional[float] = None) -> None:
+        """
+        Registra el resultado de una solicitud: `status` None significa error
+        de red o timeout; 2xx/3xx/4xx (salvo 429) cuentan como respuesta sana.
+        """
+        with self._condition:
+            state = self._state(host_of(url))
+            throttled = status is None or status in THROTTLE_STATUSES or status >= 500
+            if throttled:
+                self._on_failure(state, retry_after)
+            else:
+                self._on_success(state, latency)
+            self._condition.notify_all()
+
+    def _on_success(self, state: _HostState, latency: Optional[float]) -> None:
+        state.failures = 0
+        if state.circuit != CLOSED:
+            state.circuit = CLOSED
+            state.open_seconds = 0.0
+            state.probing = False
+        if latency is None:
+            return
+        previous = state.latency
+        state.latency = latency if previous is None else 0.8 * previous + 0.2 * latency
+        target = state.latency / self.target_concurrency
+        state.delay = min(self.max_delay, max(self.min_delay, (state.delay + target) / 2))
+        state.successes += 1
+        # Una ronda completa de respuestas sin que la latencia se dispare: un hueco más
+        if state.successes >= state.concurrency and (previous is None or latency <= 2 * previous):
+            state.concurrency = min(self.max_concurrency, state.concurrency + 1)
+            state.successes = 0
+
+    def _on_failure(self, state: _HostState, retry_after: Optional[float]) -> None:
+        now = time.monotonic()
+        state.successes = 0
+        state.failures += 1
+        state.concurrency = max(1, state.concurrency // 2)
+        state.delay = min(self.max_delay, max(state.delay * 2, self.min_delay, 0.1))
+        if retry_after is not None:
+            state.delay = min(self.max_delay, max(state.delay, retry_after))
+        # La siguiente solicitud (p. ej. el reintento) espera el nuevo retardo
+        state.next_allowed = max(state.next_allowed, now + max(state.delay, retry_after or 0.0))
+        if state.circuit == HALF_OPEN or state.failures >= self.failure_threshold:
+            # La prueba falló: el circuito vuelve a abrirse durante el doble de tiempo
+            reopening = state.circuit == HALF_OPEN
+            state.circuit = OPEN
+            state.opened_at = now
+            state.open_seconds = (
+                min(state.open_seconds * 2, 10 * self.recovery_seconds) if reopening and state.open_seconds
+                else self.recovery_seconds
+            )
+            state.probing = False
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Decisiones actuales por host, para monitorización"""
+        now = time.monotonic()
+        with self._condition:
+            return {
+                host: {
+                    "delay_seconds": round(state.delay, 4),
+                    "concurrency": state.concurrency,
+                    "in_flight": state.in_flight,
+                    "latency_seconds": round(state.latency, 4) if state.latency is not None else None,
+                    "circuit": state.circuit,
+                    "circuit_retry_in": (
+                        round(max(0.0, state.opened_at + state.open_seconds - now), 1)
+                        if state.circuit == OPEN else None
+                    ),
+                    "consecutive_failures": state.failures,
+                }
+                for host, state in self._hosts.items()
+            }
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Segundos de una cabecera Retry-After (número de segundos o fecha HTTP)"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        moment = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return max(0.0, (moment - datetime.now(timezone.utc)).total_seconds())
+
+
+# Auto-throttles vivos, para exponer sus decisiones en /metrics
+_throttles: "weakref.WeakSet[AutoThrottle]" = weakref.WeakSet()
+
+
+def _collect(field: str, transform=lambda value: value) -> Callable[[], Dict[tuple, float]]:
+    def collect():
+        values = {}
+        for throttle in list(_throttles):
+            for host, decisions in throttle.snapshot().items():
+                values[(host,)] = transform(decisions[field])
+        return values
+    return collect
+
+
+REGISTRY.gauge("scraper_throttle_delay_seconds", "Retardo actual entre solicitudes por host", ("host",),
+               _collect("delay_seconds"))
+REGISTRY.gauge("scraper_throttle_concurrency", "Concurrencia permitida actualmente por host", ("host",),
+               _collect("concurrency"))
+REGISTRY.gauge("scraper_circuit_open", "1 si el circuito del host está abierto o en prueba", ("host",),
+               _collect("circuit", lambda circuit: 0 if circuit == CLOSED else 1))
@@ -0,0 +1,306 @@
+import logging
+import os
+import socket
+import threading
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional
+
+from sqlalchemy import and_, func, or_, select, update
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from frontier import Link, follow_page, normalize_url
+from models import PageTaskDB
+
+logger = logging.getLogger(__name__)
+
+# Estados de una página de la cola
+PENDING = "pending"
+LEASED = "leased"
+DONE = "done"
+FAILED = "failed"
+
+_table = PageTaskDB.__table__
+
+
+class PageTask(NamedTuple):
+    """Página reclamada por un worker"""
+    id: int
+    url: str
+    category: Optional[str]
+    attempts: int
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def default_worker_id() -> str:
+    """Identificador único del worker: host, pid y un sufijo aleatorio"""
+    return f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+
+class PageWorkQueue:
+    """
+    Cola de páginas de un crawl en la tabla page_tasks, compartida por varios workers.
+
+    Un worker reclama una página poniéndole un lease de `lease_seconds`. Si
+    no la completa a tiempo (el proceso murió o se colgó), el lease caduca y
+    otro worker la vuelve a reclamar, hasta `max_attempts` intentos. En
+    PostgreSQL el reclamo usa FOR UPDATE SKIP LOCKED, de modo que los
+    workers no se bloquean entre sí; en SQLite, un UPDATE condicional por
+    fila, que solo puede ganar un worker porque SQLite serializa las escrituras.
+    """
+
+    def __init__(self, session_factory: Callable[[], Session], lease_seconds: float = 120.0,
+                 max_attempts: int = 3):
+        self.session_factory = session_factory
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+
+    def _enqueue(self, db: Session, links: Iterable[Link]) -> None:
+        """Añade los enlaces no encolados antes (sin commit)"""
+        rows = {}
+        for url, category in links:
+            url = normalize_url(url)
+            rows.setdefault(url, {"url": url, "category": category, "status": PENDING, "attempts": 0})
+        if not rows:
+            return
+        dialect = db.get_bind().dialect.name
+        if dialect in ("sqlite", "postgresql"):
+            insert = sqlite_insert if dialect == "sqlite" else postgresql_insert
+            db.execute(insert(_table).on_conflict_do_nothing(index_elements=[_table.c.url]), list(rows.values()))
+            return
+        existing = set(db.scalars(select(_table.c.url).where(_table.c.url.in_(list(rows)))))
+        new_rows = [row for url, row in rows.items() if url not in existing]
+        if new_rows:
+            db.execute(_table.insert(), new_rows)
+
+    def seed(self, urls: Iterable[str], reset: bool = True) -> None:
+        """Empieza un crawl: con reset=True olvida las páginas del crawl anterior"""
+        with self.session_factory() as db:
+            if reset:
+                db.execute(_table.delete())
+            self._enqueue(db, [(url, None) for url in urls])
+            db.commit()
+
+    def _claimable(self, now: datetime):
+        return and_(
+            or_(
+                _table.c.status == PENDING,
+                and_(_table.c.status == LEASED, _table.c.lease_expires_at < now)
+            ),
+            _table.c.attempts < self.max_attempts
+        )
+
+    def _expire_exhausted(self, db: Session, now: datetime) -> None:
+        """Da por fallidas las páginas cuyo último lease caducó sin más intentos disponibles"""
+        db.execute(
+            update(_table)
+            .where(
+                _table.c.status == LEASED,
+                _table.c.lease_expires_at < now,
+                _table.c.attempts >= self.max_attempts
+            )
+            .values(status=FAILED, lease_owner=None, error="Lease caducado en el último intento")
+        )
+
+    def claim(self, worker_id: str, limit: int = 1) -> List[PageTask]:
+        """Reclama hasta `limit` páginas pendientes o con el lease caducado"""
+        now = _now()
+        lease = {
+            "status": LEASED,
+            "lease_owner": worker_id,
+            "lease_expires_at": now + timedelta(seconds=self.lease_seconds),
+            "attempts": _table.c.attempts + 1,
+        }
+        columns = (_table.c.id, _table.c.url, _table.c.category, _table.c.attempts)
+        with self.session_factory() as db:
+            self._expire_exhausted(db, now)
+            if db.get_bind().dialect.name == "postgresql":
+                candidates = (
+                    select(_table.c.id)
+                    .where(self._claimable(now))
+                    .order_by(_table.c.id)
+                    .limit(limit)
+                    .with_for_update(skip_locked=True)
+                    .scalar_subquery()
+                )
+                claimed = db.execute(
+                    update(_table).where(_table.c.id.in_(candidates)).values(**lease).returning(*columns)
+                ).all()
+            else:
+                claimed = []
+                # Margen de candidatos por si otros workers ganan algunos
+                for task_id, url, category, attempts in db.execute(
+                    select(*columns).where(self._claimable(now)).order_by(_table.c.id).limit(limit * 4)
+                ).all():
+                    result = db.execute(
+                        update(_table).where(_table.c.id == task_id, self._claimable(now)).values(**lease)
+                    )
+                    if result.rowcount == 1:
+                        claimed.append((task_id, url, category, attempts + 1))
+                        if len(claimed) >= limit:
+                            break
+            db.commit()
+        return [PageTask(*row) for row in claimed]
+
+    def complete(self, task: PageTask, worker_id: str, links: Iterable[Link] = ()) -> bool:
+        """
+        Marca la página como hecha y encola sus enlaces en la misma transacción.
+
+        Devuelve False si el lease ya no era de este worker (caducó y otra
+        página lo reclamó); los productos guardados no se pierden porque el
+        guardado es idempotente.
+        """
+        with self.session_factory() as db:
+            self._enqueue(db, links)
+            result = db.execute(
+                update(_table)
+                .where(_table.c.id == task.id, _table.c.lease_owner == worker_id, _table.c.status == LEASED)
+                .values(status=DONE, lease_expires_at=None, error=None)
+            )
+            db.commit()
+        if result.rowcount == 0:
+            logger.warning("El lease de %s ya no pertenecía a %s", task.url, worker_id)
+            return False
+        return True
+
+    def fail(self, task: PageTask, worker_id: str, error: str) -> None:
+        """Libera la página para reintentarla, o la da por fallida si agotó sus intentos"""
+        status = FAILED if task.attempts >= self.max_attempts else PENDING
+        with self.session_factory() as db:
+            db.execute(
+                update(_table)
+                .where(_table.c.id == task.id, _table.c.lease_owner == worker_id)
+                .values(status=status, lease_owner=None, lease_expires_at=None, error=error[:1000])
+            )
+            db.commit()
+
+    def drained(self) -> bool:
+        """No quedan páginas pendientes ni en proceso"""
+        with self.session_factory() as db:
+            active = db.scalar(
+                select(func.count()).select_from(_table).where(_table.c.status.in_((PENDING, LEASED)))
+            )
+        return active == 0
+
+    def stats(self) -> Dict[str, int]:
+        """Número de páginas por estado"""
+        with self.session_factory() as db:
+            counts = dict(db.execute(
+                select(_table.c.status, func.count()).group_by(_table.c.status)
+            ).all())
+        return {status: counts.get(status, 0) for status in (PENDING, LEASED, DONE, FAILED)}
+
+
+class PageWorker:
+    """
+    Worker del crawl distribuido: reclama páginas de una PageWorkQueue, las
+    descarga y parsea, guarda sus productos y encola los enlaces que siguen.
+
+    Varios procesos (o máquinas) con la misma base de datos se reparten el
+    crawl; `concurrency` hilos por proceso comparten el auto-throttle del
+    scraper.
+    """
+
+    def __init__(self, scraper, session_factory: Callable[[], Session], work_queue: PageWorkQueue,
+                 worker_id: Optional[str] = None, concurrency: int = 1, poll_interval: float = 1.0,
+                 exit_when_drained: bool = True):
+        self.scraper = scraper
+        self.session_factory = session_factory
+        self.queue = work_queue
+        self.worker_id = worker_id or default_worker_id()
+        self.concurrency = max(1, concurrency)
+        self.poll_interval = poll_interval
+        # Con False el worker sigue esperando nuevos crawls al vaciarse la cola
+        self.exit_when_drained = exit_when_drained
+
+        self.pages_done = 0
+        self.pages_failed = 0
+        self.inserted = 0
+        self.updated = 0
+        self.unchanged = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def stop(self) -> None:
+        """Termina tras las páginas en curso; las no completadas se reintentan al caducar su lease"""
+        self._stop.set()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "worker_id": self.worker_id,
+                "pages_done": self.pages_done,
+                "pages_failed": self.pages_failed,
+                "inserted": self.inserted,
+                "updated": self.updated,
+                "unchanged": self.unchanged,
+                "throttle": self.scraper.throttle.snapshot(),
+            }
+
+    def process(self, task: PageTask) -> None:
+        """Procesa una página reclamada y completa o libera su lease"""
+        try:
+            html = self.scraper.fetch_html(task.url)
+            if html is None:
+                raise RuntimeError("No se pudo descargar la página")
+            products, links = follow_page(self.scraper.parse_page(html, task.url), task.category)
+            result = {}
+            if products:
+                with self.session_factory() as db:
+                    if self.scraper.fetch_details:
+                        self.scraper.enrich_products(products, db)
+                    result = self.scraper.save_products_to_db(products, db, bulk=True)
+        except Exception as e:
+            logger.error("Error en la página %s (intento %s): %s", task.url, task.attempts, e)
+            self.queue.fail(task, self.worker_id, str(e))
+            with self._lock:
+                self.pages_failed += 1
+            return
+
+        self.queue.complete(task, self.worker_id, links)
+        logger.info("Página %s: %s productos, %s enlaces", task.url, len(products), len(links))
+        with self._lock:
+            self.pages_done += 1
+            self.inserted += result.get("inserted", 0)
+            self.updated += result.get("updated", 0)
+            self.unchanged += result.get("unchanged", 0)
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            tasks = self.queue.claim(self.worker_id)
+            if not tasks:
+                # Otras páginas en proceso pueden encolar más enlaces
+                if self.exit_when_drained and self.queue.drained():
+                    return
+                self._stop.wait(self.poll_interval)
+                continue
+            for task in tasks:
+                self.process(task)
+
+    def run(self) -> Dict[str, Any]:
+        """Procesa páginas hasta vaciar la cola (o indefinidamente) y devuelve las estadísticas"""
+        logger.info("Worker %s iniciado con %s hilos", self.worker_id, self.concurrency)
+        threads = [
+            threading.Thread(target=self._loop, name=f"page-worker-{i}", daemon=True)
+            for i in range(self.concurrency)
+        ]
+        for thread in threads:
+            thread.start()
+        try:
+            for thread in threads:
+                # join con timeout para que Ctrl+C llegue al hilo principal
+                while thread.is_alive():
+                    thread.join(timeout=0.5)
+        except KeyboardInterrupt:
+            logger.info("Deteniendo el worker tras las páginas en curso...")
+            self.stop()
+            for thread in threads:
+                thread.join()
+        stats = self.stats()
+        logger.info("Worker terminado: %s", stats)
+        return stats
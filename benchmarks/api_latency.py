@@ -0,0 +1,234 @@
+"""
+Benchmark de latencia de la API con tablas grandes
+
+Para cada tamaño (por defecto 10k, 100k y 1M productos) siembra una base de
+datos con la importación en bloque (ver importer.import_products) y mide con
+TestClient, sin red, la latencia de GET /products/ con cada filtro, con
+paginación por offset y por cursor, de GET /stats/ y de GET /categories/. La
+caché de respuestas se desactiva para medir las consultas (--cache la deja
+activa).
+
+Las bases sembradas se guardan en --data-dir y se reutilizan en las
+siguientes ejecuciones, porque sembrar un millón de filas lleva su tiempo.
+Con --baseline compara con un informe anterior y termina con error si la p50
+de algún endpoint empeora más de --tolerance veces.
+
+Uso:
+    python benchmarks/api_latency.py --data-dir /tmp/bench --output api.json
+    python benchmarks/api_latency.py --rows 10000 --rows 100000 --repeat 50
+    python benchmarks/api_latency.py --data-dir /tmp/bench --baseline api.json
+    python benchmarks/api_latency.py --rows 1000000 --database-url postgresql://...
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import func, select, text  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from api import app  # noqa: E402
+from cache import response_cache  # noqa: E402
+from database import create_configured_engine, get_db  # noqa: E402
+from importer import import_products  # noqa: E402
+from migrations import run_migrations  # noqa: E402
+from models import Base, ProductDB  # noqa: E402
+from percentiles import latency_summary  # noqa: E402
+from query_shapes import CATEGORIES, WORDS  # noqa: E402
+
+DEFAULT_SIZES = [10000, 100000, 1000000]
+
+
+def endpoints(rows: int) -> list:
+    """(nombre, ruta) de las peticiones medidas para una tabla de `rows` filas"""
+    return [
+        ("products", "/products/"),
+        ("products_category", "/products/?category=category-7"),
+        ("products_price_range", "/products/?min_price=40&max_price=45"),
+        ("products_min_rating", "/products/?min_rating=5"),
+        ("products_name", "/products/?name=velvet%20sou"),
+        ("products_name_relevance", "/products/?name=velvet%20sou&sort=relevance"),
+        ("products_combined", "/products/?category=category-7&min_price=40&max_price=45&min_rating=4"),
+        ("products_offset_deep", f"/products/?skip={rows // 2}"),
+        ("stats", "/stats/"),
+        ("categories", "/categories/"),
+    ]
+
+
+def records(start: int, stop: int):
+    """Productos sintéticos start..stop-1, con los mismos valores que query_shapes.seed"""
+    rng = random.Random(start)
+    for i in range(start, stop):
+        yield {
+            "title": f"{' '.join(rng.sample(WORDS, 3))} {i}",
+            "price": round(rng.uniform(10, 60), 2),
+            "category": rng.choice(CATEGORIES),
+            "rating": rng.randint(0, 5),
+            "image_url": f"https://example.com/media/{i}.jpg",
+        }
+
+
+def seed(engine, rows: int) -> dict:
+    """Completa la tabla products hasta `rows` filas con import_products"""
+    with engine.connect() as conn:
+        existing = conn.execute(select(func.count()).select_from(ProductDB.__table__)).scalar()
+    if existing >= rows:
+        print(f"La tabla ya tiene {existing} filas, no se insertan más", file=sys.stderr)
+        return {"rows": existing, "seeded": 0, "seconds": 0.0}
+
+    result = import_products(records(existing, rows), engine)
+    with engine.begin() as conn:
+        if engine.dialect.name == "sqlite":
+            conn.execute(text("ANALYZE"))
+        elif engine.dialect.name == "postgresql":
+            conn.execute(text("ANALYZE products"))
+    print(f"Insertadas {result['rows']} filas en {result['seconds']:.1f}s "
+          f"({result['rows_per_second']} filas/s)", file=sys.stderr)
+    return {"rows": rows, "seeded": result["rows"], "seconds": result["seconds"]}
+
+
+def summarize(timings: list) -> dict:
+    return latency_summary(t * 1000 for t in timings)
+
+
+def measure(client: TestClient, path: str, repeat: int) -> dict:
+    """Latencia de `repeat` peticiones GET a `path`, tras una de calentamiento"""
+    response = client.get(path)
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        response = client.get(path)
+        timings.append(time.perf_counter() - start)
+    return {"status": response.status_code, "bytes": len(response.content), **summarize(timings)}
+
+
+def measure_cursor_walk(client: TestClient, pages: int) -> dict:
+    """Latencia de cada página al recorrer `pages` páginas siguiendo X-Next-Cursor"""
+    path = "/products/"
+    client.get(path)
+    timings = []
+    status = 200
+    for _ in range(pages):
+        start = time.perf_counter()
+        response = client.get(path)
+        timings.append(time.perf_counter() - start)
+        status = response.status_code
+        cursor = response.headers.get("X-Next-Cursor")
+        if status != 200 or not cursor:
+            break
+        path = f"/products/?cursor={cursor}"
+    return {"status": status, "pages": len(timings), **summarize(timings)}
+
+
+def bench_size(engine, repeat: int) -> list:
+    Session = sessionmaker(bind=engine)
+
+    def override_get_db():
+        db = Session()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = override_get_db
+    with engine.connect() as conn:
+        rows = conn.execute(select(func.count()).select_from(ProductDB.__table__)).scalar()
+    results = []
+    client = TestClient(app)
+    try:
+        for name, path in endpoints(rows):
+            results.append({"name": name, "path": path, **measure(client, path, repeat)})
+        results.append({"name": "products_cursor_walk", "path": "/products/?cursor=...",
+                        **measure_cursor_walk(client, repeat)})
+    finally:
+        app.dependency_overrides.pop(get_db, None)
+    for result in results:
+        print(f"{rows:>8} {result['name']:26} p50={result['p50_ms']:9.3f}ms "
+              f"p95={result['p95_ms']:9.3f}ms status={result['status']}", file=sys.stderr)
+    return results
+
+
+def compare(baseline_path: str, report: dict, tolerance: float) -> list:
+    """Endpoints cuya p50 es más de `tolerance` veces la del informe base, con el mismo tamaño"""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {
+            (size["rows"], result["name"]): result
+            for size in json.load(f)["sizes"]
+            for result in size["results"]
+        }
+    regressions = []
+    for size in report["sizes"]:
+        for result in size["results"]:
+            previous = baseline.get((size["rows"], result["name"]))
+            if previous is None or not previous["p50_ms"]:
+                continue
+            ratio = result["p50_ms"] / previous["p50_ms"]
+            if ratio > tolerance:
+                regressions.append(
+                    f"Regresión en {result['name']} con {size['rows']} filas: "
+                    f"p50 {previous['p50_ms']}ms -> {result['p50_ms']}ms (x{ratio:.2f})"
+                )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de latencia de /products/, /stats/ y /categories/")
+    parser.add_argument("--rows", type=int, action="append", default=None,
+                        help="Filas de la tabla; se puede repetir (por defecto 10000, 100000 y 1000000)")
+    parser.add_argument("--repeat", type=int, default=30, help="Peticiones medidas por endpoint")
+    parser.add_argument("--data-dir", default=None,
+                        help="Directorio de las bases SQLite sembradas, reutilizadas entre ejecuciones "
+                             "(por defecto, uno temporal)")
+    parser.add_argument("--database-url", default=None,
+                        help="Base de datos a usar en lugar de SQLite (solo con un --rows)")
+    parser.add_argument("--cache", action="store_true", help="Mantener activa la caché de respuestas")
+    parser.add_argument("--output", default=None, help="Fichero JSON de resultados (por defecto, stdout)")
+    parser.add_argument("--baseline", default=None,
+                        help="Informe JSON anterior: error si alguna p50 empeora más de --tolerance veces")
+    parser.add_argument("--tolerance", type=float, default=1.5, help="Empeoramiento máximo de la p50")
+    args = parser.parse_args()
+
+    sizes = args.rows or DEFAULT_SIZES
+    if args.database_url and len(sizes) > 1:
+        parser.error("--database-url solo admite un tamaño (--rows)")
+
+    logging.disable(logging.INFO)
+    if not args.cache:
+        response_cache.ttl = 0
+    data_dir = args.data_dir or tempfile.mkdtemp()
+    os.makedirs(data_dir, exist_ok=True)
+
+    report = {"repeat": args.repeat, "cache": args.cache, "sizes": []}
+    for rows in sizes:
+        database_url = args.database_url or f"sqlite:///{os.path.join(data_dir, f'products_{rows}.db')}"
+        engine = create_configured_engine(database_url)
+        Base.metadata.create_all(bind=engine)
+        run_migrations(engine)
+        seeded = seed(engine, rows)
+        report["database"] = engine.dialect.name
+        report["sizes"].append({**seeded, "results": bench_size(engine, args.repeat)})
+        engine.dispose()
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+
+    if args.baseline:
+        regressions = compare(args.baseline, report, args.tolerance)
+        for message in regressions:
+            print(message, file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+"""
+Sitio local que imita books.toscrape.com para los benchmarks
+
+Genera al vuelo una portada con el menú de categorías, el listado completo
+(catalogue/page-N.html), los listados paginados de cada categoría y la página
+de detalle de cada producto, con el mismo marcado que el sitio real. El
+contenido es determinista: la misma configuración produce siempre las mismas
+páginas. Cada respuesta puede retrasarse `latency` segundos (más un jitter
+aleatorio) para simular la red.
+
+Uso:
+    python benchmarks/fixture_site.py --port 8000 --categories 20 --pages 10 --latency 0.05
+    python app/main.py worker --seed http://127.0.0.1:8000 --concurrency 4
+
+Desde otro script:
+    with FixtureSite(categories=5, pages=4) as site:
+        scraper = WebScraper(site.url)
+"""
+import argparse
+import random
+import sys
+import threading
+import time
+from html import escape
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional
+
+RATINGS = ["One", "Two", "Three", "Four", "Five"]
+CATEGORY_NAMES = ["Travel", "Mystery", "Historical Fiction", "Sequential Art", "Classics",
+                  "Philosophy", "Romance", "Womens Fiction", "Fiction", "Childrens",
+                  "Religion", "Nonfiction", "Music", "Science Fiction", "Sports and Games",
+                  "Fantasy", "New Adult", "Young Adult", "Science", "Poetry"]
+
+
+def _slug(text: str) -> str:
+    return "-".join(text.lower().split())
+
+
+class FixtureSite:
+    """
+    Servidor HTTP local con `categories` categorías de `pages` páginas de
+    `per_page` productos cada una.
+
+    El listado completo (catalogue/page-N.html) tiene las mismas páginas que
+    todas las categorías juntas, de modo que recorrerlo o seguir la frontera
+    de crawl desde la portada da el mismo número de productos.
+    """
+
+    def __init__(self, categories: int = 10, pages: int = 5, per_page: int = 20,
+                 latency: float = 0.0, jitter: float = 0.0, host: str = "127.0.0.1", port: int = 0):
+        self.categories = categories
+        self.pages = pages
+        self.per_page = per_page
+        self.latency = latency
+        self.jitter = jitter
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def total_pages(self) -> int:
+        """Páginas de listado que recorre un crawl desde la portada"""
+        return self.categories * self.pages
+
+    @property
+    def total_products(self) -> int:
+        return self.total_pages * self.per_page
+
+    def listing_urls(self) -> List[str]:
+        """URLs absolutas de todas las páginas de listado de las categorías"""
+        return [
+            f"{self.url}/{self._category_path(index)}/{'index' if page == 1 else f'page-{page}'}.html"
+            for index in range(self.categories)
+            for page in range(1, self.pages + 1)
+        ]
+
+    def category_name(self, index: int) -> str:
+        name = CATEGORY_NAMES[index % len(CATEGORY_NAMES)]
+        return name if index < len(CATEGORY_NAMES) else f"{name} {index // len(CATEGORY_NAMES) + 1}"
+
+    def _category_path(self, index: int) -> str:
+        return f"catalogue/category/books/{_slug(self.category_name(index))}_{index + 2}"
+
+    # --- Generación de páginas -------------------------------------------
+
+    def _product(self, number: int) -> dict:
+        """Producto `number` (0..total_products-1) del listado completo"""
+        category = number // (self.pages * self.per_page)
+        title = f"{self.category_name(category)} book {number}"
+        return {
+            "title": title,
+            "slug": f"{_slug(title)}_{number}",
+            "price": f"{10 + (number * 37) % 5000 / 100:.2f}",
+            "rating": RATINGS[number % len(RATINGS)],
+            "stock": number % 23,
+        }
+
+    def _menu(self, root: str) -> str:
+        items = "".join(
+            f'<li><a href="{root}{self._category_path(i)}/index.html">\n  {escape(self.category_name(i))}\n</a></li>'
+            for i in range(self.categories)
+        )
+        return (f'<div class="side_categories"><ul class="nav nav-list"><li>'
+                f'<a href="{root}catalogue/category/books_1/index.html">Books</a><ul>{items}</ul></li></ul></div>')
+
+    def _listing(self, root: str, heading: str, first: int, next_href: Optional[str]) -> str:
+        pods = []
+        for number in range(first, min(first + self.per_page, self.total_products)):
+            product = self._product(number)
+            detail = f"{root}catalogue/{product['slug']}/index.html"
+            pods.append(
+                f'<li class="col-xs-6 col-sm-4 col-md-3 col-lg-3"><article class="product_pod">'
+                f'<div class="image_container"><a href="{detail}">'
+                f'<img src="{root}media/cache/{number}.jpg" alt="{escape(product["title"])}" class="thumbnail"></a></div>'
+                f'<p class="star-rating {product["rating"]}"><i class="icon-star"></i></p>'
+                f'<h3><a href="{detail}" title="{escape(product["title"])}">{escape(product["title"][:20])}...</a></h3>'
+                f'<div class="product_price"><p class="price_color">£{product["price"]}</p>'
+                f'<p class="instock availability"><i class="icon-ok"></i> In stock</p></div>'
+                f'</article></li>'
+            )
+        pager = f'<ul class="pager"><li class="next"><a href="{next_href}">next</a></li></ul>' if next_href else ""
+        return (f'<!DOCTYPE html><html lang="en-us"><head><title>{escape(heading)} | Books to Scrape</title></head>'
+                f'<body><div class="container-fluid page"><div class="page_inner"><div class="row">'
+                f'<aside class="sidebar col-sm-4 col-md-3">{self._menu(root)}</aside>'
+                f'<div class="col-sm-8 col-md-9"><div class="page-header action"><h1>{escape(heading)}</h1></div>'
+                f'<section><ol class="row">{"".join(pods)}</ol>{pager}</section>'
+                f'</div></div></div></div></body></html>')
+
+    def _detail(self, number: int) -> str:
+        product = self._product(number)
+        return (f'<!DOCTYPE html><html lang="en-us"><head><title>{escape(product["title"])} | Books to Scrape</title></head>'
+                f'<body><article class="product_page"><h1>{escape(product["title"])}</h1>'
+                f'<div id="product_description" class="sub-header"><h2>Product Description</h2></div>'
+                f'<p>Synthetic description of {escape(product["title"])}. ' + "Lorem ipsum dolor sit amet. " * 20 + '</p>'
+                f'<table class="table table-striped">'
+                f'<tr><th>UPC</th><td>{number:016x}</td></tr>'
+                f'<tr><th>Product Type</th><td>Books</td></tr>'
+                f'<tr><th>Price (excl. tax)</th><td>£{product["price"]}</td></tr>'
+                f'<tr><th>Availability</th><td>In stock ({product["stock"]} available)</td></tr>'
+                f'</table></article></body></html>')
+
+    def render(self, path: str) -> Optional[str]:
+        """HTML de `path` o None si no existe"""
+        path = path.split("?", 1)[0].lstrip("/")
+        total_listing = self.total_pages
+        if path in ("", "index.html"):
+            return self._listing("", "All products", 0, "catalogue/page-2.html" if total_listing > 1 else None)
+        if path.startswith("catalogue/page-") and path.endswith(".html"):
+            page = int(path[len("catalogue/page-"):-len(".html")] or 0)
+            if not 1 <= page <= total_listing:
+                return None
+            next_href = f"page-{page + 1}.html" if page < total_listing else None
+            return self._listing("../", "All products", (page - 1) * self.per_page, next_href)
+        for index in range(self.categories):
+            prefix = self._category_path(index) + "/"
+            if not path.startswith(prefix):
+                continue
+            name = path[len(prefix):]
+            page = 1 if name == "index.html" else int(name[len("page-"):-len(".html")]) if name.startswith("page-") else 0
+            if not 1 <= page <= self.pages:
+                return None
+            next_href = f"page-{page + 1}.html" if page < self.pages else None
+            first = (index * self.pages + page - 1) * self.per_page
+            return self._listing("../../../../", self.category_name(index), first, next_href)
+        if path.startswith("catalogue/") and path.endswith("/index.html"):
+            slug = path[len("catalogue/"):-len("/index.html")]
+            number = slug.rsplit("_", 1)[-1]
+            if "/" not in slug and number.isdigit() and int(number) < self.total_products:
+                return self._detail(int(number))
+        return None
+
+    # --- Servidor -------------------------------------------------------
+
+    def _handler_class(self):
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Cabeceras y cuerpo van en escrituras separadas: sin esto, Nagle y
+            # el ACK retardado añaden ~40 ms a cada respuesta keep-alive
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                with site._lock:
+                    site.requests += 1
+                delay = site.latency + (random.uniform(0, site.jitter) if site.jitter else 0.0)
+                if delay > 0:
+                    time.sleep(delay)
+                try:
+                    html = site.render(self.path)
+                except ValueError:
+                    html = None
+                body = (html or "<html><body><h1>404 Not Found</h1></body></html>").encode("utf-8")
+                self.send_response(200 if html is not None else 404)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self) -> "FixtureSite":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fixture-site", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self) -> "FixtureSite":
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sitio local al estilo de books.toscrape.com")
+    parser.add_argument("--host", default="127.0.0.1", help="Dirección de escucha")
+    parser.add_argument("--port", type=int, default=8000, help="Puerto de escucha")
+    parser.add_argument("--categories", type=int, default=10, help="Número de categorías")
+    parser.add_argument("--pages", type=int, default=5, help="Páginas de listado por categoría")
+    parser.add_argument("--per-page", type=int, default=20, help="Productos por página")
+    parser.add_argument("--latency", type=float, default=0.0, help="Retardo de cada respuesta en segundos")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Retardo aleatorio adicional máximo en segundos")
+    args = parser.parse_args()
+
+    site = FixtureSite(categories=args.categories, pages=args.pages, per_page=args.per_page,
+                       latency=args.latency, jitter=args.jitter, host=args.host, port=args.port)
+    print(f"Sirviendo {site.total_pages} páginas y {site.total_products} productos en {site.url}",
+          file=sys.stderr)
+    try:
+        site._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        site._server.server_close()
+
+
+if __name__ == "__main__":
+    main()
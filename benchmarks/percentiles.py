@@ -0,0 +1,28 @@
+"""
+Percentiles comunes a los benchmarks
+
+Se usa el método nearest-rank: el percentil p de n muestras ordenadas es la
+muestra de posición ceil(p * n) (contando desde 1). Así el p95 nunca queda
+por debajo de la mediana, ni siquiera con pocas repeticiones.
+"""
+import math
+import statistics
+from typing import Dict, Iterable, Sequence
+
+
+def percentile(values: Sequence[float], fraction: float) -> float:
+    """Percentil `fraction` (0-1] de `values` por nearest-rank"""
+    if not values:
+        raise ValueError("No hay muestras")
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(len(ordered) * fraction) - 1)]
+
+
+def latency_summary(timings_ms: Iterable[float]) -> Dict[str, float]:
+    """p50, p95 y máximo en ms de una serie de latencias en ms"""
+    ms = sorted(timings_ms)
+    return {
+        "p50_ms": round(statistics.median(ms), 3),
+        "p95_ms": round(percentile(ms, 0.95), 3),
+        "max_ms": round(ms[-1], 3),
+    }
@@ -0,0 +1,204 @@
+"""
+Benchmark de formas de consulta de GET /products/
+
+Crea una tabla `products` sintética, y para cada combinación de filtros de
+get_products registra el plan de ejecución (EXPLAIN), los índices usados y la
+latencia. Con --baseline compara con un informe anterior y termina con error
+si alguna combinación deja de usar los índices que usaba.
+
+Uso:
+    python benchmarks/query_shapes.py --rows 200000 --output shapes.json
+    python benchmarks/query_shapes.py --baseline shapes.json
+    python benchmarks/query_shapes.py --database-url postgresql://... --output pg.json
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+from sqlalchemy import create_engine, text  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from migrations import run_migrations  # noqa: E402
+from models import Base, ProductDB  # noqa: E402
+from percentiles import latency_summary  # noqa: E402
+from queries import filter_products  # noqa: E402
+
+CATEGORIES = [f"category-{i}" for i in range(50)]
+WORDS = ["light", "attic", "velvet", "soul", "sharp", "objects", "sapiens", "requiem",
+         "dark", "secret", "garden", "history", "night", "river", "stone", "winter"]
+
+# Valores de cada filtro usados en las combinaciones
+FILTER_VALUES = {
+    "min_price": 40.0,
+    "max_price": 45.0,
+    "category": "category-7",
+    "min_rating": 5,
+    "name": "velvet sou",
+}
+
+# Índices mencionados en los planes de ejecución
+INDEX_PATTERNS = {
+    "sqlite": re.compile(r"USING (?:COVERING )?INDEX (\w+)"),
+    "postgresql": re.compile(r"Index (?:Only )?Scan(?: Backward)? using (\w+)|Bitmap Index Scan on (\w+)"),
+}
+# Planes que indican un recorrido completo de la tabla. Con ORDER BY id LIMIT
+# puede ser la mejor opción si el filtro es poco selectivo (el recorrido para
+# en cuanto hay `limit` filas), así que solo se informa
+FULL_SCAN_PATTERNS = {
+    "sqlite": re.compile(r"^SCAN (TABLE )?products\b(?! USING)"),
+    "postgresql": re.compile(r"Seq Scan on products\b"),
+}
+
+
+def seed(engine, rows: int, batch_size: int = 10000) -> None:
+    """Rellena la tabla products con `rows` productos sintéticos"""
+    rng = random.Random(42)
+    with engine.begin() as conn:
+        existing = conn.execute(text("SELECT COUNT(*) FROM products")).scalar()
+    if existing >= rows:
+        print(f"La tabla ya tiene {existing} filas, no se insertan más")
+        return
+
+    table = ProductDB.__table__
+    start = time.perf_counter()
+    for offset in range(existing, rows, batch_size):
+        batch = [
+            {
+                "title": f"{' '.join(rng.sample(WORDS, 3))} {i}",
+                "price": round(rng.uniform(10, 60), 2),
+                "category": rng.choice(CATEGORIES),
+                "rating": rng.randint(0, 5),
+                "image_url": f"https://example.com/media/{i}.jpg",
+            }
+            for i in range(offset, min(offset + batch_size, rows))
+        ]
+        with engine.begin() as conn:
+            conn.execute(table.insert(), batch)
+    with engine.begin() as conn:
+        if engine.dialect.name == "sqlite":
+            conn.execute(text("ANALYZE"))
+        elif engine.dialect.name == "postgresql":
+            conn.execute(text("ANALYZE products"))
+    print(f"Insertadas {rows - existing} filas en {time.perf_counter() - start:.1f}s")
+
+
+def explain(session, query) -> list:
+    dialect = session.get_bind().dialect
+    sql = str(query.statement.compile(dialect=dialect, compile_kwargs={"literal_binds": True}))
+    prefix = "EXPLAIN QUERY PLAN " if dialect.name == "sqlite" else "EXPLAIN "
+    rows = session.execute(text(prefix + sql)).fetchall()
+    if dialect.name == "sqlite":
+        return [row[-1] for row in rows]
+    return [row[0] for row in rows]
+
+
+def run_shape(session, filters: dict, repeat: int, limit: int) -> dict:
+    query = filter_products(session.query(ProductDB), session, **filters).limit(limit)
+    plan = explain(session, query)
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        rows = query.all()
+        timings.append((time.perf_counter() - start) * 1000)
+        session.expunge_all()
+
+    dialect = session.get_bind().dialect.name
+    index_pattern = INDEX_PATTERNS.get(dialect)
+    indexes = set()
+    if index_pattern:
+        for line in plan:
+            for match in index_pattern.finditer(line):
+                indexes.update(name for name in match.groups() if name)
+    scan_pattern = FULL_SCAN_PATTERNS.get(dialect)
+    full_scan = bool(scan_pattern) and any(scan_pattern.search(line) for line in plan)
+    return {
+        "filters": sorted(filters),
+        "rows": len(rows),
+        "plan": plan,
+        "indexes": sorted(indexes),
+        "full_scan": full_scan,
+        **latency_summary(timings),
+    }
+
+
+def compare(baseline_path: str, results: list) -> list:
+    """Combinaciones que usaban algún índice en el informe base y ya no lo usan"""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {tuple(shape["filters"]): shape for shape in json.load(f)["shapes"]}
+    regressions = []
+    for result in results:
+        previous = baseline.get(tuple(result["filters"]))
+        if previous is None:
+            continue
+        lost = set(previous.get("indexes", [])) - set(result["indexes"])
+        if lost:
+            regressions.append(
+                f"Regresión en {','.join(result['filters'])}: ya no usa {', '.join(sorted(lost))} "
+                f"(p50 {previous['p50_ms']}ms -> {result['p50_ms']}ms)"
+            )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de formas de consulta de /products/")
+    parser.add_argument("--database-url", default=None,
+                        help="Base de datos a usar (por defecto, un SQLite temporal)")
+    parser.add_argument("--rows", type=int, default=200000, help="Filas sintéticas a generar")
+    parser.add_argument("--repeat", type=int, default=20, help="Ejecuciones por combinación")
+    parser.add_argument("--limit", type=int, default=100, help="LIMIT de cada consulta")
+    parser.add_argument("--output", default=None, help="Fichero JSON de resultados (por defecto, stdout)")
+    parser.add_argument("--baseline", default=None,
+                        help="Informe JSON anterior: error si alguna combinación deja de usar sus índices")
+    args = parser.parse_args()
+
+    database_url = args.database_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    engine = create_engine(database_url)
+    Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
+    seed(engine, args.rows)
+
+    results = []
+    with sessionmaker(bind=engine)() as session:
+        names = list(FILTER_VALUES)
+        for size in range(len(names) + 1):
+            for combination in itertools.combinations(names, size):
+                filters = {name: FILTER_VALUES[name] for name in combination}
+                result = run_shape(session, filters, args.repeat, args.limit)
+                results.append(result)
+                print(f"{','.join(result['filters']) or '(sin filtros)':55} "
+                      f"p50={result['p50_ms']:8.3f}ms p95={result['p95_ms']:8.3f}ms "
+                      f"{','.join(result['indexes']) or 'sin índices'}",
+                      file=sys.stderr)
+
+    report = {
+        "database": engine.dialect.name,
+        "rows": args.rows,
+        "repeat": args.repeat,
+        "limit": args.limit,
+        "shapes": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+
+    if args.baseline:
+        regressions = compare(args.baseline, results)
+        for message in regressions:
+            print(message, file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+"""
+Benchmark de rendimiento del scraper contra un sitio local
+
+Levanta un FixtureSite (ver fixture_site.py) y mide, sin salir a la red:
+
+- fetch: páginas/s de WebScraper.fetch_html en secuencia y con varios hilos
+- parse: páginas/s y productos/s de cada backend de parseo
+- save: productos/s de save_products_to_db fila a fila y en bloque, con
+  productos nuevos y sin cambios
+- pipeline: el crawl completo con ScrapePipeline desde la portada
+
+Uso:
+    python benchmarks/scraper_throughput.py --categories 20 --pages 10 --output scraper.json
+    python benchmarks/scraper_throughput.py --latency 0.05 --concurrency 8
+    python benchmarks/scraper_throughput.py --database-url postgresql://... --output pg.json
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from database import create_configured_engine  # noqa: E402
+from fixture_site import FixtureSite  # noqa: E402
+from migrations import run_migrations  # noqa: E402
+from models import Base, PageFingerprintDB, ProductDB, ProductStatsDB  # noqa: E402
+from parsers import PARSER_BACKENDS, etree, get_parser  # noqa: E402
+from percentiles import latency_summary  # noqa: E402
+from pipeline import ScrapePipeline  # noqa: E402
+from scraper import WebScraper  # noqa: E402
+
+
+def summarize(timings: list, items: int = 0) -> dict:
+    """Percentiles en ms de `timings` (segundos) y ritmo de `items` por segundo"""
+    total = sum(timings)
+    return {
+        "seconds": round(total, 3),
+        "per_second": round(items / total, 1) if total > 0 else None,
+        **latency_summary(t * 1000 for t in timings),
+    }
+
+
+def bench_fetch(scraper: WebScraper, urls: list, concurrency: int) -> tuple:
+    """Descarga las páginas en secuencia y con `concurrency` hilos; devuelve el informe y el HTML"""
+    pages = {}
+    timings = []
+    for url in urls:
+        start = time.perf_counter()
+        pages[url] = scraper.fetch_html(url)
+        timings.append(time.perf_counter() - start)
+    report = {"sequential": summarize(timings, len(urls))}
+
+    def timed(url):
+        start = time.perf_counter()
+        scraper.fetch_html(url)
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        timings = list(executor.map(timed, urls))
+    wall = time.perf_counter() - start
+    report["concurrent"] = {
+        **summarize(timings),
+        "concurrency": concurrency,
+        "seconds": round(wall, 3),
+        "per_second": round(len(urls) / wall, 1),
+    }
+    report["failed"] = sum(html is None for html in pages.values())
+    return report, {url: html for url, html in pages.items() if html is not None}
+
+
+def bench_parse(pages: dict, repeat: int) -> list:
+    """Parsea todas las páginas `repeat` veces con cada backend disponible"""
+    results = []
+    for name in PARSER_BACKENDS:
+        if name == "lxml" and etree is None:
+            continue
+        parser = get_parser(name)
+        timings = []
+        products = 0
+        for _ in range(repeat):
+            for url, html in pages.items():
+                start = time.perf_counter()
+                page = parser.parse_page(html, url)
+                timings.append(time.perf_counter() - start)
+                products += len(page.products)
+        result = {"backend": name, **summarize(timings, len(timings)),
+                  "products_per_second": round(products / sum(timings), 1)}
+        results.append(result)
+        print(f"parse {name:6} {result['per_second']:10.1f} páginas/s "
+              f"{result['products_per_second']:10.1f} productos/s", file=sys.stderr)
+    return results
+
+
+def reset_tables(Session) -> None:
+    with Session() as db:
+        for model in (ProductDB, ProductStatsDB, PageFingerprintDB):
+            db.query(model).delete()
+        db.commit()
+
+
+def bench_save(scraper: WebScraper, Session, products: list, batch_size: int) -> list:
+    """save_products_to_db por lotes, fila a fila y en bloque, con productos nuevos y repetidos"""
+    results = []
+    batches = [products[i:i + batch_size] for i in range(0, len(products), batch_size)]
+    for bulk in (False, True):
+        reset_tables(Session)
+        for phase in ("insert", "unchanged"):
+            timings = []
+            with Session() as db:
+                for batch in batches:
+                    start = time.perf_counter()
+                    scraper.save_products_to_db(batch, db, bulk=bulk)
+                    timings.append(time.perf_counter() - start)
+            result = {"mode": "bulk" if bulk else "rows", "phase": phase,
+                      "batch_size": batch_size, **summarize(timings, len(products))}
+            results.append(result)
+            print(f"save {result['mode']:4} {phase:9} {result['per_second']:10.1f} productos/s", file=sys.stderr)
+    return results
+
+
+def bench_pipeline(scraper: WebScraper, Session, concurrency: int, max_pages: int) -> dict:
+    """Crawl completo desde la portada con ScrapePipeline sobre tablas vacías"""
+    reset_tables(Session)
+    pipeline = ScrapePipeline(scraper, Session, concurrency=concurrency)
+    stats = pipeline.run(scraper.frontier(max_pages))
+    elapsed = stats["elapsed_seconds"]
+    pages = stats["stages"]["fetch"]["items"]
+    products = stats["inserted"] + stats["updated"] + stats["unchanged"]
+    print(f"pipeline {pages} páginas, {products} productos en {elapsed:.2f}s", file=sys.stderr)
+    return {
+        "concurrency": concurrency,
+        "pages": pages,
+        "products": products,
+        "seconds": elapsed,
+        "pages_per_second": round(pages / elapsed, 1) if elapsed else None,
+        "products_per_second": round(products / elapsed, 1) if elapsed else None,
+        "stats": stats,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de descarga, parseo y guardado del scraper")
+    parser.add_argument("--categories", type=int, default=10, help="Categorías del sitio local")
+    parser.add_argument("--pages", type=int, default=5, help="Páginas de listado por categoría")
+    parser.add_argument("--per-page", type=int, default=20, help="Productos por página")
+    parser.add_argument("--latency", type=float, default=0.0, help="Retardo de cada respuesta en segundos")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Retardo aleatorio adicional máximo")
+    parser.add_argument("--concurrency", type=int, default=4, help="Hilos de descarga")
+    parser.add_argument("--rate-limit", type=float, default=1000.0,
+                        help="Solicitudes por segundo del scraper (alto para medir el techo)")
+    parser.add_argument("--repeat", type=int, default=5, help="Repeticiones del parseo de cada página")
+    parser.add_argument("--batch-size", type=int, default=200, help="Productos por lote al guardar")
+    parser.add_argument("--database-url", default=None,
+                        help="Base de datos a usar (por defecto, un SQLite temporal); se vacían sus tablas")
+    parser.add_argument("--output", default=None, help="Fichero JSON de resultados (por defecto, stdout)")
+    args = parser.parse_args()
+
+    # Los logs INFO por página y por producto distorsionarían las medidas
+    logging.disable(logging.INFO)
+
+    database_url = args.database_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    engine = create_configured_engine(database_url)
+    Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
+    Session = sessionmaker(bind=engine)
+
+    with FixtureSite(categories=args.categories, pages=args.pages, per_page=args.per_page,
+                     latency=args.latency, jitter=args.jitter) as site:
+        scraper = WebScraper(site.url, rate_limit=args.rate_limit, pool_size=max(args.concurrency, 10),
+                             start_delay=0.0)
+        try:
+            fetch, pages = bench_fetch(scraper, site.listing_urls(), args.concurrency)
+            print(f"fetch secuencial {fetch['sequential']['per_second']:10.1f} páginas/s, "
+                  f"{args.concurrency} hilos {fetch['concurrent']['per_second']:10.1f} páginas/s",
+                  file=sys.stderr)
+            parse = bench_parse(pages, args.repeat)
+            products = []
+            for url, html in pages.items():
+                products.extend(scraper.parse_page(html, url).products)
+            save = bench_save(scraper, Session, products, args.batch_size)
+            # +1: la portada, de la que solo se siguen las categorías
+            pipeline = bench_pipeline(scraper, Session, args.concurrency, site.total_pages + 1)
+        finally:
+            scraper.close()
+
+    report = {
+        "database": engine.dialect.name,
+        "site": {
+            "categories": args.categories,
+            "pages": site.total_pages,
+            "products": site.total_products,
+            "latency": args.latency,
+            "jitter": args.jitter,
+        },
+        "rate_limit": args.rate_limit,
+        "fetch": fetch,
+        "parse": parse,
+        "save": save,
+        "pipeline": pipeline,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+
+
+if __name__ == "__main__":
+    main()
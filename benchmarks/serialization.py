@@ -0,0 +1,103 @@
+"""
+Benchmark de serialización de GET /products/
+
+Compara, para listados grandes, el camino anterior (objetos ORM validados con
+el modelo pydantic Product y codificados con jsonable_encoder + JSONResponse)
+con el camino rápido (tuplas de columnas serializadas con dump_products).
+Comprueba además que ambos producen exactamente los mismos bytes.
+
+Uso:
+    python benchmarks/serialization.py --rows 20000 --limit 1000
+    python benchmarks/serialization.py --limit 100 --limit 1000 --output serialization.json
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from fastapi.responses import JSONResponse  # noqa: E402
+from sqlalchemy import create_engine  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from migrations import run_migrations  # noqa: E402
+from models import Base, Product, ProductDB  # noqa: E402
+from percentiles import latency_summary  # noqa: E402
+from query_shapes import seed  # noqa: E402
+from serialization import PRODUCT_COLUMNS, dump_products, orjson  # noqa: E402
+
+
+def orm_path(session, limit: int) -> bytes:
+    """Camino anterior: ORM + validación pydantic + jsonable_encoder"""
+    products = session.query(ProductDB).order_by(ProductDB.id).limit(limit).all()
+    content = [Product.model_validate(product, from_attributes=True) for product in products]
+    body = JSONResponse(content=jsonable_encoder(content)).body
+    session.expunge_all()
+    return body
+
+
+def fast_path(session, limit: int) -> bytes:
+    """Camino rápido: columnas como tuplas + dump_products"""
+    rows = session.query(*PRODUCT_COLUMNS).order_by(ProductDB.id).limit(limit).all()
+    return dump_products(rows)
+
+
+def measure(function, session, limit: int, repeat: int) -> dict:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(session, limit)
+        timings.append((time.perf_counter() - start) * 1000)
+    return latency_summary(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de serialización de /products/")
+    parser.add_argument("--database-url", default=None,
+                        help="Base de datos a usar (por defecto, un SQLite temporal)")
+    parser.add_argument("--rows", type=int, default=20000, help="Filas sintéticas a generar")
+    parser.add_argument("--repeat", type=int, default=30, help="Ejecuciones por medición")
+    parser.add_argument("--limit", type=int, action="append",
+                        help="Tamaño del listado; se puede repetir (por defecto 100 y 1000)")
+    parser.add_argument("--output", default=None, help="Fichero JSON de resultados (por defecto, stdout)")
+    args = parser.parse_args()
+
+    database_url = args.database_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    engine = create_engine(database_url)
+    Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
+    seed(engine, args.rows)
+
+    results = []
+    with sessionmaker(bind=engine)() as session:
+        for limit in args.limit or [100, 1000]:
+            if orm_path(session, limit) != fast_path(session, limit):
+                print(f"limit={limit}: el camino rápido no produce los mismos bytes", file=sys.stderr)
+                sys.exit(1)
+            orm = measure(orm_path, session, limit, args.repeat)
+            fast = measure(fast_path, session, limit, args.repeat)
+            speedup = round(orm["p50_ms"] / fast["p50_ms"], 2) if fast["p50_ms"] else None
+            results.append({"limit": limit, "orm": orm, "fast": fast, "speedup": speedup})
+            print(f"limit={limit:6} orm p50={orm['p50_ms']:8.3f}ms  "
+                  f"rápido p50={fast['p50_ms']:8.3f}ms  x{speedup}", file=sys.stderr)
+
+    report = {
+        "database": engine.dialect.name,
+        "encoder": "orjson" if orjson is not None else "json",
+        "rows": args.rows,
+        "repeat": args.repeat,
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Configuración común de los tests
+
+El código de la aplicación se importa como en producción, desde app/ con
+imports planos. database.py crea el motor al importarse, así que
+DATABASE_URL apunta a un SQLite temporal antes de importar nada de app/.
+"""
+import os
+import sys
+import tempfile
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT_DIR, "app"))
+# Para el sitio local de benchmarks/fixture_site.py; al final, porque algunos
+# scripts de benchmarks se llaman igual que módulos de app/
+sys.path.append(os.path.join(ROOT_DIR, "benchmarks"))
+
+_tmp_dir = tempfile.mkdtemp(prefix="scraper-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp_dir, 'products.db')}"
+os.environ.setdefault("ASYNC_DB", "false")
+os.environ.setdefault("LOG_FILE", "")
+
+import pytest  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from database import create_configured_engine  # noqa: E402
+from migrations import run_migrations  # noqa: E402
+from models import Base  # noqa: E402
+
+
+@pytest.fixture
+def engine(tmp_path):
+    """Motor sobre un SQLite nuevo con las tablas y migraciones aplicadas"""
+    engine = create_configured_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def session_factory(engine):
+    return sessionmaker(bind=engine, autoflush=False)
+
+
+@pytest.fixture
+def db(session_factory):
+    with session_factory() as session:
+        yield session
+
+
+@pytest.fixture
+def client(session_factory, monkeypatch):
+    """TestClient de la API sobre la base del test y sin caché de respuestas"""
+    from fastapi.testclient import TestClient
+
+    from api import app
+    from cache import response_cache
+    from database import get_db
+
+    def override_get_db():
+        with session_factory() as session:
+            yield session
+
+    monkeypatch.setattr(response_cache, "ttl", 0)
+    app.dependency_overrides[get_db] = override_get_db
+    try:
+        yield TestClient(app)
+    finally:
+        app.dependency_overrides.pop(get_db, None)
@@ -0,0 +1,162 @@
+from sqlalchemy import event, select
+
+from aggregates import StatsDelta, apply_delta, check_stats, clear_stats, read_stats, rebuild_stats
+from models import ProductDB, ProductStatsDB
+from scraper import WebScraper, upsert_products
+
+
+def product(title, price, category="travel", rating=3.0):
+    return {"title": title, "price": price, "category": category, "rating": rating}
+
+
+def test_upsert_counts_rows_inserted_by_a_concurrent_writer_as_updates(session_factory, db):
+    # Otro proceso guarda "A" justo después de la consulta previa de upsert_products
+    @event.listens_for(db, "do_orm_execute")
+    def concurrent_insert(state):
+        if state.is_select:
+            event.remove(db, "do_orm_execute", concurrent_insert)
+            result = state.invoke_statement()
+            with session_factory() as other:
+                upsert_products([product("A", 10.0)], other)
+            return result
+
+    result = upsert_products([product("A", 12.0), product("B", 20.0)], db)
+
+    assert result == {"inserted": 1, "updated": 1, "unchanged": 0}
+    assert check_stats(db) == []
+    assert read_stats(db)["total_products"] == 2
+    assert db.execute(select(ProductDB.price).where(ProductDB.title == "A")).scalar() == 12.0
+
+
+def test_upsert_skips_rows_a_concurrent_writer_already_saved(session_factory, db):
+    @event.listens_for(db, "do_orm_execute")
+    def concurrent_insert(state):
+        if state.is_select:
+            event.remove(db, "do_orm_execute", concurrent_insert)
+            result = state.invoke_statement()
+            with session_factory() as other:
+                upsert_products([product("A", 10.0)], other)
+            return result
+
+    result = upsert_products([product("A", 10.0)], db)
+
+    assert result == {"inserted": 0, "updated": 0, "unchanged": 1}
+    assert check_stats(db) == []
+    assert read_stats(db)["total_products"] == 1
+
+
+def test_save_rows_and_upsert_agree(session_factory):
+    batches = [
+        [product("A", 10.0), product("B", 20.0, "mystery")],
+        [product("A", 15.0, "mystery"), product("B", 20.0, "mystery"), product("C", 5.0)],
+    ]
+    scraper = WebScraper("http://127.0.0.1")
+    try:
+        for bulk in (False, True):
+            with session_factory() as db:
+                db.query(ProductDB).delete()
+                clear_stats(db)
+                db.commit()
+                results = [scraper.save_products_to_db(batch, db, bulk=bulk) for batch in batches]
+                assert results == [
+                    {"inserted": 2, "updated": 0, "unchanged": 0},
+                    {"inserted": 1, "updated": 1, "unchanged": 1},
+                ]
+                assert check_stats(db) == []
+    finally:
+        scraper.close()
+
+
+def add_products(db, *products):
+    delta = StatsDelta()
+    for data in products:
+        db.add(ProductDB(**data))
+        delta.add(data)
+    apply_delta(db, delta)
+    db.commit()
+
+
+def remove_product(db, title):
+    row = db.query(ProductDB).filter(ProductDB.title == title).one()
+    delta = StatsDelta()
+    delta.remove({"price": row.price, "category": row.category, "rating": row.rating})
+    db.delete(row)
+    apply_delta(db, delta)
+    db.commit()
+
+
+def stats_row(db, dimension, key):
+    return db.query(ProductStatsDB).filter(
+        ProductStatsDB.dimension == dimension, ProductStatsDB.key == key
+    ).one_or_none()
+
+
+def test_apply_delta_adds_products(db):
+    add_products(db, product("A", 10.0), product("B", 30.0), product("C", 5.0, "mystery", 5.0))
+    add_products(db, product("D", 50.0))
+    travel = stats_row(db, "category", "travel")
+    assert (travel.count, travel.price_sum, travel.price_min, travel.price_max) == (3, 90.0, 10.0, 50.0)
+    assert stats_row(db, "rating", "3.0").count == 3
+    assert stats_row(db, "rating", "5.0").count == 1
+    assert check_stats(db) == []
+
+
+def test_apply_delta_recomputes_min_and_max_on_removal(db):
+    add_products(db, product("A", 10.0), product("B", 30.0), product("C", 20.0))
+    remove_product(db, "B")
+    travel = stats_row(db, "category", "travel")
+    assert (travel.count, travel.price_sum, travel.price_min, travel.price_max) == (2, 30.0, 10.0, 20.0)
+    remove_product(db, "A")
+    assert stats_row(db, "category", "travel").price_min == 20.0
+    assert check_stats(db) == []
+
+
+def test_apply_delta_drops_empty_groups(db):
+    add_products(db, product("A", 10.0), product("B", 5.0, "mystery", 1.0))
+    remove_product(db, "B")
+    assert stats_row(db, "category", "mystery") is None
+    assert stats_row(db, "rating", "1.0") is None
+    assert read_stats(db)["total_products"] == 1
+    assert check_stats(db) == []
+
+
+def test_apply_delta_handles_missing_values(db):
+    add_products(db, {"title": "A", "price": None, "category": None, "rating": None}, product("B", 8.0))
+    assert stats_row(db, "category", "").count == 1
+    assert stats_row(db, "category", "").price_min is None
+    assert check_stats(db) == []
+
+
+def test_empty_delta_is_a_no_op(db):
+    apply_delta(db, StatsDelta())
+    assert not StatsDelta()
+    assert db.query(ProductStatsDB).count() == 0
+
+
+def test_check_stats_reports_drift_and_rebuild_fixes_it(db):
+    add_products(db, product("A", 10.0), product("B", 5.0, "mystery"))
+    travel = stats_row(db, "category", "travel")
+    travel.count = 7
+    travel.price_max = 99.0
+    db.delete(stats_row(db, "category", "mystery"))
+    db.add(ProductStatsDB(dimension="category", key="ghost", count=1, price_sum=1.0))
+    db.commit()
+
+    drift = check_stats(db)
+    assert len(drift) == 4
+    assert any("travel" in line and "count" in line for line in drift)
+    assert any("travel" in line and "price_max" in line for line in drift)
+    assert any("mystery" in line for line in drift)
+    assert any("ghost" in line for line in drift)
+
+    assert rebuild_stats(db) == 3
+    assert check_stats(db) == []
+
+
+def test_check_stats_tolerates_rounding(db):
+    add_products(db, product("A", 0.1), product("B", 0.2))
+    travel = stats_row(db, "category", "travel")
+    travel.price_sum = 0.1 + 0.2 + 1e-9
+    db.commit()
+    assert check_stats(db) == []
+    assert check_stats(db, tolerance=0) != []
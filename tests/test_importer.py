@@ -0,0 +1,88 @@
+import gzip
+import io
+
+import pytest
+from sqlalchemy import select
+
+from aggregates import check_stats, read_stats
+from importer import normalize_record, open_binary, read_records, import_products
+from models import ProductDB
+
+
+def ndjson(*lines):
+    return io.StringIO("\n".join(lines) + "\n")
+
+
+def test_read_records_skips_invalid_and_non_object_lines():
+    stream = ndjson('{"title": "A"}', "no es json", "[1, 2]", '"x"', "3", "null", "", '{"title": "B"}')
+    records = list(read_records(stream, "ndjson"))
+    assert records == [{"title": "A"}, {}, {}, {}, {}, {}, {"title": "B"}]
+    assert [normalize_record(record) for record in records].count(None) == 5
+
+
+def test_read_records_csv():
+    stream = io.StringIO("title,price,stock\nA,1.5,\nB,2,3\n")
+    rows = [normalize_record(record) for record in read_records(stream, "csv")]
+    assert [(row["title"], row["price"], row["stock"]) for row in rows] == [("A", 1.5, None), ("B", 2.0, 3)]
+
+
+def test_open_binary_gzip():
+    data = gzip.compress(b'{"title": "A", "price": "3.5"}\n')
+    records = list(open_binary(io.BytesIO(data), "ndjson", compressed=True))
+    assert records == [{"title": "A", "price": "3.5"}]
+
+
+def test_normalize_record_defaults():
+    row = normalize_record({"title": "A", "image_url": "", "stock": ""})
+    assert row["price"] == 0.0
+    assert row["rating"] == 0.0
+    assert row["category"] == "books"
+    assert row["image_url"] is None
+    assert row["stock"] is None
+    assert row["content_hash"]
+
+
+def test_normalize_record_rejects_missing_title_and_bad_numbers():
+    assert normalize_record({}) is None
+    assert normalize_record({"title": ""}) is None
+    assert normalize_record({"title": "A", "price": "gratis"}) is None
+    assert normalize_record({"title": "A", "stock": "muchos"}) is None
+
+
+def test_normalize_record_hash_ignores_unknown_fields():
+    assert (normalize_record({"title": "A", "price": 1, "extra": "x"})["content_hash"]
+            == normalize_record({"title": "A", "price": 1})["content_hash"])
+
+
+def test_import_products_counts_skipped_records(engine, db):
+    stream = ndjson(
+        '{"title": "A", "price": 10, "category": "travel", "rating": 4}',
+        "[1, 2]",
+        '"texto"',
+        '{"price": 5}',
+        '{"title": "B", "price": 20, "category": "travel", "rating": 2}',
+    )
+    result = import_products(read_records(stream, "ndjson"), engine, batch_size=1)
+    assert result["rows"] == 2
+    assert result["skipped"] == 3
+    titles = db.execute(select(ProductDB.title).order_by(ProductDB.title)).scalars().all()
+    assert titles == ["A", "B"]
+    assert read_stats(db)["total_products"] == 2
+
+
+def test_import_products_updates_existing_titles(engine, db):
+    import_products([{"title": "A", "price": 1}], engine)
+    import_products([{"title": "A", "price": 2}], engine)
+    assert db.execute(select(ProductDB.price)).scalars().all() == [2.0]
+
+
+def test_import_products_rebuilds_stats_when_load_fails(engine, db):
+    def records():
+        yield {"title": "A", "price": 10, "category": "travel"}
+        yield {"title": "B", "price": 20, "category": "travel"}
+        raise OSError("conexión cortada")
+
+    with pytest.raises(OSError):
+        import_products(records(), engine, batch_size=1)
+    assert read_stats(db)["total_products"] == 2
+    assert check_stats(db) == []
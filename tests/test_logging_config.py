@@ -0,0 +1,104 @@
+import logging
+import queue
+import sys
+
+import pytest
+
+import logging_config
+from logging_config import SAMPLED, NonBlockingQueueHandler, SamplingFilter
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 50.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(logging_config, "time", clock)
+    return clock
+
+
+def make_record(msg="Producto extraído: %s", args=("libro",), sampled=True, name="scraper"):
+    record = logging.LogRecord(name, logging.INFO, __file__, 1, msg, args, None)
+    if sampled:
+        record.__dict__.update(SAMPLED)
+    return record
+
+
+def passed(sampling, count, **kwargs):
+    return [sampling.filter(make_record(**kwargs)) for _ in range(count)].count(True)
+
+
+def counter_value(logger_name):
+    return dict(logging_config.LOG_RECORDS_SAMPLED._values).get((logger_name,), 0)
+
+
+def test_rate_per_second_per_event(clock):
+    sampling = SamplingFilter(rate=3)
+    assert passed(sampling, 10) == 3
+    # Otra plantilla u otro logger es otro evento
+    assert passed(sampling, 10, msg="Nuevo producto añadido: %s") == 3
+    assert passed(sampling, 10, name="pipeline") == 3
+    clock.now += 1.0
+    assert passed(sampling, 10) == 3
+
+
+def test_unmarked_records_always_pass(clock):
+    sampling = SamplingFilter(rate=1)
+    assert passed(sampling, 10, sampled=False) == 10
+
+
+def test_non_positive_rate_disables_sampling(clock):
+    assert passed(SamplingFilter(rate=0), 10) == 10
+
+
+def test_first_record_of_next_window_reports_omitted(clock):
+    sampling = SamplingFilter(rate=2)
+    before = counter_value("omitidos")
+    passed(sampling, 7, name="omitidos")
+    clock.now += 1.5
+    record = make_record(name="omitidos")
+    assert sampling.filter(record)
+    assert record.getMessage() == "Producto extraído: libro (5 mensajes similares omitidos)"
+    assert counter_value("omitidos") - before == 5
+    # El siguiente ya no lleva el aviso
+    record = make_record(name="omitidos")
+    assert sampling.filter(record)
+    assert record.getMessage() == "Producto extraído: libro"
+
+
+def test_event_table_is_bounded(clock):
+    sampling = SamplingFilter(rate=1)
+    sampling.max_events = 10
+    for number in range(25):
+        sampling.filter(make_record(msg=f"Mensaje ya formateado {number}", args=()))
+    assert len(sampling._windows) <= 10
+
+
+def test_queue_handler_never_blocks_and_counts_drops():
+    handler = NonBlockingQueueHandler(queue.Queue(maxsize=1))
+    before = dict(logging_config.LOG_RECORDS_DROPPED._values).get((), 0)
+    handler.handle(make_record(sampled=False))
+    handler.handle(make_record(sampled=False))
+    assert handler.queue.qsize() == 1
+    assert dict(logging_config.LOG_RECORDS_DROPPED._values).get((), 0) - before == 1
+    record = handler.queue.get_nowait()
+    assert (record.msg, record.args) == ("Producto extraído: libro", None)
+
+
+def test_queue_handler_formats_exceptions_eagerly():
+    handler = NonBlockingQueueHandler(queue.Queue())
+    try:
+        raise ValueError("fallo")
+    except ValueError:
+        record = logging.LogRecord("scraper", logging.ERROR, __file__, 1, "Error", (), None)
+        record.exc_info = sys.exc_info()
+    handler.handle(record)
+    queued = handler.queue.get_nowait()
+    assert queued.exc_info is None
+    assert "ValueError: fallo" in queued.exc_text
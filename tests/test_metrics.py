@@ -0,0 +1,98 @@
+import math
+
+import pytest
+
+from metrics import CONTENT_TYPE, Registry
+
+
+@pytest.fixture
+def registry():
+    return Registry()
+
+
+def sample_lines(text):
+    return [line for line in text.splitlines() if line and not line.startswith("#")]
+
+
+def test_counter_render(registry):
+    counter = registry.counter("jobs_total", "Trabajos procesados", ("result",))
+    counter.inc(result="ok")
+    counter.inc(2, result="ok")
+    counter.inc(0.5, result="error")
+    assert registry.render() == (
+        "# HELP jobs_total Trabajos procesados\n"
+        "# TYPE jobs_total counter\n"
+        'jobs_total{result="error"} 0.5\n'
+        'jobs_total{result="ok"} 3\n'
+    )
+
+
+def test_label_values_are_escaped(registry):
+    counter = registry.counter("paths_total", "Rutas", ("path",))
+    counter.inc(path='C:\\dir\n"x"')
+    assert sample_lines(registry.render()) == ['paths_total{path="C:\\\\dir\\n\\"x\\""} 1']
+
+
+def test_help_is_escaped_but_quotes_are_kept(registry):
+    registry.gauge("temperature", 'Línea 1\nruta "C:\\tmp"')
+    assert registry.render().splitlines()[0] == '# HELP temperature Línea 1\\nruta "C:\\\\tmp"'
+
+
+def test_histogram_buckets_sum_and_count(registry):
+    histogram = registry.histogram("latency_seconds", "Latencia", ("route",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value, route="/a")
+    assert sample_lines(registry.render()) == [
+        'latency_seconds_bucket{route="/a",le="0.1"} 2',
+        'latency_seconds_bucket{route="/a",le="1"} 3',
+        'latency_seconds_bucket{route="/a",le="+Inf"} 4',
+        'latency_seconds_sum{route="/a"} 3.65',
+        'latency_seconds_count{route="/a"} 4',
+    ]
+
+
+def test_histogram_without_labels(registry):
+    histogram = registry.histogram("save_seconds", "Guardado", buckets=(1.0,))
+    with histogram.time():
+        pass
+    lines = sample_lines(registry.render())
+    assert lines[0] == 'save_seconds_bucket{le="1"} 1'
+    assert lines[1] == 'save_seconds_bucket{le="+Inf"} 1'
+    assert lines[2].startswith("save_seconds_sum ")
+    assert lines[3] == "save_seconds_count 1"
+
+
+def test_special_values(registry):
+    gauge = registry.gauge("values", "Valores", ("kind",))
+    gauge.set(math.inf, kind="a")
+    gauge.set(-math.inf, kind="b")
+    gauge.set(math.nan, kind="c")
+    gauge.set(1e-05, kind="d")
+    assert sample_lines(registry.render()) == [
+        'values{kind="a"} +Inf',
+        'values{kind="b"} -Inf',
+        'values{kind="c"} NaN',
+        'values{kind="d"} 1e-05',
+    ]
+
+
+def test_gauge_collect_callback(registry):
+    registry.gauge("pool", "Conexiones", ("state",), collect=lambda: {("busy",): 2, ("idle",): 3})
+    registry.gauge("threads", "Hilos", collect=lambda: 7)
+    assert sample_lines(registry.render()) == ['pool{state="busy"} 2', 'pool{state="idle"} 3', "threads 7"]
+
+
+def test_wrong_labels_and_duplicate_names_are_rejected(registry):
+    counter = registry.counter("errors_total", "Errores", ("kind",))
+    with pytest.raises(ValueError):
+        counter.inc(other="x")
+    with pytest.raises(ValueError):
+        registry.counter("errors_total", "Otra vez")
+
+
+def test_metrics_endpoint(client):
+    client.get("/products/")
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith(CONTENT_TYPE)
+    assert 'http_request_duration_seconds_count{method="GET",route="/products/",status="200"}' in response.text
@@ -0,0 +1,98 @@
+import pytest
+
+from importer import import_products
+from pagination import InvalidCursor, decode_cursor, encode_cursor, next_cursor, resolve_page
+
+
+class Row:
+    def __init__(self, id):
+        self.id = id
+
+
+@pytest.fixture
+def products(engine):
+    import_products(
+        ({"title": f"Producto {i}", "price": i % 50, "category": "travel" if i % 3 else "mystery", "rating": i % 6}
+         for i in range(1, 251)),
+        engine
+    )
+
+
+def walk(client, path, limit):
+    """Recorre todas las páginas siguiendo X-Next-Cursor; devuelve los ids por página"""
+    separator = "&" if "?" in path else "?"
+    url = f"{path}{separator}limit={limit}"
+    pages = []
+    while True:
+        response = client.get(url)
+        assert response.status_code == 200
+        pages.append([product["id"] for product in response.json()])
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            return pages
+        url = f"{path}{separator}limit={limit}&cursor={cursor}"
+
+
+def test_cursor_round_trip():
+    cursor = encode_cursor(12345)
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == 12345
+
+
+@pytest.mark.parametrize("cursor", ["", "no-es-base64!", encode_cursor("12"), "eyJ4IjoxfQ", "WzFd"])
+def test_invalid_cursors(cursor):
+    with pytest.raises(InvalidCursor):
+        decode_cursor(cursor)
+
+
+def test_next_cursor_only_for_full_pages():
+    rows = [Row(1), Row(2), Row(3)]
+    assert decode_cursor(next_cursor(rows, 3)) == 3
+    assert next_cursor(rows, 4) is None
+    assert next_cursor([], 0) is None
+
+
+def test_resolve_page():
+    assert resolve_page(None, "id", None) == (False, None)
+    assert resolve_page("libro", "relevance", None) == (True, None)
+    # Sin búsqueda por nombre no hay relevancia: el cursor se admite
+    assert resolve_page(None, "relevance", encode_cursor(7)) == (False, 7)
+    with pytest.raises(InvalidCursor):
+        resolve_page("libro", "relevance", encode_cursor(7))
+
+
+def test_cursor_walk_returns_every_product_once(client, products):
+    pages = walk(client, "/products/", 40)
+    ids = [product_id for page in pages for product_id in page]
+    assert ids == sorted(ids)
+    assert len(ids) == len(set(ids)) == 250
+    assert [len(page) for page in pages] == [40] * 6 + [10]
+
+
+def test_cursor_walk_with_filters(client, products):
+    expected = [product["id"] for product in client.get("/products/?category=mystery&limit=1000").json()]
+    pages = walk(client, "/products/?category=mystery", 25)
+    assert [product_id for page in pages for product_id in page] == expected
+
+
+def test_cursor_walk_exact_multiple_ends_with_empty_page(client, products):
+    pages = walk(client, "/products/", 50)
+    assert [len(page) for page in pages] == [50] * 5 + [0]
+
+
+def test_cursor_is_stable_when_rows_are_added(client, engine, products):
+    first = client.get("/products/?limit=100")
+    import_products([{"title": "Producto nuevo", "price": 1}], engine)
+    second = client.get(f"/products/?limit=100&cursor={first.headers['X-Next-Cursor']}")
+    assert second.json()[0]["id"] == first.json()[-1]["id"] + 1
+
+
+def test_invalid_cursor_is_a_client_error(client, products):
+    assert client.get("/products/?cursor=basura").status_code == 400
+    response = client.get(f"/products/?name=producto&sort=relevance&cursor={encode_cursor(1)}")
+    assert response.status_code == 400
+
+
+def test_cursor_takes_precedence_over_skip(client, products):
+    response = client.get(f"/products/?limit=5&skip=100&cursor={encode_cursor(10)}")
+    assert [product["id"] for product in response.json()] == [11, 12, 13, 14, 15]
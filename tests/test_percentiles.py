@@ -0,0 +1,22 @@
+import pytest
+
+from percentiles import latency_summary, percentile
+
+
+def test_nearest_rank():
+    values = list(range(1, 21))
+    assert percentile(values, 0.95) == 19
+    assert percentile(values, 0.5) == 10
+    assert percentile(values, 1.0) == 20
+    assert percentile(list(range(1, 31)), 0.95) == 29
+
+
+def test_p95_never_below_median_with_few_samples():
+    for samples in ([3.0], [3.9, 2.8], [5.0, 1.0, 3.0]):
+        summary = latency_summary(samples)
+        assert summary["p50_ms"] <= summary["p95_ms"] <= summary["max_ms"]
+
+
+def test_empty_samples_are_rejected():
+    with pytest.raises(ValueError):
+        percentile([], 0.95)
@@ -0,0 +1,30 @@
+import pytest
+
+from fixture_site import FixtureSite
+from scraper import WebScraper
+
+
+@pytest.fixture
+def site():
+    with FixtureSite(categories=2, pages=2, per_page=3) as site:
+        yield site
+
+
+@pytest.mark.parametrize("concurrency", [1, 3])
+def test_scrape_products_skips_fresh_details(site, db, concurrency):
+    with WebScraper(site.url, rate_limit=1000, start_delay=0.0, fetch_details=True) as scraper:
+        products = scraper.scrape_products(num_pages=10, concurrency=concurrency, db=db)
+        assert len(products) == site.total_products
+        assert all(product["upc"] for product in products)
+        scraper.save_products_to_db(products, db, bulk=True)
+
+        requests = site.requests
+        again = scraper.scrape_products(num_pages=10, concurrency=concurrency, db=db)
+        # Solo los listados: los detalles guardados siguen frescos
+        assert site.requests - requests == site.total_pages + 1
+        assert not any(product.get("upc") for product in again)
+
+        requests = site.requests
+        scraper.scrape_products(num_pages=10, concurrency=concurrency)
+        # Sin sesión no se puede comprobar la frescura: se piden todos
+        assert site.requests - requests == site.total_pages + 1 + site.total_products
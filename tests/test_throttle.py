@@ -0,0 +1,143 @@
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import pytest
+
+import throttle
+from throttle import CLOSED, HALF_OPEN, OPEN, AutoThrottle, CircuitOpenError, parse_retry_after
+
+URL = "http://example.com/page"
+HOST = "example.com"
+
+
+class FakeClock:
+    """Sustituye al módulo time de throttle: sleep avanza el reloj sin esperar"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(throttle, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def auto(clock):
+    return AutoThrottle(min_delay=0.0, start_delay=0.0, failure_threshold=3, recovery_seconds=10)
+
+
+def circuit(auto):
+    return auto.snapshot()[HOST]["circuit"]
+
+
+def fail(auto, times=1):
+    for _ in range(times):
+        with auto.slot(URL):
+            pass
+        auto.record(URL, status=503)
+
+
+def test_circuit_opens_after_consecutive_failures(auto):
+    fail(auto, 2)
+    assert circuit(auto) == CLOSED
+    fail(auto)
+    assert circuit(auto) == OPEN
+    with pytest.raises(CircuitOpenError) as error:
+        with auto.slot(URL):
+            pass
+    assert error.value.host == HOST
+    assert 0 < error.value.retry_in <= 10
+
+
+def test_success_resets_the_failure_count(auto):
+    fail(auto, 2)
+    auto.record(URL, latency=0.1, status=200)
+    fail(auto, 2)
+    assert circuit(auto) == CLOSED
+    assert auto.snapshot()[HOST]["consecutive_failures"] == 2
+
+
+def test_client_errors_are_healthy_responses(auto):
+    for _ in range(5):
+        auto.record(URL, latency=0.1, status=404)
+    assert circuit(auto) == CLOSED
+
+
+def test_half_open_allows_a_single_probe_and_closes_on_success(auto, clock):
+    fail(auto, 3)
+    clock.now += 10.5
+    with auto.slot(URL):
+        assert circuit(auto) == HALF_OPEN
+        with pytest.raises(CircuitOpenError):
+            with auto.slot(URL):
+                pass
+        auto.record(URL, latency=0.1, status=200)
+    assert circuit(auto) == CLOSED
+    assert auto.snapshot()[HOST]["consecutive_failures"] == 0
+    with auto.slot(URL):
+        pass
+
+
+def test_failed_probe_reopens_for_twice_as_long(auto, clock):
+    fail(auto, 3)
+    for expected in (20, 40, 80, 100, 100):
+        clock.now += auto._hosts[HOST].open_seconds + 0.5
+        fail(auto)
+        assert circuit(auto) == OPEN
+        assert auto._hosts[HOST].open_seconds == expected
+    # Tras abrirse de nuevo, un éxito vuelve a la espera inicial
+    clock.now += 100.5
+    with auto.slot(URL):
+        auto.record(URL, latency=0.1, status=200)
+    fail(auto, 3)
+    assert auto._hosts[HOST].open_seconds == 10
+
+
+def test_failures_back_off_delay_and_concurrency(clock):
+    auto = AutoThrottle(min_delay=0.0, start_delay=0.2, max_delay=5.0, target_concurrency=4, max_concurrency=8)
+    auto.record(URL, status=429)
+    state = auto.snapshot()[HOST]
+    assert (state["delay_seconds"], state["concurrency"]) == (0.4, 2)
+    auto.record(URL, status=None, retry_after=3.0)
+    state = auto.snapshot()[HOST]
+    assert (state["delay_seconds"], state["concurrency"]) == (3.0, 1)
+    auto.record(URL, status=500, retry_after=60.0)
+    assert auto.snapshot()[HOST]["delay_seconds"] == 5.0
+
+
+def test_healthy_responses_grow_concurrency_and_follow_latency(clock):
+    auto = AutoThrottle(min_delay=0.0, start_delay=1.0, target_concurrency=2, max_concurrency=3)
+    for _ in range(20):
+        auto.record(URL, latency=0.2, status=200)
+    state = auto.snapshot()[HOST]
+    assert state["concurrency"] == 3
+    assert state["delay_seconds"] == pytest.approx(0.1, abs=1e-3)
+
+
+def test_slot_waits_the_current_delay(clock):
+    auto = AutoThrottle(min_delay=0.5, start_delay=0.5)
+    start = clock.now
+    for _ in range(3):
+        with auto.slot(URL):
+            pass
+    # La primera solicitud sale sin esperar; las siguientes, cada 0.5 s
+    assert clock.now - start == pytest.approx(1.0)
+
+
+def test_parse_retry_after():
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("120") == 120.0
+    assert parse_retry_after("mañana") is None
+    moment = datetime.now(timezone.utc) + timedelta(seconds=30)
+    assert 25 <= parse_retry_after(format_datetime(moment, usegmt=True)) <= 30
+    past = datetime.now(timezone.utc) - timedelta(hours=1)
+    assert parse_retry_after(format_datetime(past, usegmt=True)) == 0.0
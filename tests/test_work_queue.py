@@ -0,0 +1,127 @@
+import threading
+from datetime import timedelta
+
+import pytest
+from sqlalchemy import update
+
+from fixture_site import FixtureSite
+from models import PageTaskDB
+from scraper import WebScraper
+from work_queue import DONE, FAILED, LEASED, PENDING, PageWorker, PageWorkQueue, _now
+
+
+@pytest.fixture
+def work_queue(session_factory):
+    return PageWorkQueue(session_factory, lease_seconds=60, max_attempts=2)
+
+
+def expire_leases(session_factory):
+    with session_factory() as db:
+        db.execute(update(PageTaskDB).values(lease_expires_at=_now() - timedelta(seconds=1)))
+        db.commit()
+
+
+def statuses(session_factory):
+    with session_factory() as db:
+        return {row.url: (row.status, row.attempts, row.lease_owner) for row in db.query(PageTaskDB)}
+
+
+def test_seed_normalizes_and_deduplicates(work_queue, session_factory):
+    work_queue.seed(["HTTP://Example.com/a#top", "http://example.com/a", "http://example.com/b"])
+    assert sorted(statuses(session_factory)) == ["http://example.com/a", "http://example.com/b"]
+    work_queue.seed(["http://example.com/c"])
+    assert list(statuses(session_factory)) == ["http://example.com/c"]
+    work_queue.seed(["http://example.com/d"], reset=False)
+    assert len(statuses(session_factory)) == 2
+
+
+def test_claim_leases_pages_in_order(work_queue, session_factory):
+    work_queue.seed([f"http://example.com/{i}" for i in range(5)])
+    first = work_queue.claim("w1", limit=2)
+    second = work_queue.claim("w2", limit=2)
+    assert [task.url for task in first] == ["http://example.com/0", "http://example.com/1"]
+    assert [task.url for task in second] == ["http://example.com/2", "http://example.com/3"]
+    assert all(task.attempts == 1 for task in first + second)
+    assert statuses(session_factory)["http://example.com/0"] == (LEASED, 1, "w1")
+    assert work_queue.stats() == {PENDING: 1, LEASED: 4, DONE: 0, FAILED: 0}
+
+
+def test_expired_lease_is_claimed_again(work_queue, session_factory):
+    work_queue.seed(["http://example.com/a"])
+    task, = work_queue.claim("w1")
+    assert work_queue.claim("w2") == []
+
+    expire_leases(session_factory)
+    retry, = work_queue.claim("w2")
+    assert (retry.id, retry.attempts) == (task.id, 2)
+    # El lease caducado ya no es de w1: su resultado se descarta
+    assert work_queue.complete(task, "w1") is False
+    assert work_queue.complete(retry, "w2") is True
+    assert statuses(session_factory)["http://example.com/a"][0] == DONE
+    assert work_queue.drained()
+
+
+def test_lease_expired_on_last_attempt_fails_the_page(work_queue, session_factory):
+    work_queue.seed(["http://example.com/a"])
+    work_queue.claim("w1")
+    expire_leases(session_factory)
+    work_queue.claim("w2")
+    expire_leases(session_factory)
+    assert work_queue.claim("w3") == []
+    assert statuses(session_factory)["http://example.com/a"] == (FAILED, 2, None)
+    assert work_queue.drained()
+
+
+def test_fail_retries_until_attempts_are_exhausted(work_queue, session_factory):
+    work_queue.seed(["http://example.com/a"])
+    task, = work_queue.claim("w1")
+    work_queue.fail(task, "w1", "timeout")
+    assert statuses(session_factory)["http://example.com/a"] == (PENDING, 1, None)
+    task, = work_queue.claim("w1")
+    work_queue.fail(task, "w1", "timeout")
+    assert statuses(session_factory)["http://example.com/a"] == (FAILED, 2, None)
+    assert work_queue.claim("w1") == []
+
+
+def test_complete_enqueues_links_once(work_queue, session_factory):
+    work_queue.seed(["http://example.com/a"])
+    task, = work_queue.claim("w1")
+    links = [("http://example.com/b", "travel"), ("http://example.com/a", None), ("http://example.com/b", None)]
+    assert work_queue.complete(task, "w1", links)
+    assert not work_queue.drained()
+    follow, = work_queue.claim("w1")
+    assert (follow.url, follow.category) == ("http://example.com/b", "travel")
+
+
+def test_concurrent_claims_never_share_a_page(work_queue):
+    work_queue.seed([f"http://example.com/{i}" for i in range(60)])
+    claimed = []
+    lock = threading.Lock()
+
+    def worker(worker_id):
+        while True:
+            tasks = work_queue.claim(worker_id, limit=3)
+            if not tasks:
+                return
+            with lock:
+                claimed.extend(task.url for task in tasks)
+
+    threads = [threading.Thread(target=worker, args=(f"w{i}",)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(claimed) == sorted(f"http://example.com/{i}" for i in range(60))
+
+
+def test_page_worker_crawls_fixture_site(work_queue, session_factory):
+    with FixtureSite(categories=3, pages=2, per_page=5) as site:
+        work_queue.seed([site.url])
+        with WebScraper(site.url, rate_limit=1000, start_delay=0.0) as scraper:
+            stats = PageWorker(scraper, session_factory, work_queue, worker_id="w1",
+                               concurrency=2, poll_interval=0.05).run()
+    # Portada más las páginas de listado de cada categoría
+    assert stats["pages_done"] == site.total_pages + 1
+    assert stats["pages_failed"] == 0
+    assert stats["inserted"] == site.total_products
+    assert work_queue.stats()[DONE] == site.total_pages + 1